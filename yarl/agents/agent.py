@@ -17,6 +17,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+from collections import defaultdict
+import threading
 import time
 
 from yarl import Specifiable, get_backend
@@ -85,7 +87,7 @@ class Agent(Specifiable):
         self.exploration = Exploration.from_spec(exploration_spec)
         self.execution_spec = parse_execution_spec(execution_spec)
 
-        # Python-side experience buffer for better performance (may be disabled).
+        # Python-side experience buffers for better performance (may be disabled): One list per environment ID.
         self.states_buffer = None
         self.actions_buffer = None
         self.internals_buffer = None
@@ -98,12 +100,25 @@ class Agent(Specifiable):
 
         # Global timee step counter.
         self.timesteps = 0
+        # States and actions of the transition awaiting its reward/terminal in `act_and_observe`.
+        self.pending_transition = None
 
         # Create the Agent's optimizer.
         self.optimizer = Optimizer.from_spec(optimizer_spec)
         # Update-spec dict tells the Agent how to update (e.g. memory batch size).
         self.update_spec = parse_update_spec(update_spec)
 
+        # Background thread filling the batch prefetch queue (if update_spec["prefetch_batches"] > 0).
+        self.prefetch_thread = None
+        self.prefetch_stop_event = None
+        # Number of batches enqueued by the prefetch thread and not yet consumed by an update (guarded by the
+        # condition) and the exception that ended the prefetch thread (if any).
+        self.prefetch_condition = threading.Condition()
+        self.prefetched_batches = 0
+        self.prefetch_error = None
+        # Queue depth seen before the last update and time the updates spent waiting for batches.
+        self.prefetch_stats = dict(queue_depth=0, starved_time=0.0, starved_updates=0, updates=0)
+
         # Create our GraphBuilder and -Executor.
         self.graph_builder = GraphBuilder(action_space=self.action_space, summary_spec=summary_spec)
         self.graph_executor = GraphExecutor.from_spec(
@@ -114,13 +129,13 @@ class Agent(Specifiable):
 
     def reset_buffers(self):
         """
-        Initializes buffers for buffered `observe` calls.
+        Initializes buffers for buffered `observe` calls (discarding the buffered records of all environments).
         """
-        self.states_buffer = list()
-        self.actions_buffer = list()
-        self.internals_buffer = list()
-        self.reward_buffer = list()
-        self.terminal_buffer = list()
+        self.states_buffer = defaultdict(list)
+        self.actions_buffer = defaultdict(list)
+        self.internals_buffer = defaultdict(list)
+        self.reward_buffer = defaultdict(list)
+        self.terminal_buffer = defaultdict(list)
 
     def assemble_meta_graph(self, *params):
         """
@@ -168,12 +183,12 @@ class Agent(Specifiable):
         """
         raise NotImplementedError
 
-    def observe(self, states, actions, internals, rewards, terminals):
+    def observe(self, states, actions, internals, rewards, terminals, env_id=None):
         """
         Observes an experience tuple or a batch of experience tuples. Note: If configured,
         first uses buffers and then internally calls _observe_graph() to actually run the computation graph.
         If buffering is disabled, this just routes the call to the respective `_observe_graph()` method of the
-        child Agent.
+        child Agent. Call `flush_buffers` to insert the records still buffered (e.g. at the end of a run).
 
         Args:
             states (Union[dict, ndarray]): States dict or array.
@@ -182,7 +197,30 @@ class Agent(Specifiable):
                 empty list if no internals available.
             rewards (float): Scalar reward(s) observed.
             terminals (bool): Boolean indicating terminal.
+            env_id (Optional[any]): ID of the environment the experience(s) stem from. Each environment has its own
+                buffer, so every insert holds a contiguous trajectory chunk of a single environment.
+                Default: None (single environment).
+        """
+        records = self._buffer_records(states, actions, internals, rewards, terminals, env_id)
+        if records is not None:
+            self._observe_graph(**records)
 
+    def _buffer_records(self, states, actions, internals, rewards, terminals, env_id=None):
+        """
+        Adds experience to the Python-side buffers (if enabled) and returns the records that are due for insertion
+        into the graph: All records buffered for the environment once its buffer is full or an episode ended, the
+        given records directly if buffering is disabled.
+
+        Args:
+            states (Union[dict, ndarray]): States dict or array.
+            actions (Union[dict, ndarray]): Actions dict or array.
+            internals (Union[list]): Internal state(s) returned by agent for the given states.
+            rewards (float): Scalar reward(s) observed.
+            terminals (bool): Boolean indicating terminal.
+            env_id (Optional[any]): ID of the environment the experience(s) stem from.
+
+        Returns:
+            Optional[dict]: The kwargs for `_observe_graph` or None if nothing is to be inserted yet.
         """
         batched_states = self.state_space.batched(states)
 
@@ -199,24 +237,108 @@ class Agent(Specifiable):
             terminals = np.asarray([terminals])
 
         if self.observe_spec["buffer_enabled"] is True:
-            self.states_buffer.extend(states)
-            self.actions_buffer.extend(actions)
-            self.internals_buffer.extend(internals)
-            self.reward_buffer.extend(rewards)
-            self.terminal_buffer.extend(terminals)
+            self.states_buffer[env_id].extend(states)
+            self.actions_buffer[env_id].extend(actions)
+            self.internals_buffer[env_id].extend(internals)
+            self.reward_buffer[env_id].extend(rewards)
+            self.terminal_buffer[env_id].extend(terminals)
 
             # Inserts per episode or when full.
-            if len(self.reward_buffer) >= self.observe_spec["buffer_size"] or terminals:
-                self._observe_graph(
-                    states=np.asarray(self.states_buffer),
-                    actions=np.asarray(self.actions_buffer),
-                    internals=np.asarray(self.internals_buffer),
-                    rewards=np.asarray(self.reward_buffer),
-                    terminals=self.terminal_buffer
-                )
-                self.reset_buffers()
+            if len(self.reward_buffer[env_id]) >= self.observe_spec["buffer_size"] or np.any(terminals):
+                return self._pop_buffered_records(env_id)
+            return None
         else:
-            self._observe_graph(states, actions, internals, rewards, terminals)
+            return dict(states=states, actions=actions, internals=internals, rewards=rewards, terminals=terminals)
+
+    def _pop_buffered_records(self, env_id):
+        """
+        Removes the records buffered for an environment from the buffers.
+
+        Args:
+            env_id (any): ID of the environment whose records to return.
+
+        Returns:
+            dict: The kwargs for `_observe_graph`.
+        """
+        return dict(
+            states=np.asarray(self.states_buffer.pop(env_id)),
+            actions=np.asarray(self.actions_buffer.pop(env_id)),
+            internals=np.asarray(self.internals_buffer.pop(env_id)),
+            rewards=np.asarray(self.reward_buffer.pop(env_id)),
+            terminals=self.terminal_buffer.pop(env_id)
+        )
+
+    def flush_buffers(self):
+        """
+        Inserts the records left in the observe buffers (one insert per environment). Workers call this when they
+        stop, so no trailing trajectory chunk is held back.
+        """
+        if self.observe_spec["buffer_enabled"] is not True:
+            return
+        for env_id in list(self.reward_buffer.keys()):
+            records = self._pop_buffered_records(env_id)
+            if len(records["rewards"]) > 0:
+                self._observe_graph(**records)
+
+    def act_and_observe(self, states, rewards=None, terminals=None, deterministic=False):
+        """
+        Acting-loop shortcut for `observe` + `get_action`: Completes the transition started by the previous call
+        (its states and returned actions) with the given reward(s) and terminal(s), observes it and returns the
+        action(s) for the new state(s). If the observe buffer has to be flushed, the records are inserted in the
+        same graph execution that computes the actions (see `_act_and_observe_graph`).
+        Call `flush_observation` to observe the last transition without acting (e.g. at the end of a run).
+
+        Args:
+            states (Union[dict,np.ndarray]): The new state(s) to act on.
+            rewards (Optional[float]): Reward(s) received for the previous transition. Ignored on the first call
+                (no transition pending).
+            terminals (Optional[bool]): Terminal(s) of the previous transition.
+            deterministic (bool): If True, no exploration or sampling may be applied when retrieving an action.
+
+        Returns:
+            any: Action(s) as dict/tuple/np.ndarray (depending on `self.action_space`).
+        """
+        records = None
+        if self.pending_transition is not None:
+            assert rewards is not None and terminals is not None, \
+                "ERROR: `rewards` and `terminals` of the pending transition must be provided!"
+            records = self._buffer_records(
+                self.pending_transition[0], self.pending_transition[1], [], rewards, terminals
+            )
+        actions = self._act_and_observe_graph(states, records, deterministic)
+        self.pending_transition = (states, actions)
+        return actions
+
+    def flush_observation(self, rewards, terminals):
+        """
+        Observes the transition pending from the last `act_and_observe` call (if any) without acting.
+
+        Args:
+            rewards (float): Reward(s) received for the pending transition.
+            terminals (bool): Terminal(s) of the pending transition.
+        """
+        if self.pending_transition is None:
+            return
+        states, actions = self.pending_transition
+        self.pending_transition = None
+        self.observe(states, actions, [], rewards, terminals)
+
+    def _act_and_observe_graph(self, states, records, deterministic=False):
+        """
+        Computes actions for the given states and inserts the given records. Agents whose action and insert
+        sockets live in the same graph override this to do both in a single graph execution.
+
+        Args:
+            states (Union[dict,np.ndarray]): The state(s) to act on.
+            records (Optional[dict]): The kwargs for `_observe_graph` (None if nothing is to be inserted).
+            deterministic (bool): If True, no exploration or sampling may be applied when retrieving an action.
+
+        Returns:
+            any: Action(s) as dict/tuple/np.ndarray (depending on `self.action_space`).
+        """
+        if records is not None:
+            self._observe_graph(**records)
+        return self.get_action(states, deterministic)
 
     def _observe_graph(self, states, actions, internals, rewards, terminals):
         """
@@ -249,6 +371,73 @@ class Agent(Specifiable):
         """
         raise NotImplementedError
 
+    def start_prefetching(self):
+        """
+        Starts a background thread that keeps running the "prefetch_batch" op to fill the batch prefetch queue.
+        Only call this once the memory holds enough records to sample from.
+        """
+        if self.prefetch_thread is not None:
+            return
+        assert self.prefetch_stop_event is None, "ERROR: The prefetch queue has been closed by `stop_prefetching`!"
+        self.prefetched_batches = 0
+        self.prefetch_error = None
+        self.prefetch_stop_event = threading.Event()
+        self.prefetch_thread = threading.Thread(target=self._prefetch_loop, name="prefetch-thread")
+        self.prefetch_thread.daemon = True
+        self.prefetch_thread.start()
+
+    def stop_prefetching(self):
+        """
+        Stops the prefetch thread and closes the prefetch queue (cancelling the blocked enqueue, if any). The queue
+        cannot be reopened afterwards.
+        """
+        if self.prefetch_thread is None:
+            return
+        self.prefetch_stop_event.set()
+        self.graph_executor.execute("close_prefetch_queue")
+        self.prefetch_thread.join()
+        self.prefetch_thread = None
+
+    def _prefetch_loop(self):
+        try:
+            while not self.prefetch_stop_event.is_set():
+                self.graph_executor.execute("prefetch_batch")
+                with self.prefetch_condition:
+                    self.prefetched_batches += 1
+                    self.prefetch_condition.notify()
+        except Exception as e:
+            # Queue got closed by `stop_prefetching`. Otherwise, hand the error to the learner.
+            if not self.prefetch_stop_event.is_set():
+                with self.prefetch_condition:
+                    self.prefetch_error = e
+                    self.prefetch_condition.notify_all()
+
+    def wait_for_prefetched_batch(self):
+        """
+        Blocks until the prefetch queue holds at least one batch (which the following update dequeues), timing
+        the wait in `self.prefetch_stats`. Re-raises the error that ended the prefetch thread (if any).
+        """
+        self.start_prefetching()
+        with self.prefetch_condition:
+            self.prefetch_stats["queue_depth"] = self.prefetched_batches
+            self.prefetch_stats["updates"] += 1
+            if self.prefetched_batches == 0 and self.prefetch_error is None:
+                start_time = time.monotonic()
+                while self.prefetched_batches == 0 and self.prefetch_error is None:
+                    self.prefetch_condition.wait()
+                self.prefetch_stats["starved_time"] += time.monotonic() - start_time
+                self.prefetch_stats["starved_updates"] += 1
+            if self.prefetch_error is not None:
+                raise self.prefetch_error
+            self.prefetched_batches -= 1
+
+    def terminate(self):
+        """
+        Releases the Agent's background resources (e.g. stops the prefetch thread). Call this once the Agent
+        is no longer used.
+        """
+        self.stop_prefetching()
+
     def import_observations(self, observations):
         """
         Bulk imports observations, potentially using device pre-fetching. Can be optionally
@@ -307,15 +496,38 @@ class Agent(Specifiable):
         """
         self.graph_executor.load_model(path=path)
 
+    def store_memory(self, path, blocking=False):
+        """
+        Stores a snapshot of the agent's memory (memories are excluded from model checkpoints).
+        Delegates this task to the graph executor.
+
+        Args:
+            path (str): Path to the snapshot directory.
+            blocking (bool): Whether to wait for the snapshot to be written (otherwise, it is written in the
+                background).
+        """
+        self.graph_executor.store_memories(path=path, blocking=blocking)
+
+    def load_memory(self, path):
+        """
+        Restores the agent's memory from a snapshot, e.g. to resume learning with a warm buffer after a restart.
+
+        Args:
+            path (str): Path to the snapshot directory.
+        """
+        self.graph_executor.load_memories(path=path)
+
     def get_weights(self):
         """
         Returns all weights the agents computation graph. Delegates this task to the
         graph executor.
 
         Returns:
-            any: Weights and optionally weight meta data for this model.
+            any: Weights and optionally weight meta data for this model. For the TensorFlow backend, a single
+                contiguous float32 array of all policy weights, which can be passed on (e.g. into Ray's object store
+                or shared memory) without copying.
         """
-        self.graph_executor.get_weights()
+        return self.graph_executor.get_weights()
 
     def set_weights(self, weights):
         """
@@ -323,7 +535,8 @@ class Agent(Specifiable):
         graph executor.
 
         Args:
-            weights (any): Weights and optionally meta data to update depending on the backend.
+            weights (any): Weights and optionally meta data to update depending on the backend (for TensorFlow,
+                the flat array returned by `get_weights`).
 
         Raises:
             ValueError if weights do not match graph weights in shapes and types.
@@ -22,7 +22,8 @@ import numpy as np
 
 from yarl.agents import Agent
 from yarl.components import CONNECT_ALL, Synchronizable, Merger, Splitter, Memory, DQNLossFunction, PrioritizedReplay, \
-    Policy
+    Policy, FlatWeights
+from yarl.components.memories import MemPrioritizedReplay
 from yarl.spaces import Dict, IntBox, FloatBox, BoolBox
 
 
@@ -36,23 +37,38 @@ class ApexAgent(Agent):
     The distinction to standard DQN is mainly that Ape-X needs to provide additional operations
     to enable external updates of priorities. Ape-X also enables per default dueling and double
     DQN.
+
+    With a host-side memory (memory_spec type "mem_prioritized", see `MemPrioritizedReplay`), the replay lives
+    outside the graph: Inserts, sampling and priority updates (e.g. in Ray replay shards) then run without any
+    session call and updates from memory feed the sampled batch into the graph as an external batch.
     """
+    # Memory spec types selecting a host-side `MemPrioritizedReplay`.
+    host_memory_types = ["mem_prioritized", "memprioritized", "memprioritizedreplay"]
 
     def __init__(self, discount=0.98, memory_spec=None, **kwargs):
         """
         Args:
             discount (float): The discount factor (gamma).
-            memory_spec (Optional[dict,Memory]): The spec for the Memory to use for the DQN algorithm.
+            memory_spec (Optional[dict,Memory,MemPrioritizedReplay]): The spec for the Memory to use for the DQN
+                algorithm: A PrioritizedReplay (default) or a host-side MemPrioritizedReplay (see `host_memory_types`).
         """
         super(ApexAgent, self).__init__(**kwargs)
 
         self.discount = discount
         self.train_time_steps = 0
 
-        # Apex always uses prioritized replay (not Memory.from_spec())
-        self.memory = PrioritizedReplay.from_spec(memory_spec)
+        # Apex always uses prioritized replay (not Memory.from_spec()), either in the graph or host-side.
+        self.host_memory = isinstance(memory_spec, MemPrioritizedReplay) or \
+            (isinstance(memory_spec, dict) and memory_spec.get("type") in self.host_memory_types)
+        if self.host_memory:
+            if isinstance(memory_spec, dict):
+                memory_spec = {key: value for key, value in memory_spec.items() if key != "type"}
+            self.memory = MemPrioritizedReplay.from_spec(memory_spec)
+        else:
+            self.memory = PrioritizedReplay.from_spec(memory_spec, discount=self.discount)
+        self.n_step = getattr(self.memory, "n_step", 1)
         self.record_space = Dict(states=self.state_space, actions=self.action_space, rewards=float,
-                                 terminals=IntBox(1), add_batch_rank=False)
+                                 terminals=BoolBox(), add_batch_rank=False)
 
         # The target policy (is synced from the q-net policy every n steps).
         self.target_policy = None
@@ -62,11 +78,18 @@ class ApexAgent(Agent):
         # Apex always uses dueling.
         self.policy = Policy(neural_network=self.neural_network, action_adapter_spec=dict(add_dueling_layer=True))
 
-        self.merger = Merger(output_space=self.record_space)
-        splitter_input_space = copy.deepcopy(self.record_space)
-        splitter_input_space["next_states"] = self.state_space
-        self.splitter = Splitter(input_space=splitter_input_space)
-        self.loss_function = DQNLossFunction(discount=self.discount, double_q=True)
+        # Merger and splitter between the graph and the (in-graph) memory.
+        self.merger = None
+        self.splitter = None
+        if not self.host_memory:
+            self.merger = Merger(output_space=self.record_space)
+            splitter_input_space = copy.deepcopy(self.record_space)
+            splitter_input_space["next_states"] = self.state_space
+            if self.n_step > 1:
+                splitter_input_space["discounts"] = FloatBox()
+            self.splitter = Splitter(input_space=splitter_input_space)
+        self.flat_weights = FlatWeights()
+        self.loss_function = DQNLossFunction(discount=self.discount, double_q=True, n_step=self.n_step)
 
         self.assemble_meta_graph()
         self.build_graph()
@@ -74,16 +97,28 @@ class ApexAgent(Agent):
     def _assemble_meta_graph(self, core, *params):
         # Define our interface.
         core.define_inputs("states_from_env", "external_batch_states", "external_batch_next_states",
-                           "states_for_memory", space=self.state_space.with_batch_rank())
-        core.define_inputs("actions_for_memory", "external_batch_actions", space=self.action_space.with_batch_rank())
-        core.define_inputs("rewards_for_memory", "external_batch_rewards", space=FloatBox(add_batch_rank=True))
-        core.define_inputs("terminals_for_memory", "external_batch_terminals", space=BoolBox(add_batch_rank=True))
+                           space=self.state_space.with_batch_rank())
+        core.define_inputs("external_batch_actions", space=self.action_space.with_batch_rank())
+        core.define_inputs("external_batch_rewards", space=FloatBox(add_batch_rank=True))
+        core.define_inputs("external_batch_terminals", space=BoolBox(add_batch_rank=True))
+        if self.n_step > 1:
+            core.define_inputs("external_batch_discounts", space=FloatBox(add_batch_rank=True))
 
         #core.define_inputs("deterministic", space=bool)
         core.define_inputs("time_step", space=int)
-        core.define_outputs("get_actions", "insert_records",
-                            "update_from_memory", "update_from_external_batch",
-                            "sync_target_qnet", "get_batch", "get_indices", "loss")
+        core.define_inputs("flat_weights", space=FloatBox(add_batch_rank=True))
+        core.define_outputs("get_actions", "update_from_external_batch", "sync_target_qnet", "loss", "loss_per_item",
+                            "get_flat_weights", "set_flat_weights")
+        if not self.host_memory:
+            core.define_inputs("states_for_memory", space=self.state_space.with_batch_rank())
+            core.define_inputs("actions_for_memory", space=self.action_space.with_batch_rank())
+            core.define_inputs("rewards_for_memory", space=FloatBox(add_batch_rank=True))
+            core.define_inputs("terminals_for_memory", space=BoolBox(add_batch_rank=True))
+            # Externally computed priorities (e.g. by a learner for the batch sampled by a replay shard).
+            core.define_inputs("sample_indices", space=IntBox(add_batch_rank=True))
+            core.define_inputs("sample_losses", space=FloatBox(add_batch_rank=True))
+            core.define_outputs("insert_records", "update_from_memory", "get_batch", "get_indices",
+                                "update_priorities")
 
         # Add the Q-net, copy it (target-net) and add the target-net.
         self.target_policy = self.policy.copy(scope="target-policy")
@@ -93,9 +128,6 @@ class ApexAgent(Agent):
         # Add an Exploration for the q-net (target-net doesn't need one).
         core.add_components(self.exploration)
 
-        # Add our Memory Component plus merger and splitter.
-        core.add_components(self.memory, self.merger, self.splitter)
-
         # Add the loss function and optimizer.
         core.add_components(self.loss_function, self.optimizer)
 
@@ -116,6 +148,59 @@ class ApexAgent(Agent):
         core.connect((self.exploration, "action"), "get_actions")
         #core.connect((self.exploration, "do_explore"), "do_explore")
 
+        if not self.host_memory:
+            self._assemble_memory(core)
+
+        # External batches feed the loss function directly (not via the memory's splitter).
+        for in_ in ["actions", "rewards", "terminals"] + (["discounts"] if self.n_step > 1 else []):
+            core.connect("external_batch_"+in_, (self.loss_function, in_), label="ext")
+
+        # Only send ext and mem labelled ops into loss function.
+        q_values_socket = "q_values"
+        core.connect((self.policy, q_values_socket), (self.loss_function, "q_values"), label="ext,mem,s")
+        core.connect((self.target_policy, q_values_socket), (self.loss_function, "qt_values_s_"), label="ext,mem")
+        core.connect((self.policy, q_values_socket), (self.loss_function, "q_values_s_"), label="ext,mem,sp")
+
+        # Connect the Optimizer.
+        core.connect((self.loss_function, "loss"), (self.optimizer, "loss"))
+        core.connect((self.loss_function, "loss"), "loss")
+        core.connect((self.policy, "_variables"), (self.optimizer, "vars"))
+        core.connect((self.optimizer, "step"), "update_from_external_batch", label="ext")
+        # Per-item losses (new priorities for a host-side memory).
+        core.connect((self.loss_function, "loss_per_item"), "loss_per_item")
+
+        if not self.host_memory:
+            core.connect((self.optimizer, "step"), "update_from_memory", label="mem")
+
+            # Connect loss to updating priority values and indices to update.
+            core.connect((self.loss_function, "loss_per_item"), (self.memory, "update"))
+            # TODO correct?
+            core.connect((self.memory, "record_indices"), (self.memory, "indices"))
+            # External priority updates.
+            core.connect("sample_indices", (self.memory, "indices"))
+            core.connect("sample_losses", (self.memory, "update"))
+            core.connect((self.memory, "update_records"), "update_priorities")
+
+        # Add syncing capability for target-net.
+        core.connect((self.policy, "_variables"), (self.target_policy, "_values"))
+        core.connect((self.target_policy, "sync"), "sync_target_qnet")
+
+        # Get/set the policy's weights as one flat vector (see `Agent.get_weights`).
+        core.add_components(self.flat_weights)
+        core.connect((self.policy, "_variables"), (self.flat_weights, "variables"))
+        core.connect("flat_weights", (self.flat_weights, "flat_weights_in"))
+        core.connect((self.flat_weights, "flat_weights"), "get_flat_weights")
+        core.connect((self.flat_weights, "set_flat_weights"), "set_flat_weights")
+
+    def _assemble_memory(self, core):
+        """
+        Adds the in-graph memory plus merger and splitter and connects them (not used with a host-side memory).
+
+        Args:
+            core (Component): The Agent's GraphBuilder's `core_component` object.
+        """
+        core.add_components(self.memory, self.merger, self.splitter)
+
         # Insert records into memory via merger.
         core.connect("states_for_memory", (self.preprocessor_stack, "input"), label="to_mem")
         core.connect((self.preprocessor_stack, "output"), (self.merger, "/states"), label="to_mem")
@@ -136,39 +221,35 @@ class ApexAgent(Agent):
         core.connect((self.splitter, "/actions"), (self.loss_function, "actions"))
         core.connect((self.splitter, "/rewards"), (self.loss_function, "rewards"))
         core.connect((self.splitter, "/terminals"), (self.loss_function, "terminals"))
+        if self.n_step > 1:
+            core.connect((self.splitter, "/discounts"), (self.loss_function, "discounts"))
         core.connect((self.splitter, "/next_states"), (self.target_policy, "nn_input"), label="mem,sp")
         core.connect((self.splitter, "/next_states"), (self.policy, "nn_input"), label="mem,sp")
 
-        # Only send ext and mem labelled ops into loss function.
-        q_values_socket = "q_values"
-        core.connect((self.policy, q_values_socket), (self.loss_function, "q_values"), label="ext,mem,s")
-        core.connect((self.target_policy, q_values_socket), (self.loss_function, "qt_values_s_"), label="ext,mem")
-        core.connect((self.policy, q_values_socket), (self.loss_function, "q_values_s_"), label="ext,mem,sp")
-
-        # Connect the Optimizer.
-        core.connect((self.loss_function, "loss"), (self.optimizer, "loss"))
-        core.connect((self.loss_function, "loss"), "loss")
-        core.connect((self.policy, "_variables"), (self.optimizer, "vars"))
-        core.connect((self.optimizer, "step"), "update_from_memory", label="mem")
-        core.connect((self.optimizer, "step"), "update_from_external_batch", label="ext")
-
-        # Connect loss to updating priority values and indices to update.
-        core.connect((self.loss_function, "loss_per_item"), (self.memory, "update"))
-        # TODO correct?
-        core.connect((self.memory, "record_indices"), (self.memory, "indices"))
-
-        # Add syncing capability for target-net.
-        core.connect((self.policy, "_variables"), (self.target_policy, "_values"))
-        core.connect((self.target_policy, "sync"), "sync_target_qnet")
-
     def get_action(self, states, deterministic=False):
+        return self._act_and_observe_graph(states, records=None, deterministic=deterministic)
+
+    def _act_and_observe_graph(self, states, records, deterministic=False):
         batched_states = self.state_space.batched(states)
         remove_batch_rank = batched_states.ndim == np.asarray(states).ndim + 1
         # Increase timesteps by the batch size (number of states in batch).
         self.timesteps += len(batched_states)
-        actions = self.graph_executor.execute(
-            "get_actions", inputs=dict(states_from_env=batched_states, time_step=self.timesteps)
-        )
+        inputs = dict(states_from_env=batched_states, time_step=self.timesteps)
+        # A host-side memory is written to directly.
+        if records is not None and self.host_memory:
+            self._observe_graph(**records)
+            records = None
+        if records is None:
+            actions = self.graph_executor.execute("get_actions", inputs=inputs)
+        else:
+            # Insert the completed transition(s) in the same graph execution.
+            inputs.update(
+                states_for_memory=records["states"],
+                actions_for_memory=records["actions"],
+                rewards_for_memory=records["rewards"],
+                terminals_for_memory=records["terminals"]
+            )
+            actions, _ = self.graph_executor.execute(["get_actions", "insert_records"], inputs=inputs)
 
         if remove_batch_rank:
             return actions[0]
@@ -181,7 +262,10 @@ class ApexAgent(Agent):
         Returns:
             batch, ndarray: Sample batch and indices sampled.
         """
-        batch, indices = self.graph_executor.execute(sockets=["get_batch", "get"])
+        if self.host_memory:
+            batch, indices, _ = self.memory.get_records(self.update_spec["batch_size"])
+            return batch, indices
+        batch, indices = self.graph_executor.execute(sockets=["get_batch", "get_indices"])
 
         # Return indices so we later now which priorities to update.
         return batch, indices
@@ -195,12 +279,18 @@ class ApexAgent(Agent):
             indices (ndarray): Indices to update in replay memory.
             loss (ndarray):  Loss values for indices.
         """
+        if self.host_memory:
+            self.memory.update_records(indices, loss)
+            return
         self.graph_executor.execute(
-            sockets=["sample_indices", "sample_losses"],
+            sockets="update_priorities",
             inputs=dict(sample_indices=indices, sample_losses=loss)
         )
 
     def _observe_graph(self, states, actions, internals, rewards, terminals):
+        if self.host_memory:
+            self.memory.insert_records(dict(states=states, actions=actions, rewards=rewards, terminals=terminals))
+            return
         self.graph_executor.execute("insert_records", inputs=dict(
             states_for_memory=states,
             actions_for_memory=actions,
@@ -209,24 +299,54 @@ class ApexAgent(Agent):
         ))
 
     def update(self, batch=None):
+        """
+        Performs an update from the memory or, if given, from an external batch.
+
+        Args:
+            batch (Optional[dict]): External batch (e.g. sampled by a replay shard) with keys "states", "actions",
+                "rewards", "terminals", "next_states" and, for n-step memories, "discounts".
+
+        Returns:
+            Union[float,tuple]: The loss. For an external batch, the loss and the per-item losses (the new
+                priorities of the batch's records).
+        """
         # In apex, syncing is based on num steps trained, not steps sampled.
         if (self.train_time_steps - 1) % self.update_spec["sync_interval"] == 0:
             self.graph_executor.execute("sync_target_qnet")
-        if batch is None:
+        if batch is None and self.host_memory:
+            # Sample on the host, learn from the batch as an external one and re-prioritize with its losses.
+            batch, indices = self.get_batch()
+            _, loss, loss_per_item = self.graph_executor.execute(
+                ["update_from_external_batch", "loss", "loss_per_item"], inputs=self._external_batch_input(batch)
+            )
+            self.memory.update_records(indices, loss_per_item)
+        elif batch is None:
             _, loss = self.graph_executor.execute(["update_from_memory", "loss"])
         else:
-            batch_input = dict(
-                external_batch_states=batch["states"],
-                external_batch_actions=batch["actions"],
-                external_batch_rewards=batch["rewards"],
-                external_batch_terminals=batch["terminals"],
-                external_batch_next_states=batch["next_states"]
-            )
-            _, loss = self.graph_executor.execute(
-                ["update_from_external_batch", "loss"], inputs=batch_input
+            _, loss, loss_per_item = self.graph_executor.execute(
+                ["update_from_external_batch", "loss", "loss_per_item"], inputs=self._external_batch_input(batch)
             )
+            self.train_time_steps += 1
+            return loss, loss_per_item
         self.train_time_steps += 1
         return loss
 
+    def _external_batch_input(self, batch):
+        """
+        Returns:
+            dict: The in-Socket values to feed a batch (e.g. sampled by a replay shard) into the graph.
+        """
+        batch_input = dict(
+            external_batch_states=batch["states"],
+            external_batch_actions=batch["actions"],
+            external_batch_rewards=batch["rewards"],
+            external_batch_terminals=batch["terminals"],
+            external_batch_next_states=batch["next_states"]
+        )
+        if self.n_step > 1:
+            assert "discounts" in batch, "ERROR: External batches for n-step updates must contain 'discounts'!"
+            batch_input["external_batch_discounts"] = batch["discounts"]
+        return batch_input
+
     def __repr__(self):
         return "ApexAgent"
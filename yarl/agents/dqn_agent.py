@@ -21,7 +21,8 @@ import copy
 import numpy as np
 
 from yarl.agents import Agent
-from yarl.components import CONNECT_ALL, Synchronizable, Merger, Splitter, Memory, DQNLossFunction, Policy
+from yarl.components import CONNECT_ALL, Synchronizable, Merger, Splitter, Memory, DQNLossFunction, Policy, \
+    BatchPrefetcher, FlatWeights
 from yarl.spaces import Dict, FloatBox, BoolBox
 from yarl.utils.visualization_util import get_graph_markup
 
@@ -45,7 +46,11 @@ class DQNAgent(Agent):
         super(DQNAgent, self).__init__(**kwargs)
 
         self.discount = discount
+        # n-step memories have to discount their rewards with the Agent's discount.
+        if isinstance(memory_spec, dict) and memory_spec.get("n_step", 1) > 1:
+            memory_spec = dict(memory_spec, discount=self.discount)
         self.memory = Memory.from_spec(memory_spec)
+        self.n_step = getattr(self.memory, "n_step", 1)
         self.record_space = Dict(states=self.state_space, actions=self.action_space, rewards=float,
                                  terminals=BoolBox(), add_batch_rank=False)
         self.double_q = double_q
@@ -64,8 +69,15 @@ class DQNAgent(Agent):
         self.merger = Merger(output_space=self.record_space)
         splitter_input_space = copy.deepcopy(self.record_space)
         splitter_input_space["next_states"] = self.state_space
+        if self.n_step > 1:
+            splitter_input_space["discounts"] = FloatBox()
         self.splitter = Splitter(input_space=splitter_input_space)
-        self.loss_function = DQNLossFunction(discount=self.discount, double_q=self.double_q)
+        self.flat_weights = FlatWeights()
+        self.loss_function = DQNLossFunction(discount=self.discount, double_q=self.double_q, n_step=self.n_step)
+        # Optional prefetch queue between memory and learner.
+        self.prefetcher = None
+        if self.update_spec["prefetch_batches"] > 0:
+            self.prefetcher = BatchPrefetcher(capacity=self.update_spec["prefetch_batches"])
 
         self.assemble_meta_graph(self.preprocessor_stack, self.memory, self.merger, self.splitter, self.policy,
                                  self.target_policy, self.exploration, self.loss_function, self.optimizer)
@@ -80,12 +92,16 @@ class DQNAgent(Agent):
         core.define_inputs("actions_for_memory", "external_batch_actions", space=self.action_space.with_batch_rank())
         core.define_inputs("rewards_for_memory", "external_batch_rewards", space=FloatBox(add_batch_rank=True))
         core.define_inputs("terminals_for_memory", "external_batch_terminals", space=BoolBox(add_batch_rank=True))
+        if self.n_step > 1:
+            core.define_inputs("external_batch_discounts", space=FloatBox(add_batch_rank=True))
 
         #core.define_inputs("deterministic", space=bool)
         core.define_inputs("time_step", space=int)
+        core.define_inputs("flat_weights", space=FloatBox(add_batch_rank=True))
         core.define_outputs("get_actions", "insert_records",
                             "update_from_memory", "update_from_external_batch",
-                            "sync_target_qnet", "get_batch", "loss")
+                            "sync_target_qnet", "get_batch", "loss",
+                            "get_flat_weights", "set_flat_weights")
 
         # Add the Q-net, copy it (target-net) and add the target-net.
         self.target_policy = self.policy.copy(scope="target-policy")
@@ -131,16 +147,32 @@ class DQNAgent(Agent):
 
         # Learn from Memory via get_batch and Splitter.
         core.connect(self.update_spec["batch_size"], (self.memory, "num_records"))
-        core.connect((self.memory, "get_records"), (self.splitter, "input"), label="mem")
+        if self.prefetcher is None:
+            core.connect((self.memory, "get_records"), (self.splitter, "input"), label="mem")
+        # Or via the prefetch queue (filled by a background thread, see `Agent.start_prefetching`).
+        else:
+            core.define_outputs("prefetch_batch", "prefetch_queue_size", "close_prefetch_queue")
+            core.add_components(self.prefetcher)
+            core.connect((self.memory, "get_records"), (self.prefetcher, "input"))
+            core.connect((self.prefetcher, "enqueue"), "prefetch_batch")
+            core.connect((self.prefetcher, "queue_size"), "prefetch_queue_size")
+            core.connect((self.prefetcher, "close"), "close_prefetch_queue")
+            core.connect((self.prefetcher, "output"), (self.splitter, "input"), label="mem")
         core.connect((self.memory, "get_records"), "get_batch")
         core.connect((self.splitter, "/states"), (self.policy, "nn_input"), label="mem,s")
         core.connect((self.splitter, "/actions"), (self.loss_function, "actions"))
         core.connect((self.splitter, "/rewards"), (self.loss_function, "rewards"))
         core.connect((self.splitter, "/terminals"), (self.loss_function, "terminals"))
+        if self.n_step > 1:
+            core.connect((self.splitter, "/discounts"), (self.loss_function, "discounts"))
         core.connect((self.splitter, "/next_states"), (self.target_policy, "nn_input"), label="mem,sp")
         if self.double_q:
             core.connect((self.splitter, "/next_states"), (self.policy, "nn_input"), label="mem,sp")
 
+        # External batches feed the loss function directly (not via the memory's splitter).
+        for in_ in ["actions", "rewards", "terminals"] + (["discounts"] if self.n_step > 1 else []):
+            core.connect("external_batch_"+in_, (self.loss_function, in_), label="ext")
+
         # Only send ext and mem labelled ops into loss function.
         q_values_socket = "q_values" if self.dueling_q is True else "action_layer_output_reshaped"
         core.connect((self.policy, q_values_socket), (self.loss_function, "q_values"), label="ext,mem,s")
@@ -160,6 +192,13 @@ class DQNAgent(Agent):
         core.connect((self.policy, "_variables"), (self.target_policy, "_values"))
         core.connect((self.target_policy, "sync"), "sync_target_qnet")
 
+        # Get/set the policy's weights as one flat vector (see `Agent.get_weights`).
+        core.add_components(self.flat_weights)
+        core.connect((self.policy, "_variables"), (self.flat_weights, "variables"))
+        core.connect("flat_weights", (self.flat_weights, "flat_weights_in"))
+        core.connect((self.flat_weights, "flat_weights"), "get_flat_weights")
+        core.connect((self.flat_weights, "set_flat_weights"), "set_flat_weights")
+
     def _assemble_meta_graph_test(self, core, preprocessor, memory, merger, splitter, policy, target_policy,
                                   exploration, loss_function, optimizer):
         # Define our Spaces.
@@ -240,13 +279,25 @@ class DQNAgent(Agent):
         core.define_outputs("update_from_external_batch", update_from_external)
 
     def get_action(self, states, deterministic=False):
+        return self._act_and_observe_graph(states, records=None, deterministic=deterministic)
+
+    def _act_and_observe_graph(self, states, records, deterministic=False):
         batched_states = self.state_space.batched(states)
         remove_batch_rank = batched_states.ndim == np.asarray(states).ndim + 1
         # Increase timesteps by the batch size (number of states in batch).
         self.timesteps += len(batched_states)
-        actions = self.graph_executor.execute(
-            "get_actions", inputs=dict(states_from_env=batched_states, time_step=self.timesteps)
-        )
+        inputs = dict(states_from_env=batched_states, time_step=self.timesteps)
+        if records is None:
+            actions = self.graph_executor.execute("get_actions", inputs=inputs)
+        else:
+            # Insert the completed transition(s) in the same graph execution.
+            inputs.update(
+                states_for_memory=records["states"],
+                actions_for_memory=records["actions"],
+                rewards_for_memory=records["rewards"],
+                terminals_for_memory=records["terminals"]
+            )
+            actions, _ = self.graph_executor.execute(["get_actions", "insert_records"], inputs=inputs)
         #print("states={} action={} q_values={} do_explore={}".format(states, actions, q_values, do_explore))
         if remove_batch_rank:
             return actions[0]
@@ -265,6 +316,8 @@ class DQNAgent(Agent):
         if (self.timesteps - 1) % self.update_spec["sync_interval"] == 0:
             self.graph_executor.execute("sync_target_qnet")
         if batch is None:
+            if self.prefetcher is not None:
+                self.wait_for_prefetched_batch()
             _, loss = self.graph_executor.execute(["update_from_memory", "loss"])
         else:
             batch_input = dict(
@@ -274,6 +327,9 @@ class DQNAgent(Agent):
                 external_batch_terminals=batch["terminals"],
                 external_batch_next_states=batch["next_states"]
             )
+            if self.n_step > 1:
+                assert "discounts" in batch, "ERROR: External batches for n-step updates must contain 'discounts'!"
+                batch_input["external_batch_discounts"] = batch["discounts"]
             _, loss = self.graph_executor.execute(
                 ["update_from_external_batch", "loss"], inputs=batch_input
             )
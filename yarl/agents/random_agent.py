@@ -17,6 +17,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import numpy as np
+
 from yarl.agents import Agent
 
 
@@ -32,7 +34,11 @@ class RandomAgent(Agent):
         super(RandomAgent, self).__init__(state_space, action_space)
 
     def get_action(self, states, deterministic=False):
-        return self.action_space.sample()
+        batched_states = self.state_space.batched(states)
+        # Single state -> single action.
+        if batched_states.ndim == np.asarray(states).ndim + 1:
+            return self.action_space.sample()
+        return self.action_space.sample(size=len(batched_states))
 
     def update(self, batch=None):
         pass
@@ -24,6 +24,8 @@ from yarl.components.common.decay_components import *
 from yarl.components.common.noise_components import *
 from yarl.components.common.fixed_loop import FixedLoop
 from yarl.components.common.sampler import Sampler
+from yarl.components.common.batch_prefetcher import BatchPrefetcher
+from yarl.components.common.flat_weights import FlatWeights
 
 
 DecayComponent.__lookup_classes__ = dict(
@@ -44,5 +46,5 @@ __all__ = ["Splitter", "Merger",
            "Synchronizable",
            "DecayComponent", "LinearDecay", "PolynomialDecay", "ExponentialDecay",
            "NoiseComponent", "ConstantNoise", "GaussianNoise", "OrnsteinUhlenbeckNoise",
-           "FixedLoop", "Sampler"]
+           "FixedLoop", "Sampler", "BatchPrefetcher", "FlatWeights"]
 
@@ -0,0 +1,108 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from yarl import get_backend
+from yarl.components import Component
+from yarl.utils.ops import FlattenedDataOp
+from yarl.utils.util import dtype, force_list
+
+if get_backend() == "tf":
+    import tensorflow as tf
+
+
+class BatchPrefetcher(Component):
+    """
+    A FIFO queue holding up to `capacity` complete batches (e.g. sampled from a Memory). Some (background) caller
+    keeps running "enqueue" to fill the queue, while the learner consumes batches from "output", so pulling the
+    next batch from the memory overlaps with the current update step.
+
+    API:
+    ins:
+        input (any): The batch to enqueue (e.g. a Memory's "get_records").
+    outs:
+        enqueue (no_op): Pulls a batch from "input" and puts it into the queue (blocks while the queue is full).
+        output (any): Takes the oldest batch out of the queue (blocks while the queue is empty). Does not
+            pull from "input".
+        queue_size (int): The number of batches currently in the queue.
+        close (no_op): Closes the queue and cancels all pending (blocking) enqueues.
+    """
+    def __init__(self, capacity=2, scope="batch-prefetcher", **kwargs):
+        """
+        Args:
+            capacity (int): The maximum number of batches to keep ready.
+        """
+        super(BatchPrefetcher, self).__init__(scope=scope, **kwargs)
+        self.capacity = capacity
+
+        # The queue and the order of the flat keys in it (will be populated in create_variables).
+        self.queue = None
+        self.flat_spaces = None
+
+        self.define_inputs("input")
+        self.define_outputs("enqueue", "output", "queue_size", "close")
+        self.add_graph_fn("input", "enqueue", self._graph_fn_enqueue, flatten_ops=True)
+        # The following only need the "input" to know our record structure, they never pull from it.
+        self.add_graph_fn("input", "output", self._graph_fn_dequeue, flatten_ops=True)
+        self.add_graph_fn("input", "queue_size", self._graph_fn_queue_size, flatten_ops=True)
+        self.add_graph_fn("input", "close", self._graph_fn_close, flatten_ops=True)
+
+    def create_variables(self, input_spaces, action_space):
+        self.flat_spaces = input_spaces["input"].flatten()
+        if get_backend() == "tf":
+            self.queue = tf.FIFOQueue(
+                capacity=self.capacity,
+                dtypes=[dtype(space.dtype) for space in self.flat_spaces.values()],
+                name="prefetch-queue"
+            )
+
+    def _graph_fn_enqueue(self, input_):
+        """
+        Args:
+            input_ (FlattenedDataOp): The flattened batch to enqueue.
+
+        Returns:
+            DataOp: The enqueue op.
+        """
+        if get_backend() == "tf":
+            return self.queue.enqueue(vals=[input_[key] for key in self.flat_spaces.keys()])
+
+    def _graph_fn_dequeue(self, input_):
+        """
+        Args:
+            input_ (FlattenedDataOp): Not used (the dequeued batch has the same structure).
+
+        Returns:
+            FlattenedDataOp: The dequeued batch (will be unflattened automatically).
+        """
+        if get_backend() == "tf":
+            values = force_list(self.queue.dequeue())
+            batch = FlattenedDataOp()
+            for (key, space), value in zip(self.flat_spaces.items(), values):
+                # Queue outputs come without static shapes.
+                value.set_shape(space.get_shape(with_batch_rank=True))
+                batch[key] = value
+            return batch
+
+    def _graph_fn_queue_size(self, input_):
+        if get_backend() == "tf":
+            return self.queue.size()
+
+    def _graph_fn_close(self, input_):
+        if get_backend() == "tf":
+            return self.queue.close(cancel_pending_enqueues=True)
@@ -0,0 +1,87 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+from yarl import get_backend
+from yarl.components import Component
+from yarl.utils.util import get_shape
+
+if get_backend() == "tf":
+    import tensorflow as tf
+
+
+class FlatWeights(Component):
+    """
+    Reads/writes a set of variables (e.g. a Policy's) as a single flat float32 vector, so weights can be moved
+    as one contiguous buffer instead of a dict of many small arrays. Variables are packed in the order of their
+    (sorted) names, so the layout is the same in all copies of the same Component.
+
+    API:
+    ins:
+        variables (DataOpDict): The variables to read/write (connect from another Component's "_variables").
+        flat_weights_in (DataOp): 1D float32 vector of all variables' values (the output of "flat_weights").
+    outs:
+        flat_weights (DataOp): All variables' values, flattened and concatenated.
+        set_flat_weights (no_op): Assigns the slices of "flat_weights_in" to the variables.
+    """
+    def __init__(self, scope="flat-weights", **kwargs):
+        super(FlatWeights, self).__init__(scope=scope, **kwargs)
+
+        self.define_inputs("variables", "flat_weights_in")
+        self.define_outputs("flat_weights", "set_flat_weights")
+        self.add_graph_fn("variables", "flat_weights", self._graph_fn_flat_weights, flatten_ops=False)
+        self.add_graph_fn(["variables", "flat_weights_in"], "set_flat_weights", self._graph_fn_set_flat_weights,
+                          flatten_ops=False)
+
+    def _graph_fn_flat_weights(self, variables):
+        """
+        Args:
+            variables (DataOpDict): The variables to read.
+
+        Returns:
+            DataOp: The 1D float32 vector holding all variables' values.
+        """
+        if get_backend() == "tf":
+            return tf.concat([tf.reshape(tf.cast(variables[key], tf.float32), shape=(-1,))
+                              for key in sorted(variables)], axis=0)
+
+    def _graph_fn_set_flat_weights(self, variables, flat_weights_in):
+        """
+        Args:
+            variables (DataOpDict): The variables to assign to.
+            flat_weights_in (DataOp): The 1D float32 vector to split into the variables' values.
+
+        Returns:
+            DataOp: The op assigning all variables.
+        """
+        assigns = list()
+        offset = 0
+        for key in sorted(variables):
+            variable = variables[key]
+            shape = get_shape(variable)
+            size = int(np.prod(shape))
+            if get_backend() == "tf":
+                value = tf.reshape(flat_weights_in[offset:offset + size], shape=shape)
+                assigns.append(self.assign_variable(variable, tf.cast(value, variable.dtype)))
+            offset += size
+
+        if get_backend() == "tf":
+            with tf.control_dependencies(assigns):
+                return tf.no_op()
@@ -33,18 +33,25 @@ class DQNLossFunction(LossFunction):
     Where Qn is the "normal" Q-network and Qt is the "target" net (which is a little behind Qn for stability purposes).
     """
 
-    def __init__(self, double_q=False, scope="dqn-loss-function", **kwargs):
+    def __init__(self, double_q=False, n_step=1, scope="dqn-loss-function", **kwargs):
         """
         Args:
             double_q (bool): Whether to use the double DQN loss function (see DQNAgent [2]).
+            n_step (int): The number of steps in the (n-step) transitions coming from the memory. The incoming
+                rewards must be the discounted n-step rewards, s' the state after n steps. If > 1, the bootstrap
+                discount of each transition (gamma^k for transitions truncated to k steps) comes in via the
+                additional in-Socket "discounts". Default: 1.
         """
         self.double_q = double_q
+        self.n_step = n_step
 
         # Pass our in-Socket names to parent c'tor.
         input_sockets = ["q_values", "actions", "rewards", "terminals", "qt_values_s_"]
         # For double-Q, we need an additional input for the q-net's s'-q-values (not the target's ones!).
         if self.double_q:
             input_sockets.append("q_values_s_")
+        if self.n_step > 1:
+            input_sockets.append("discounts")
 
         super(DQNLossFunction, self).__init__(
             *input_sockets, scope=scope, **kwargs
@@ -63,7 +70,7 @@ class DQNLossFunction(LossFunction):
         )
         self.ranks_to_reduce = len(self.action_space.get_shape(with_batch_rank=True)) - 1
 
-    def _graph_fn_loss_per_item(self, q_values_s, actions, rewards, terminals, qt_values_sp, q_values_sp=None):
+    def _graph_fn_loss_per_item(self, q_values_s, actions, rewards, terminals, qt_values_sp, *inputs):
         """
         Args:
             q_values_s (SingleDataOp): The batch of Q-values representing the expected accumulated discounted returns
@@ -74,13 +81,18 @@ class DQNLossFunction(LossFunction):
                 (from a memory).
             qt_values_sp (SingleDataOp): The batch of Q-values representing the expected accumulated discounted
                 returns (estimated by the target net) when in s' and taking different actions a'.
-            q_values_sp (Optional[SingleDataOp]): If `self.double_q` is True: The batch of Q-values representing the
-                expected accumulated discounted returns (estimated by the (main) policy net) when in s' and taking
-                different actions a'.
+            inputs (SingleDataOp): The optional inputs (in this order):
+                - q_values_sp: If `self.double_q` is True: The batch of Q-values representing the expected
+                    accumulated discounted returns (estimated by the (main) policy net) when in s' and taking
+                    different actions a'.
+                - discounts: If `self.n_step` > 1: The batch of discounts to apply to the Q-values of s'.
 
         Returns:
             SingleDataOp: The loss values vector (one single value for each batch item).
         """
+        q_values_sp = inputs[0] if self.double_q else None
+        discounts = inputs[-1] if self.n_step > 1 else self.discount
+
         if get_backend() == "tf":
             if self.double_q:
                 # For double-Q, we no longer use the max(a')Qt(s'a') value.
@@ -94,9 +106,11 @@ class DQNLossFunction(LossFunction):
                 # Qt(s',a') -> Use the max(a') value (from the target network).
                 qt_sp_ap_values = tf.reduce_max(input_tensor=qt_values_sp, axis=-1)
 
-            # Make sure the rewards vector (batch) is broadcast correctly.
+            # Make sure the rewards (and discounts) vector (batch) is broadcast correctly.
             for _ in range(get_rank(qt_sp_ap_values) - 1):
                 rewards = tf.expand_dims(rewards, axis=1)
+                if self.n_step > 1:
+                    discounts = tf.expand_dims(discounts, axis=1)
 
             # Ignore Q(s'a') values if s' is a terminal state. Instead use 0.0 as the state-action value for s'a'.
             # Note that in that case, the next_state (s') is not the correct next state and should be disregarded.
@@ -110,7 +124,7 @@ class DQNLossFunction(LossFunction):
             q_s_a_values = tf.reduce_sum(input_tensor=(q_values_s * one_hot), axis=-1)
 
             # Calculate the TD-delta (target - current estimate).
-            td_delta = (rewards + self.discount * qt_sp_ap_values) - q_s_a_values
+            td_delta = (rewards + discounts * qt_sp_ap_values) - q_s_a_values
 
             # Reduce over the composite actions, if any.
             if get_rank(td_delta) > 1:
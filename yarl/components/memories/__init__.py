@@ -21,6 +21,9 @@ from yarl.components.memories.memory import Memory
 from yarl.components.memories.replay_memory import ReplayMemory
 from yarl.components.memories.ring_buffer import RingBuffer
 from yarl.components.memories.prioritized_replay import PrioritizedReplay
+from yarl.components.memories.memmap_replay_memory import MemmapReplayMemory
+from yarl.components.memories.mem_prioritized_replay import MemPrioritizedReplay
+from yarl.components.memories.mem_compressed_replay import MemCompressedReplay
 
 
 Memory.__lookup_classes__ = dict(
@@ -30,8 +33,15 @@ Memory.__lookup_classes__ = dict(
     ringbuffer=RingBuffer,
     prioritized=PrioritizedReplay,
     prioritizedreplay=PrioritizedReplay,
-    prioritizedreplaybuffer=PrioritizedReplay
+    prioritizedreplaybuffer=PrioritizedReplay,
+    memmap=MemmapReplayMemory,
+    memmapreplay=MemmapReplayMemory,
+    memmapreplaymemory=MemmapReplayMemory,
+    compressed=MemCompressedReplay,
+    compressedreplay=MemCompressedReplay,
+    memcompressedreplay=MemCompressedReplay
 )
 
-__all__ = ["Memory", "ReplayMemory", "RingBuffer", "PrioritizedReplay"]
+__all__ = ["Memory", "ReplayMemory", "RingBuffer", "PrioritizedReplay", "MemPrioritizedReplay",
+           "MemmapReplayMemory", "MemCompressedReplay"]
 
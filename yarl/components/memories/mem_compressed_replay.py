@@ -0,0 +1,317 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from concurrent.futures import ThreadPoolExecutor
+import re
+import threading
+import zlib
+import numpy as np
+from six.moves import xrange as range_
+import tensorflow as tf
+
+from yarl import YARLError
+from yarl.components.memories.memory import Memory
+from yarl.spaces.space_utils import flatten_op, unflatten_op
+from yarl.utils.ops import FlattenedDataOp
+from yarl.utils.util import dtype as dtype_
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+class MemCompressedReplay(Memory):
+    """
+    Host-side (NumPy) replay memory that stores selected record keys (by default all states) losslessly
+    compressed, one compressed blob per record, and decompresses them again when sampling. Compression and
+    decompression of a batch are split over a thread pool (zlib and lz4 release the GIL).
+    Meant for pixel observations, which usually compress 5-10x.
+
+    Can be used directly (`insert_records`/`get_records`) or as an Agent's Memory Component: Inserts and
+    sampling then run via `tf.py_func`, so the Socket API is the same as for `ReplayMemory`.
+
+    API:
+    ins:
+        records (any): The records to insert via a call to out-Socket "insert_records".
+        num_records (int): The number of records to pull via out-Socket "get_records".
+    outs:
+        insert_records (no_op): Triggers an insertion of in-Socket "records" into the memory.
+        get_records (any): Pulls "num_records" (in-Socket) single records from the memory and returns them.
+    """
+    def __init__(self, capacity=1000, next_states=True, compression="zlib", compression_level=1,
+                 compressed_keys=r'^/states\b', num_threads=4, scope="mem-compressed-replay", **kwargs):
+        """
+        Args:
+            next_states (bool): Whether to include s' in the returned records of `get_records`.
+            compression (str): One of "zlib" or "lz4" (requires the `lz4` package).
+            compression_level (int): The compression level passed to the compressor.
+            compressed_keys (str): Regexp for the flat record keys to compress. All other keys are stored
+                as plain arrays. Default: All states.
+            num_threads (int): The number of threads to (de)compress a batch with.
+        """
+        super(MemCompressedReplay, self).__init__(capacity, scope=scope, **kwargs)
+        if len(self.storage_dtypes) > 0:
+            raise YARLError("ERROR: MemCompressedReplay does not support `storage_dtypes` (records are stored "
+                            "losslessly compressed)!")
+        self.next_states = next_states
+
+        if compression == "zlib":
+            self.compress = lambda data: zlib.compress(data, compression_level)
+            self.decompress = zlib.decompress
+        elif compression == "lz4":
+            if lz4_frame is None:
+                raise YARLError("ERROR: compression='lz4' requires the `lz4` package!")
+            self.compress = lambda data: lz4_frame.compress(data, compression_level=compression_level)
+            self.decompress = lz4_frame.decompress
+        else:
+            raise YARLError("ERROR: Unknown compression '{}'! Use 'zlib' or 'lz4'.".format(compression))
+        self.compressed_keys = compressed_keys
+
+        self.num_threads = num_threads
+        self.thread_pool = ThreadPoolExecutor(max_workers=num_threads)
+        # Inserts and samples may be called from different threads (e.g. batch prefetching).
+        self.lock = threading.Lock()
+
+        # Flat record arrays (key=flat record key), created on first insert. Compressed keys hold object
+        # arrays of bytes.
+        self.record_registry = None
+        # Shape (without batch rank) and dtype of each compressed key.
+        self.compressed_specs = None
+        # Flat keys in the states-part of the records.
+        self.flat_state_keys = None
+        # Flat record keys in a fixed order (used for the py_func in- and outputs).
+        self.flat_keys = None
+
+        # Compressed size of each stored blob (key=flat record key).
+        self.compressed_sizes = None
+
+        self.index = 0
+        self.size = 0
+
+        self.define_inputs("num_records")
+        self.define_outputs("get_records")
+        self.add_graph_fn(inputs="num_records", outputs="get_records",
+                          method=self._graph_fn_get_records, flatten_ops=False)
+
+    def create_variables(self, input_spaces, action_space):
+        # No TF variables: Allocate the host-side arrays from the record Space.
+        self.record_space = input_spaces["records"]
+        self.allocate_records({
+            key: (tuple(space.shape), np.dtype(dtype_(space.dtype, to="np")))
+            for key, space in self.record_space.flatten().items()
+        })
+
+    def allocate_records(self, flat_specs):
+        """
+        Allocates the record arrays.
+
+        Args:
+            flat_specs (dict): Flat record key -> tuple of shape (without batch rank) and numpy dtype.
+        """
+        assert "/terminals" in flat_specs
+        self.flat_keys = list(flat_specs.keys())
+        self.record_registry = dict()
+        self.compressed_specs = dict()
+        self.compressed_sizes = dict()
+        for key, (shape, dtype) in flat_specs.items():
+            if re.search(self.compressed_keys, key):
+                self.compressed_specs[key] = (shape, dtype)
+                self.record_registry[key] = np.empty(shape=(self.capacity,), dtype=object)
+                self.compressed_sizes[key] = np.zeros(shape=(self.capacity,), dtype=np.int64)
+            else:
+                self.record_registry[key] = np.zeros(shape=(self.capacity,) + shape, dtype=dtype)
+
+        if self.next_states:
+            self.flat_state_keys = [key[len("/states"):] for key in self.record_registry
+                                    if key == "/states" or key.startswith("/states/")]
+            assert len(self.flat_state_keys) > 0, "ERROR: Records must contain 'states' to return next states!"
+
+    def _chunks(self, num_items):
+        """
+        Splits range(num_items) into (at most) `num_threads` contiguous slices.
+        """
+        bounds = np.linspace(0, num_items, min(self.num_threads, num_items) + 1).astype(np.int64)
+        return [slice(bounds[i], bounds[i + 1]) for i in range_(len(bounds) - 1)]
+
+    def _compress_batch(self, values):
+        """
+        Compresses each item (along the batch rank) of an array in the thread pool.
+
+        Returns:
+            list: The compressed blobs.
+        """
+        values = np.ascontiguousarray(values)
+
+        def compress_chunk(chunk):
+            return [self.compress(value.tobytes()) for value in values[chunk]]
+
+        blobs = list()
+        for chunk_blobs in self.thread_pool.map(compress_chunk, self._chunks(len(values))):
+            blobs.extend(chunk_blobs)
+        return blobs
+
+    def _decompress_batch(self, key, indices):
+        """
+        Decompresses the records of a compressed key at the given indices in the thread pool.
+
+        Returns:
+            np.ndarray: The decompressed batch.
+        """
+        shape, dtype = self.compressed_specs[key]
+        blobs = self.record_registry[key][indices]
+        output = np.empty(shape=(len(indices),) + shape, dtype=dtype)
+
+        def decompress_chunk(chunk):
+            for i in range_(chunk.start, chunk.stop):
+                output[i] = np.frombuffer(self.decompress(blobs[i]), dtype=dtype).reshape(shape)
+
+        # Consume the iterator to wait for all chunks (and re-raise their errors).
+        list(self.thread_pool.map(decompress_chunk, self._chunks(len(indices))))
+        return output
+
+    def insert_records(self, records):
+        """
+        Inserts a batch of records.
+
+        Args:
+            records (dict): (Possibly nested) dict of record arrays. Must contain 'terminals'.
+        """
+        flat_records = {key: np.asarray(value) for key, value in flatten_op(records).items()}
+        with self.lock:
+            if self.record_registry is None:
+                self.allocate_records({key: (value.shape[1:], value.dtype) for key, value in flat_records.items()})
+            self._insert_flat_records(flat_records)
+
+    def _insert_flat_records(self, flat_records):
+        num_records = len(flat_records["/terminals"])
+        update_indices = np.arange(self.index, self.index + num_records) % self.capacity
+        for key, variable in self.record_registry.items():
+            if key in self.compressed_specs:
+                blobs = self._compress_batch(flat_records[key])
+                for index, blob in zip(update_indices, blobs):
+                    variable[index] = blob
+                self.compressed_sizes[key][update_indices] = [len(blob) for blob in blobs]
+            else:
+                variable[update_indices] = flat_records[key]
+
+        self.index = (self.index + num_records) % self.capacity
+        self.size = min(self.size + num_records, self.capacity)
+
+    def read_records(self, indices):
+        """
+        Obtains (decompressed) record values for the provided indices.
+
+        Args:
+            indices (ndarray): Indices to read.
+
+        Returns:
+             dict: (Re-nested) record dict.
+        """
+        return unflatten_op(self._read_flat_records(indices))
+
+    def _read_flat_records(self, indices):
+        records = dict()
+        for name, variable in self.record_registry.items():
+            if name in self.compressed_specs:
+                records[name] = self._decompress_batch(name, indices)
+            else:
+                records[name] = variable[indices]
+        if self.next_states:
+            next_indices = (indices + 1) % self.capacity
+
+            # Next states are read via index shift from state arrays.
+            for flat_state_key in self.flat_state_keys:
+                state_key = "/states" + flat_state_key
+                if state_key in self.compressed_specs:
+                    next_states = self._decompress_batch(state_key, next_indices)
+                else:
+                    next_states = self.record_registry[state_key][next_indices]
+                records["/next_states" + flat_state_key] = next_states
+        return records
+
+    def get_records(self, num_records):
+        """
+        Samples a batch of records uniformly (as `ReplayMemory`).
+
+        Args:
+            num_records (int): Number of records to sample.
+
+        Returns:
+            dict: The sampled records.
+        """
+        return unflatten_op(self._sample_flat_records(num_records))
+
+    def _sample_flat_records(self, num_records):
+        with self.lock:
+            if self.next_states:
+                # The newest record has no next state yet: Don't sample it as a transition start.
+                assert self.size > 1, "ERROR: Need at least 2 records to sample transitions with next states!"
+                offsets = np.random.randint(low=1, high=self.size, size=(num_records,))
+            else:
+                assert self.size > 0, "ERROR: Cannot sample from an empty memory!"
+                offsets = np.random.randint(low=0, high=self.size, size=(num_records,))
+            indices = (self.index - 1 - offsets) % self.capacity
+            return self._read_flat_records(indices)
+
+    def _graph_fn_insert(self, records):
+        def insert(*values):
+            with self.lock:
+                self._insert_flat_records(dict(zip(self.flat_keys, values)))
+            return np.asarray(self.size, dtype=np.int32)
+
+        insert_op = tf.py_func(
+            func=insert, inp=[records[key] for key in self.flat_keys], Tout=tf.int32, stateful=True
+        )
+        # Nothing to return.
+        with tf.control_dependencies(control_inputs=[insert_op]):
+            return tf.no_op()
+
+    def _graph_fn_get_records(self, num_records):
+        flat_spaces = self.record_space.flatten()
+        keys = list(self.flat_keys)
+        if self.next_states:
+            keys += ["/next_states" + flat_state_key for flat_state_key in self.flat_state_keys]
+        spaces = [flat_spaces[re.sub(r'^/next_states\b', "/states", key)] for key in keys]
+
+        def sample(num_records_):
+            flat_records = self._sample_flat_records(num_records_)
+            return [flat_records[key] for key in keys]
+
+        values = tf.py_func(
+            func=sample, inp=[num_records], Tout=[dtype_(space.dtype) for space in spaces], stateful=True
+        )
+        records = FlattenedDataOp()
+        for key, value, space in zip(keys, values, spaces):
+            value.set_shape((None,) + tuple(space.shape))
+            records[key] = value
+        return records
+
+    @property
+    def compression_ratio(self):
+        """
+        Returns:
+            float: The ratio of raw to compressed bytes of all currently stored compressed records.
+        """
+        if self.size == 0:
+            return 1.0
+        raw_bytes = self.size * sum(int(np.prod(shape)) * np.dtype(dtype).itemsize
+                                    for shape, dtype in self.compressed_specs.values())
+        compressed_bytes = sum(int(np.sum(sizes)) for sizes in self.compressed_sizes.values())
+        return raw_bytes / compressed_bytes
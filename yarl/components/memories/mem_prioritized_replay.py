@@ -0,0 +1,171 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+from yarl import Specifiable
+from yarl.components.memories.mem_segment_tree import MemSegmentTree
+from yarl.spaces.space_utils import flatten_op, unflatten_op
+
+
+class MemPrioritizedReplay(Specifiable):
+    """
+    Host-side prioritized replay backed by NumPy arrays and array-based sum/min segment trees.
+    Mirrors the API of the TensorFlow `PrioritizedReplay` Component (insert, get_records returning
+    records, indices and weights, update_records), but runs without any graph or session calls. This is
+    meant for replay shards that only store, sample and re-prioritize (e.g. in Ape-X).
+    """
+    def __init__(self, capacity=1000, next_states=True, alpha=1.0, beta=0.0):
+        """
+        Args:
+            capacity (int): Maximum capacity of the memory.
+            next_states (bool): Whether to include s' in the returned records of `get_records`.
+            alpha (float): Degree to which prioritization is applied, 0.0 implies no
+                prioritization (uniform), 1.0 full prioritization.
+            beta (float): Importance weight factor, 0.0 for no importance correction, 1.0
+                for full correction.
+        """
+        self.capacity = capacity
+        self.next_states = next_states
+
+        assert alpha > 0.0
+        self.alpha = alpha
+        self.beta = beta
+
+        # Flat record arrays (key=flat record key), created on first insert from the records' shapes and dtypes.
+        self.record_registry = None
+        # Flat keys in the states-part of the records.
+        self.flat_state_keys = None
+
+        self.index = 0
+        self.size = 0
+        self.max_priority = 1.0
+
+        # Segment tree must be full binary tree.
+        self.priority_capacity = 1
+        while self.priority_capacity < self.capacity:
+            self.priority_capacity *= 2
+
+        self.sum_segment_tree = MemSegmentTree(self.priority_capacity, operator=np.add)
+        self.min_segment_tree = MemSegmentTree(self.priority_capacity, operator=np.minimum)
+
+    def create_variables(self, flat_records):
+        """
+        Allocates the record arrays from a batch of flattened records.
+
+        Args:
+            flat_records (FlattenedDataOp): Flattened batch of records (first rank is the batch rank).
+        """
+        assert "/terminals" in flat_records
+        self.record_registry = dict()
+        for key, value in flat_records.items():
+            value = np.asarray(value)
+            self.record_registry[key] = np.zeros(shape=(self.capacity,) + value.shape[1:], dtype=value.dtype)
+
+        if self.next_states:
+            self.flat_state_keys = [key[len("/states"):] for key in self.record_registry
+                                    if key == "/states" or key.startswith("/states/")]
+            assert len(self.flat_state_keys) > 0, "ERROR: Records must contain 'states' to return next states!"
+
+    def insert_records(self, records):
+        """
+        Inserts a batch of records with the current max priority.
+
+        Args:
+            records (dict): (Possibly nested) dict of record arrays. Must contain 'terminals'.
+        """
+        flat_records = flatten_op(records)
+        if self.record_registry is None:
+            self.create_variables(flat_records)
+
+        num_records = len(flat_records["/terminals"])
+        update_indices = np.arange(self.index, self.index + num_records) % self.capacity
+        for key, variable in self.record_registry.items():
+            variable[update_indices] = flat_records[key]
+
+        self.index = (self.index + num_records) % self.capacity
+        self.size = min(self.size + num_records, self.capacity)
+
+        weight = self.max_priority ** self.alpha
+        self.sum_segment_tree.insert_batch(update_indices, weight)
+        self.min_segment_tree.insert_batch(update_indices, weight)
+
+    def read_records(self, indices):
+        """
+        Obtains record values for the provided indices.
+
+        Args:
+            indices (ndarray): Indices to read. Assumed to be not contiguous.
+
+        Returns:
+             dict: (Re-nested) record dict.
+        """
+        records = dict()
+        for name, variable in self.record_registry.items():
+            records[name] = variable[indices]
+        if self.next_states:
+            next_indices = (indices + 1) % self.capacity
+
+            # Next states are read via index shift from state arrays.
+            for flat_state_key in self.flat_state_keys:
+                next_states = self.record_registry["/states" + flat_state_key][next_indices]
+                records["/next_states" + flat_state_key] = next_states
+        return unflatten_op(records)
+
+    def get_records(self, num_records):
+        """
+        Samples a batch of records proportionally to their priorities.
+
+        Args:
+            num_records (int): Number of records to sample.
+
+        Returns:
+            tuple:
+                - dict: The sampled records.
+                - ndarray: The indices of the sampled records (for `update_records`).
+                - ndarray: The importance-sampling weights of the sampled records.
+        """
+        assert self.size > 0, "ERROR: Cannot sample from an empty memory!"
+        prob_sum = self.sum_segment_tree.reduce()
+        samples = np.random.random(size=(num_records,)) * prob_sum
+        # Guard against float round-off at the right edge of the stored range.
+        indices = np.minimum(self.sum_segment_tree.index_of_prefixsum_batch(samples), self.size - 1)
+
+        # Importance correction.
+        min_prob = self.min_segment_tree.reduce() / prob_sum
+        max_weight = (min_prob * self.size) ** (-self.beta)
+        sample_probs = self.sum_segment_tree.get(indices) / prob_sum
+        weights = (sample_probs * self.size) ** (-self.beta) / max_weight
+
+        return self.read_records(indices), indices, weights
+
+    def update_records(self, indices, update):
+        """
+        Updates the priorities of the given indices. If an index occurs more than once, the last
+        update for it wins.
+
+        Args:
+            indices (ndarray): Indices of the records to update.
+            update (ndarray): New (not yet alpha-exponentiated) priorities, e.g. the losses of the records.
+        """
+        update = np.asarray(update, dtype=np.float64)
+        priorities = update ** self.alpha
+        self.sum_segment_tree.insert_batch(indices, priorities)
+        self.min_segment_tree.insert_batch(indices, priorities)
+        self.max_priority = max(self.max_priority, float(np.max(update)))
@@ -0,0 +1,114 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+
+class MemSegmentTree(object):
+    """
+    Array-based segment tree living in host memory (NumPy), mirroring the TensorFlow `SegmentTree`.
+    Node 1 is the root, the leaves are stored at positions [capacity, 2 * capacity).
+    """
+    def __init__(self, capacity, operator=np.add):
+        """
+        Args:
+            capacity (int): Capacity of the segment tree. Must be a power of 2.
+            operator (Union(np.add, np.minimum, np.maximum)): Reduce operation of the tree.
+        """
+        assert capacity > 0 and capacity & (capacity - 1) == 0, "ERROR: Capacity must be a power of 2!"
+        self.capacity = capacity
+        self.operator = operator
+
+        # Init with neutral element of the reduce op.
+        if operator == np.add:
+            neutral_element = 0.0
+        elif operator == np.minimum:
+            neutral_element = float('inf')
+        elif operator == np.maximum:
+            neutral_element = float('-inf')
+        else:
+            raise ValueError("Unsupported reduce OP. Support ops are [np.add, np.minimum, np.maximum]")
+        self.values = np.full(shape=(2 * capacity,), fill_value=neutral_element, dtype=np.float64)
+
+    def insert_batch(self, indices, elements):
+        """
+        Inserts a batch of elements. All leaves are set at once, then the affected parents are recomputed
+        one tree level at a time. If an index occurs more than once, the last element for it wins.
+
+        Args:
+            indices (ndarray): 1D int array of insertion indices.
+            elements (ndarray): 1D array of elements to insert (one per index).
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        elements = np.broadcast_to(np.asarray(elements, dtype=np.float64), indices.shape)
+
+        # Last write wins: Keep the last occurrence of each index.
+        unique_indices, reverse_positions = np.unique(indices[::-1], return_index=True)
+        update_indices = unique_indices + self.capacity
+        self.values[update_indices] = elements[::-1][reverse_positions]
+
+        level_size = self.capacity
+        while level_size > 1:
+            update_indices = np.unique(update_indices // 2)
+            self.values[update_indices] = self.operator(
+                self.values[2 * update_indices], self.values[2 * update_indices + 1]
+            )
+            level_size //= 2
+
+    def get(self, index):
+        """
+        Reads an item (or a batch of items) from the segment tree.
+
+        Args:
+            index (Union[int,ndarray]): Index or 1D array of indices to read.
+
+        Returns:
+            Union[float,ndarray]: The element(s).
+        """
+        return self.values[self.capacity + index]
+
+    def index_of_prefixsum_batch(self, prefix_sums):
+        """
+        Identifies for each prefix sum the highest index which satisfies the condition that the sum over all
+        elements from 0 till the index is <= prefix_sum. Descends the tree for all prefix sums together.
+
+        Args:
+            prefix_sums (ndarray): 1D float array of upper bounds on the prefixes we are allowed to select.
+
+        Returns:
+            ndarray: 1D int array of indices satisfying the prefix sum condition.
+        """
+        prefix_sums = np.array(prefix_sums, dtype=np.float64)
+        index = np.ones(shape=prefix_sums.shape, dtype=np.int64)
+
+        level_size = self.capacity
+        while level_size > 1:
+            left_values = self.values[2 * index]
+            go_left = left_values > prefix_sums
+            index = np.where(go_left, 2 * index, 2 * index + 1)
+            prefix_sums = np.where(go_left, prefix_sums, prefix_sums - left_values)
+            level_size //= 2
+
+        return index - self.capacity
+
+    def reduce(self):
+        """
+        Returns the result of the reduce operation over all elements (the root node).
+        """
+        return self.values[1]
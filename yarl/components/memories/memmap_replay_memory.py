@@ -0,0 +1,272 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import numpy as np
+import tensorflow as tf
+
+from yarl.components.memories.memory import Memory
+from yarl.utils.ops import FlattenedDataOp
+from yarl.utils.util import dtype as dtype_
+
+_logger = logging.getLogger(__name__)
+
+
+class MemmapReplayMemory(Memory):
+    """
+    Replay memory whose records live in `numpy.memmap` files on disk (one .npy file per flat record key) instead
+    of in TF variables. Allows capacities far beyond RAM. Inserts are ring writes, sampling reads random
+    indices, both run via `tf.py_func`, so the Socket API is the same as for `ReplayMemory`.
+    Existing files in `directory` (with matching shapes and dtypes) are reopened, together with the stored
+    index and size, so a restarted run continues with the records already collected. If any file has to be
+    recreated, the stored index and size are discarded (the memory starts empty).
+    Records with a storage dtype (see `Memory`) are stored in that dtype on disk.
+
+    API:
+    ins:
+        records (any): The records to insert via a call to out-Socket "insert_records".
+        num_records (int): The number of records to pull via out-Socket "get_records".
+    outs:
+        insert_records (no_op): Triggers an insertion of in-Socket "records" into the memory.
+        get_records (any): Pulls "num_records" (in-Socket) single records from the memory and returns them.
+    """
+    def __init__(self, capacity=1000, next_states=True, directory=None, meta_write_interval=1.0,
+                 scope="memmap-replay-memory", **kwargs):
+        """
+        Args:
+            next_states (bool): If true include next states in the return values of the out-Socket "get_records".
+            directory (Optional[str]): The directory holding the memory files. Will be created if it doesn't exist.
+                Default: None (use a new temporary directory).
+            meta_write_interval (float): The minimum time (in sec) between two writes of the index and size
+                to the meta file on insert. `flush` always writes them.
+        """
+        super(MemmapReplayMemory, self).__init__(capacity, scope=scope, **kwargs)
+
+        self.next_states = next_states
+        self.directory = directory
+
+        # Flat record keys in a fixed order (used for the py_func in- and outputs).
+        self.flat_keys = None
+        # Flat state keys (for next states).
+        self.states = None
+        # Index and size of the memory (host-side, stored in the meta file).
+        self.index = 0
+        self.size = 0
+        self.meta_write_interval = meta_write_interval
+        self.last_meta_write = None
+        # Whether all record files were reopened unchanged (only then the stored meta is valid).
+        self.records_reopened = True
+        # Inserts and reads may be called from different threads.
+        self.lock = threading.Lock()
+
+        self.define_inputs("num_records")
+        self.define_outputs("get_records")
+        self.add_graph_fn(inputs="num_records", outputs="get_records",
+                          method=self._graph_fn_get_records, flatten_ops=False)
+
+    def create_variables(self, input_spaces, action_space):
+        # No TF variables: Open (or create) one memory-mapped file per flat record key.
+        self.record_space = input_spaces["records"]
+
+        # Record space must contain 'terminals' for a replay memory.
+        assert 'terminals' in self.record_space
+
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="yarl-memmap-")
+        elif not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        self.records_reopened = True
+        self.record_registry = self.record_space.flatten(mapping=self._open_record_file)
+        self.flat_keys = list(self.record_registry.keys())
+        if self.next_states:
+            assert 'states' in self.record_space
+            self.states = ["/states{}".format(flat_key) for flat_key in self.record_space["states"].flatten().keys()]
+
+        meta = self._read_meta()
+        if meta is not None:
+            if meta["capacity"] == self.capacity and self.records_reopened:
+                self.index = meta["index"]
+                self.size = meta["size"]
+            else:
+                _logger.warning("Memory files in '{}' do not match the record Space or capacity: Starting with "
+                                "an empty memory.".format(self.directory))
+                self._write_meta()
+
+    def _open_record_file(self, key, primitive):
+        """
+        Opens the memory file for a single flat record key. Reopens an existing file if its shape and
+        (storage) dtype match, otherwise creates a new (zeroed) one.
+
+        Args:
+            key (str): The flat record key.
+            primitive (Space): The primitive Space of the record key.
+
+        Returns:
+            np.memmap: The memory-mapped array of shape [capacity] + the Space's shape.
+        """
+        path = os.path.join(self.directory, "{}.npy".format(re.sub(r'/', "-", key.strip("/"))))
+        shape = (self.capacity,) + tuple(primitive.shape)
+        storage_dtype = self.get_storage_dtype(key, primitive)
+        dtype = np.dtype(dtype_(primitive.dtype if storage_dtype is None else storage_dtype, to="np"))
+        if os.path.exists(path):
+            array = np.lib.format.open_memmap(path, mode="r+")
+            if array.shape == shape and array.dtype == dtype:
+                return array
+            del array
+        self.records_reopened = False
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+    def _read_meta(self):
+        path = os.path.join(self.directory, "meta.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as fp:
+            return json.load(fp)
+
+    def _write_meta(self):
+        path = os.path.join(self.directory, "meta.json")
+        with open(path + ".tmp", "w") as fp:
+            json.dump(dict(capacity=self.capacity, index=self.index, size=self.size), fp)
+        # Atomic replace, so a crash never leaves a half-written meta file (os.rename on Python 2: atomic on POSIX).
+        getattr(os, "replace", os.rename)(path + ".tmp", path)
+        self.last_meta_write = time.time()
+
+    def flush(self):
+        """
+        Flushes all memory files and the meta file to disk.
+        """
+        with self.lock:
+            for array in self.record_registry.values():
+                array.flush()
+            self._write_meta()
+
+    def to_storage_array(self, key, value):
+        """
+        Converts record values to the storage dtype of the given flat key (if any). NumPy version of
+        `Memory.to_storage`.
+        """
+        if key not in self.storage_conversions:
+            return value
+        storage_dtype = self.record_registry[key].dtype
+        _, scale = self.storage_conversions[key]
+        value = np.asarray(value)
+        if scale != 1.0:
+            value = value * scale
+        if np.issubdtype(storage_dtype, np.integer):
+            info = np.iinfo(storage_dtype)
+            value = np.clip(np.round(value), info.min, info.max)
+        return value.astype(storage_dtype)
+
+    def from_storage_array(self, key, value):
+        """
+        Converts stored values back to the dtype of the record Space. NumPy version of `read_record_variable`'s
+        conversion.
+        """
+        if key not in self.storage_conversions:
+            return value
+        space_dtype, scale = self.storage_conversions[key]
+        value = value.astype(dtype_(space_dtype, to="np"))
+        if scale != 1.0:
+            value = value / scale
+        return value
+
+    def insert_records(self, *values):
+        """
+        Writes a batch of records (one array per flat key, in order of `self.flat_keys`) into the memory files.
+
+        Returns:
+            np.ndarray: The new size of the memory.
+        """
+        with self.lock:
+            num_records = len(values[0])
+            update_indices = np.arange(self.index, self.index + num_records) % self.capacity
+            for key, value in zip(self.flat_keys, values):
+                self.record_registry[key][update_indices] = self.to_storage_array(key, value)
+            self.index = int((self.index + num_records) % self.capacity)
+            self.size = int(min(self.size + num_records, self.capacity))
+            if self.last_meta_write is None or \
+                    time.time() - self.last_meta_write >= self.meta_write_interval:
+                self._write_meta()
+            return np.asarray(self.size, dtype=np.int32)
+
+    def read_records(self, indices):
+        """
+        Obtains record values for the provided indices.
+
+        Args:
+            indices (np.ndarray): Indices to read. Assumed to be not contiguous.
+
+        Returns:
+            list: The record values in order of `self.flat_keys`, followed by the next states (if any) in
+                order of `self.states`.
+        """
+        records = [self.from_storage_array(key, self.record_registry[key][indices]) for key in self.flat_keys]
+        if self.next_states:
+            next_indices = (indices + 1) % self.capacity
+            records.extend([self.from_storage_array(key, self.record_registry[key][next_indices])
+                            for key in self.states])
+        return records
+
+    def sample_records(self, num_records):
+        """
+        Samples a batch of random records (as in `ReplayMemory`).
+
+        Args:
+            num_records (int): The number of records to sample.
+
+        Returns:
+            list: See `read_records`.
+        """
+        with self.lock:
+            indices = np.random.randint(low=0, high=max(self.size, 1), size=(num_records,))
+            indices = (self.index - 1 - indices) % self.capacity
+            # Sorted reads are much friendlier to the page cache.
+            return self.read_records(np.sort(indices))
+
+    def _graph_fn_insert(self, records):
+        insert_op = tf.py_func(
+            func=self.insert_records, inp=[records[key] for key in self.flat_keys], Tout=tf.int32, stateful=True
+        )
+        # Nothing to return.
+        with tf.control_dependencies(control_inputs=[insert_op]):
+            return tf.no_op()
+
+    def _graph_fn_get_records(self, num_records):
+        flat_spaces = self.record_space.flatten()
+        keys = self.flat_keys + ([re.sub(r'^/states\b', "/next_states", key) for key in self.states]
+                                 if self.next_states else [])
+        spaces = [flat_spaces[key] for key in self.flat_keys] + \
+                 ([flat_spaces[key] for key in self.states] if self.next_states else [])
+
+        values = tf.py_func(
+            func=self.sample_records, inp=[num_records], Tout=[dtype_(space.dtype) for space in spaces],
+            stateful=True
+        )
+        records = FlattenedDataOp()
+        for key, value, space in zip(keys, values, spaces):
+            value.set_shape((None,) + tuple(space.shape))
+            records[key] = value
+        return records
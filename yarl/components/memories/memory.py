@@ -17,7 +17,11 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+from six.moves import xrange as range_
+import tensorflow as tf
+
 from yarl.components import Component
+from yarl.utils.util import dtype as dtype_
 
 
 class Memory(Component):
@@ -30,10 +34,17 @@ class Memory(Component):
     outs:
         insert_records (no_op): Triggers an insertion of in-Socket "records" into the memory.
     """
-    def __init__(self, capacity=1000, scope="memory", **kwargs):
+    def __init__(self, capacity=1000, storage_dtypes=None, storage_scales=None, scope="memory", **kwargs):
         """
         Args:
             capacity (int): Maximum capacity of the memory.
+            storage_dtypes (Optional[dict]): Maps record keys (e.g. "states" or "states/image") to the dtype in
+                which to store these records (e.g. "uint8"). Records are converted on insert and cast back to
+                the dtype of the record Space on read (after gathering, so reads move the compact dtype).
+                Default: None (store all records in the dtype of their Space).
+            storage_scales (Optional[dict]): Maps record keys (with a storage dtype) to a scale factor.
+                Values are multiplied by it (and rounded for integer storage dtypes) on insert and divided by it
+                on read. E.g. 255.0 to store images preprocessed to [0.0, 1.0] as uint8. Default: 1.0.
         """
         super(Memory, self).__init__(scope=scope, **kwargs)
 
@@ -42,6 +53,11 @@ class Memory(Component):
         self.record_registry = None
         self.capacity = capacity
 
+        self.storage_dtypes = storage_dtypes or dict()
+        self.storage_scales = storage_scales or dict()
+        # Flat record keys stored in a different dtype than their Space's: key=flat key, value=(Space dtype, scale).
+        self.storage_conversions = dict()
+
         # Add default Sockets and insert GraphFunction.
         self.define_inputs("records")
         self.define_outputs("insert_records")
@@ -54,13 +70,158 @@ class Memory(Component):
         self.record_space = input_spaces["records"]
 
         # Create the main memory as a flattened OrderedDict from any arbitrarily nested Space.
-        self.record_registry = self.get_variable(
-            name="memory", trainable=False,
-            from_space=self.record_space,
-            flatten=True,
+        self.record_registry = self.record_space.flatten(mapping=self._create_record_variable)
+
+    def _create_record_variable(self, key, primitive, shape=None):
+        """
+        Creates the memory variable for a single flat record key (with capacity as its batch rank).
+
+        Args:
+            key (str): The flat record key.
+            primitive (Space): The primitive Space of the record key.
+            shape (Optional[tuple]): The shape of a single record if different from the Space's shape.
+
+        Returns:
+            tf.Variable: The memory variable for the key.
+        """
+        storage_dtype = self.get_storage_dtype(key, primitive)
+        if storage_dtype is None and shape is None:
+            return self.get_variable(name="memory" + key, trainable=False, from_space=primitive,
+                                     add_batch_rank=self.capacity)
+        return self.get_variable(
+            name="memory" + key,
+            shape=primitive.shape if shape is None else shape,
+            dtype=primitive.dtype if storage_dtype is None else storage_dtype,
+            trainable=False,
+            initializer=tf.zeros_initializer(),
             add_batch_rank=self.capacity
         )
 
+    def get_storage_dtype(self, key, primitive):
+        """
+        Looks up the storage dtype configured (via `storage_dtypes`) for a flat record key and registers the
+        conversion in `self.storage_conversions`. A configured key applies to the flat key itself and to all
+        flat keys below it (e.g. "states" matches "/states" and "/states/image", but not "/states_mask").
+
+        Args:
+            key (str): The flat record key.
+            primitive (Space): The primitive Space of the record key.
+
+        Returns:
+            Optional[str]: The storage dtype or None if the key is stored in the dtype of its Space.
+        """
+        for record_key, dtype in self.storage_dtypes.items():
+            prefix = "/" + record_key.strip("/")
+            if key == prefix or key.startswith(prefix + "/"):
+                self.storage_conversions[key] = (primitive.dtype, self.storage_scales.get(record_key, 1.0))
+                return dtype
+        return None
+
+    def to_storage(self, key, value):
+        """
+        Converts record values to the storage dtype of the given flat key (if any).
+
+        Args:
+            key (str): The flat record key.
+            value (tf.Tensor): The record values (in the dtype of the record Space).
+
+        Returns:
+            tf.Tensor: The values to write into the memory variable.
+        """
+        if key not in self.storage_conversions:
+            return value
+        storage_dtype = self.record_registry[key].dtype.base_dtype
+        _, scale = self.storage_conversions[key]
+        if scale != 1.0:
+            value = value * scale
+        if storage_dtype.is_integer:
+            value = tf.clip_by_value(
+                t=tf.round(x=value), clip_value_min=storage_dtype.min, clip_value_max=storage_dtype.max
+            )
+        return tf.cast(x=value, dtype=storage_dtype)
+
+    def n_step_transitions(self, indices, n_step, discount, newest_index=None):
+        """
+        Computes n-step transitions starting at the given indices with vectorized gathers: The discounted sum of
+        the (up to) `n_step` rewards, the effective terminal signal, the index of the last record in each
+        transition (s' is the state following it) and the discount to bootstrap from s' with. Transitions are
+        truncated at the first terminal.
+
+        Args:
+            indices (tf.Tensor): The indices of the first records of the transitions.
+            n_step (int): The (maximum) number of steps per transition.
+            discount (float): The discount factor (gamma) for the rewards.
+            newest_index (Optional[tf.Tensor]): The index of the most recently inserted record. If given,
+                transitions are also truncated before it, so s' is always a stored state (no steps into not yet
+                overwritten old records).
+
+        Returns:
+            tuple:
+                - tf.Tensor: The discounted n-step rewards.
+                - tf.Tensor: The terminal signals (True if an episode ended within the transition).
+                - tf.Tensor: The indices of the last records of the transitions.
+                - tf.Tensor: The bootstrap discounts (gamma^k for a transition of k steps).
+        """
+        reward_key = "/rewards" if "/rewards" in self.record_registry else "/reward"
+        rewards = self.read_record_variable(reward_key, indices)
+        terminals = self.read_record_variable("/terminals", indices)
+        last_indices = indices
+        num_steps = tf.ones_like(tensor=rewards)
+        if newest_index is not None:
+            # Number of records inserted after each index.
+            age = (newest_index - indices) % self.capacity
+        for i in range_(1, n_step):
+            step_indices = (indices + i) % self.capacity
+            # Only keep adding steps to transitions whose episode has not ended yet.
+            running = tf.logical_not(x=terminals)
+            if newest_index is not None:
+                running = tf.logical_and(x=running, y=i < age)
+            rewards += tf.where(
+                condition=running,
+                x=(discount ** i) * self.read_record_variable(reward_key, step_indices),
+                y=tf.zeros_like(tensor=rewards)
+            )
+            last_indices = tf.where(condition=running, x=step_indices, y=last_indices)
+            num_steps += tf.cast(x=running, dtype=num_steps.dtype)
+            terminals = tf.logical_or(x=terminals, y=tf.logical_and(
+                x=running, y=self.read_record_variable("/terminals", step_indices)
+            ))
+        return rewards, terminals, last_indices, tf.pow(x=tf.cast(x=discount, dtype=num_steps.dtype), y=num_steps)
+
+    def read_record_variable(self, key, indices=None):
+        """
+        Reads a memory variable by flat record key and converts the values back to the dtype
+        of the record Space (if stored in a different dtype).
+
+        Args:
+            key (str): The flat record key.
+            indices (Optional[np.ndarray,tf.Tensor]): Indices to fetch from the variable.
+
+        Returns:
+            tf.Tensor: The record values.
+        """
+        return self.from_storage(key, self.read_variable(self.record_registry[key], indices))
+
+    def from_storage(self, key, value):
+        """
+        Converts record values read from the memory variable of the given flat key back to the dtype of
+        the record Space (if stored in a different dtype).
+
+        Args:
+            key (str): The flat record key.
+            value (tf.Tensor): The record values (in the storage dtype).
+
+        Returns:
+            tf.Tensor: The record values.
+        """
+        if key not in self.storage_conversions:
+            return value
+        space_dtype, scale = self.storage_conversions[key]
+        value = tf.cast(x=value, dtype=dtype_(space_dtype))
+        if scale != 1.0:
+            value = value / scale
+        return value
+
     def _graph_fn_insert(self, records):
         """
         Inserts one or more complex records.
@@ -40,7 +40,8 @@ class PrioritizedReplay(Memory):
         insert_records (no_op): Triggers an insertion of in-Socket "records" into the memory.
         get_records (any): Pulls "num_records" (in-Socket) single records from the memory and returns them.
     """
-    def __init__(self, capacity=1000, next_states=True, alpha=1.0, beta=0.0, scope="prioritized-replay", **kwargs):
+    def __init__(self, capacity=1000, next_states=True, alpha=1.0, beta=0.0, n_step=1, discount=0.98,
+                 scope="prioritized-replay", **kwargs):
         """
         Args:
             next_states (bool): Whether to include s' in the return values of the out-Socket "get_records".
@@ -48,10 +49,16 @@ class PrioritizedReplay(Memory):
                 prioritization (uniform), 1.0 full prioritization.
             beta (float): Importance weight factor, 0.0 for no importance correction, 1.0
                 for full correction.
+            n_step (int): If > 1, return n-step transitions from "get_records" (see `ReplayMemory`), including
+                their bootstrap "discounts". Transitions starting within the n newest records are truncated before
+                the newest record. Default: 1.
+            discount (float): The discount factor (gamma) for n-step rewards. Should match the Agent's.
         """
         super(PrioritizedReplay, self).__init__(capacity, scope=scope, **kwargs)
 
         self.next_states = next_states
+        self.n_step = n_step
+        self.discount = discount
 
         # Variables.
         self.index = None
@@ -152,7 +159,7 @@ class PrioritizedReplay(Memory):
             record_updates.append(self.scatter_update_variable(
                 variable=self.record_registry[key],
                 indices=update_indices,
-                updates=records[key]
+                updates=self.to_storage(key, records[key])
             ))
 
         # Update indices and size.
@@ -162,31 +169,24 @@ class PrioritizedReplay(Memory):
             update_size = tf.minimum(x=(self.read_variable(self.size) + num_records), y=self.capacity)
             index_updates.append(self.assign_variable(self.size, value=update_size))
 
-        # Note: Cannot concurrently modify, so need iterative insert
-        def insert_body(i):
+        # All new records get the current max priority: Insert them into both trees as one batch
+        # (duplicate indices - if inserting more than capacity - all carry the same weight).
+        with tf.control_dependencies(control_inputs=index_updates):
             weight = tf.pow(x=self.max_priority, y=self.alpha)
-            sum_insert = self.sum_segment_tree.insert(
-                index=update_indices[i],
-                element=weight,
+            weights = tf.fill(dims=tf.shape(update_indices), value=weight)
+            sum_insert = self.sum_segment_tree.insert_batch(
+                indices=update_indices,
+                elements=weights,
                 insert_op=tf.add
             )
-
-            min_insert = self.min_segment_tree.insert(
-                index=update_indices[i],
-                element=weight,
+            min_insert = self.min_segment_tree.insert_batch(
+                indices=update_indices,
+                elements=weights,
                 insert_op=tf.minimum
             )
-            with tf.control_dependencies(control_inputs=[tf.group(sum_insert, min_insert)]):
-                return i + 1
-
-        def cond(i):
-            return i < num_records
-
-        with tf.control_dependencies(control_inputs=index_updates):
-            index = tf.while_loop(cond=cond, body=insert_body, loop_vars=[0])
 
         # Nothing to return.
-        with tf.control_dependencies(control_inputs=[index]):
+        with tf.control_dependencies(control_inputs=[sum_insert, min_insert]):
             return tf.no_op()
 
     def _graph_fn_get_records(self, num_records):
@@ -197,29 +197,20 @@ class PrioritizedReplay(Memory):
         # Sample the entire batch.
         sample = stored_elements_prob_sum * tf.random_uniform(shape=(num_records, ))
 
-        # Sample by looking up prefix sum.
-        sample_indices = tf.map_fn(fn=self.sum_segment_tree.index_of_prefixsum, elems=sample, dtype=tf.int32)
-        # sample_indices = self.sum_segment_tree.index_of_prefixsum(sample)
+        # Sample by looking up prefix sum (all samples at once).
+        sample_indices = self.sum_segment_tree.index_of_prefixsum_batch(sample)
 
         # Importance correction.
         total_prob = self.sum_segment_tree.reduce(start=0, limit=self.priority_capacity - 1)
         min_prob = self.min_segment_tree.get_min_value() / total_prob
         max_weight = tf.pow(x=min_prob * tf.cast(current_size, tf.float32), y=-self.beta)
 
-        def importance_sampling_fn(sample_index):
-            sample_prob = self.sum_segment_tree.get(sample_index) / stored_elements_prob_sum
-            weight = tf.pow(x=sample_prob * tf.cast(current_size, tf.float32), y=-self.beta)
-
-            return weight / max_weight
-
         # sample_indices = tf.Print(sample_indices, [sample_indices], summarize=1000,
         #                          message='sample indices in retrieve = ')
 
-        corrected_weights = tf.map_fn(
-            fn=importance_sampling_fn,
-            elems=sample_indices,
-            dtype=tf.float32
-        )
+        sample_probs = self.sum_segment_tree.get(sample_indices) / stored_elements_prob_sum
+        weights = tf.pow(x=sample_probs * tf.cast(current_size, tf.float32), y=-self.beta)
+        corrected_weights = weights / max_weight
         return self.read_records(indices=sample_indices), sample_indices, corrected_weights
 
     def read_records(self, indices):
@@ -233,51 +224,45 @@ class PrioritizedReplay(Memory):
              FlattenedDataOp: Record value dict.
         """
         records = FlattenedDataOp()
-        for name, variable in self.record_registry.items():
-            records[name] = self.read_variable(variable, indices)
+        for name in self.record_registry:
+            records[name] = self.read_record_variable(name, indices)
+
+        # The last record of each transition (s' follows it).
+        last_indices = indices
+        if self.n_step > 1:
+            reward_key = "/rewards" if "/rewards" in records else "/reward"
+            records[reward_key], records["/terminals"], last_indices, records["/discounts"] = \
+                self.n_step_transitions(
+                    indices, self.n_step, self.discount,
+                    newest_index=(self.read_variable(self.index) - 1) % self.capacity
+                )
+
         if self.next_states:
-            next_indices = (indices + 1) % self.capacity
+            next_indices = (last_indices + 1) % self.capacity
 
             # Next states are read via index shift from state variables.
             for flat_state_key in self.flat_state_keys:
-                next_states = self.read_variable(self.record_registry["/states"+flat_state_key], next_indices)
+                next_states = self.read_record_variable("/states"+flat_state_key, next_indices)
                 records["/next_states"+flat_state_key] = next_states
         return records
 
     def _graph_fn_update_records(self, indices, update):
-        num_records = get_batch_size(indices)
-        max_priority = 0.0
-
-        # Update has to be sequential.
-        def insert_body(i, max_priority_):
-            priority = tf.pow(x=update[i], y=self.alpha)
-
-            sum_insert = self.sum_segment_tree.insert(
-                index=indices[i],
-                element=priority,
-                insert_op=tf.add
-            )
-            min_insert = self.min_segment_tree.insert(
-                index=indices[i],
-                element=priority,
-                insert_op=tf.minimum
-            )
-            # Keep track of current max priority element.
-            max_priority_ = tf.maximum(x=max_priority_, y=priority)
-
-            with tf.control_dependencies(control_inputs=[tf.group(sum_insert, min_insert)]):
-                return i + 1, max_priority_
-
-        def cond(i, max_priority_):
-            return i < num_records - 1
-
-        _, max_priority = tf.while_loop(
-            cond=cond,
-            body=insert_body,
-            loop_vars=(0, max_priority)
+        # Update all priorities as one batch (if an index occurs more than once, its last update wins).
+        priorities = tf.pow(x=update, y=self.alpha)
+        sum_insert = self.sum_segment_tree.insert_batch(
+            indices=indices,
+            elements=priorities,
+            insert_op=tf.add
+        )
+        min_insert = self.min_segment_tree.insert_batch(
+            indices=indices,
+            elements=priorities,
+            insert_op=tf.minimum
         )
 
+        # Keep track of the max priority seen so far (priorities are exponentiated on insert).
+        max_priority = tf.maximum(x=self.read_variable(self.max_priority), y=tf.reduce_max(input_tensor=update))
         assignment = self.assign_variable(ref=self.max_priority, value=max_priority)
-        with tf.control_dependencies(control_inputs=[assignment]):
-            return tf.no_op()
 
+        with tf.control_dependencies(control_inputs=[sum_insert, min_insert, assignment]):
+            return tf.no_op()
@@ -18,6 +18,7 @@ from __future__ import division
 from __future__ import print_function
 
 import re
+from six.moves import xrange as range_
 import tensorflow as tf
 
 from yarl.components.memories.memory import Memory
@@ -41,16 +42,53 @@ class ReplayMemory(Memory):
         self,
         capacity=1000,
         next_states=True,
+        frame_stack=1,
+        n_step=1,
+        discount=0.98,
+        sampling="uniform",
+        sequence_length=1,
         scope="replay-memory",
         **kwargs
     ):
         """
         Args:
             next_states (bool): If true include next states in the return values of the out-Socket "get_records".
+            frame_stack (int): The number of frames stacked (concatenated in the last rank, e.g. by a `Sequence`
+                preprocessor) into each incoming state. If > 1, only the newest frame of each state is stored and
+                the full stacks for states and next states are rebuilt from the preceding records at read time
+                (not reaching across episode boundaries). This requires records to be inserted in the order they
+                were experienced (one environment per memory). Default: 1 (store states as they come in).
+            n_step (int): If > 1, return n-step transitions from "get_records": Rewards are the discounted sums of
+                the next `n_step` rewards, next states are the states after `n_step` steps and terminals are True
+                if the episode ended within these steps (transitions are truncated at terminals and before the
+                newest record). The records then also hold the "discounts" to bootstrap from the next states with
+                (gamma^k for transitions of k steps). Default: 1.
+            discount (float): The discount factor (gamma) for n-step rewards. Should match the Agent's.
+            sampling (str): How "get_records" picks records. One of:
+                "uniform": `num_records` independent uniform draws (duplicates possible).
+                "stratified": The stored range is split into `num_records` equal-width segments and one record is
+                    drawn from each (no duplicates as long as the memory holds at least `num_records` records).
+                "sequence": `num_records` sequences of `sequence_length` consecutive records each, returned
+                    back-to-back (sequence-major), i.e. a batch of size `num_records * sequence_length` that can be
+                    reshaped to [num_records, sequence_length]. Sequences may cross episode boundaries (check
+                    the terminals). Each sequence is read with slice reads (one per record variable, two if it
+                    wraps around the end of the memory). With frame_stack > 1 or n_step > 1, records depend on
+                    records outside their sequence and all sequences are gathered element-wise instead.
+                Default: "uniform".
+            sequence_length (int): The length of the sequences to sample (only for sampling="sequence").
         """
         super(ReplayMemory, self).__init__(capacity, scope=scope, **kwargs)
 
         self.next_states = next_states
+        self.frame_stack = frame_stack
+        self.n_step = n_step
+        self.discount = discount
+        assert sampling in ["uniform", "stratified", "sequence"], \
+            "ERROR: Unknown sampling mode '{}'!".format(sampling)
+        self.sampling = sampling
+        self.sequence_length = sequence_length if sampling == "sequence" else 1
+        # Size of a single frame in the last rank of each flat state key (only used if frame_stack > 1).
+        self.frame_dims = None
 
         self.index = None
         self.size = None
@@ -63,6 +101,9 @@ class ReplayMemory(Memory):
                           method=self._graph_fn_get_records, flatten_ops=False)
 
     def create_variables(self, input_spaces, action_space):
+        if self.frame_stack > 1:
+            assert 'states' in input_spaces["records"]
+            self.frame_dims = dict()
         super(ReplayMemory, self).create_variables(input_spaces, action_space)
 
         # Record space must contain 'terminals' for a replay memory.
@@ -79,6 +120,16 @@ class ReplayMemory(Memory):
             # as this would cause extra memory overhead.
             self.states = ["/states{}".format(flat_key) for flat_key in self.record_space["states"].flatten().keys()]
 
+    def _create_record_variable(self, key, primitive, shape=None):
+        # Stacked states: Only make room for a single frame per record.
+        if self.frame_stack > 1 and re.match(r'^/states\b', key):
+            shape = primitive.shape
+            assert len(shape) > 0 and shape[-1] % self.frame_stack == 0, \
+                "ERROR: Last rank of state '{}' must be divisible by frame_stack ({})!".format(key, self.frame_stack)
+            self.frame_dims[key] = shape[-1] // self.frame_stack
+            shape = shape[:-1] + (self.frame_dims[key],)
+        return super(ReplayMemory, self)._create_record_variable(key, primitive, shape)
+
     def _graph_fn_insert(self, records):
         num_records = get_batch_size(records["/terminals"])
         index = self.read_variable(self.index)
@@ -89,10 +140,14 @@ class ReplayMemory(Memory):
         #                           message='Update indices / index / num records = ')
         record_updates = list()
         for key in self.record_registry:
+            updates = records[key]
+            # Only store the newest frame of stacked states.
+            if self.frame_stack > 1 and key in self.frame_dims:
+                updates = updates[..., -self.frame_dims[key]:]
             record_updates.append(self.scatter_update_variable(
                 variable=self.record_registry[key],
                 indices=update_indices,
-                updates=records[key]
+                updates=self.to_storage(key, updates)
             ))
 
         # Update indices and size.
@@ -118,24 +173,163 @@ class ReplayMemory(Memory):
         """
 
         records = FlattenedDataOp()
-        for name, variable in self.record_registry.items():
-            records[name] = self.read_variable(variable, indices)
+        if self.frame_stack > 1:
+            frame_indices = self._frame_indices(indices)
+        for name in self.record_registry:
+            if self.frame_stack > 1 and name in self.frame_dims:
+                records[name] = self._read_stacked_frames(name, frame_indices)
+            else:
+                records[name] = self.read_record_variable(name, indices)
+
+        # The last record of each transition (s' follows it).
+        last_indices = indices
+        if self.n_step > 1:
+            reward_key = "/rewards" if "/rewards" in records else "/reward"
+            records[reward_key], records["/terminals"], last_indices, records["/discounts"] = \
+                self.n_step_transitions(
+                    indices, self.n_step, self.discount,
+                    newest_index=(self.read_variable(self.index) - 1) % self.capacity
+                )
+
         if self.next_states:
-            next_indices = (indices + 1) % self.capacity
+            next_indices = (last_indices + 1) % self.capacity
+            if self.frame_stack > 1:
+                next_frame_indices = self._frame_indices(next_indices)
 
             # Next states are read via index shift from state variables.
             for state_name in self.states:
-                next_states = self.read_variable(self.record_registry[state_name], next_indices)
+                if self.frame_stack > 1:
+                    next_states = self._read_stacked_frames(state_name, next_frame_indices)
+                else:
+                    next_states = self.read_record_variable(state_name, next_indices)
                 next_state_name = re.sub(r'^/states\b', "/next_states", state_name)
                 records[next_state_name] = next_states
 
         return records
 
+    def _frame_indices(self, indices):
+        """
+        Computes the memory indices of all frames that make up the stacked states at the given indices.
+        Frames before the start of an episode (or already overwritten ones) are replaced by the episode's
+        first frame, the same way the `Sequence` preprocessor pads after a reset.
+
+        Args:
+            indices (tf.Tensor): The indices of the records whose states to stack.
+
+        Returns:
+            List[tf.Tensor]: `frame_stack` index tensors (oldest frame first).
+        """
+        index = self.read_variable(self.index)
+        size = self.read_variable(self.size)
+        # How many records were inserted after each index.
+        age = (index - 1 - indices) % self.capacity
+
+        frame_indices = [indices]
+        valid = tf.ones_like(tensor=indices, dtype=tf.bool)
+        for i in range_(1, self.frame_stack):
+            previous_indices = (indices - i) % self.capacity
+            # A previous frame is invalid if it is no longer in memory or if it ended an episode (all
+            # frames before it then belong to earlier episodes as well).
+            valid = tf.logical_and(x=valid, y=(age + i) < size)
+            valid = tf.logical_and(x=valid, y=tf.logical_not(
+                x=self.read_variable(self.record_registry["/terminals"], previous_indices)
+            ))
+            frame_indices.insert(0, tf.where(condition=valid, x=previous_indices, y=frame_indices[0]))
+        return frame_indices
+
+    def _read_stacked_frames(self, key, frame_indices):
+        """
+        Reads the frames at the given indices and stacks them back together in the last rank.
+
+        Args:
+            key (str): The flat record key of the (single frame) state variable to read from.
+            frame_indices (List[tf.Tensor]): The frame indices as returned by `_frame_indices`.
+
+        Returns:
+            tf.Tensor: The stacked states.
+        """
+        return tf.concat(values=[self.read_record_variable(key, indices) for indices in frame_indices], axis=-1)
+
     def _graph_fn_get_records(self, num_records):
         size = self.read_variable(self.size)
 
         # Sample and retrieve a random range, including terminals.
         index = self.read_variable(self.index)
-        indices = tf.random_uniform(shape=(num_records,), maxval=size, dtype=tf.int32)
-        indices = (index - 1 - indices) % self.capacity
+        # Offsets count backwards from the newest record (offset 0). For n-step transitions, only sample records
+        # that are followed by at least n-1 records (for sequences: after the sequence's last record).
+        min_offset = tf.minimum(x=self.sequence_length - 1 + self.n_step - 1, y=size - 1)
+        if self.sampling == "stratified":
+            # One draw per equal-width segment of [min_offset, size).
+            segment_width = tf.cast(x=size - min_offset, dtype=tf.float32) / tf.cast(x=num_records, dtype=tf.float32)
+            positions = tf.cast(x=tf.range(start=0, limit=num_records), dtype=tf.float32) + \
+                tf.random_uniform(shape=(num_records,))
+            offsets = min_offset + tf.minimum(
+                x=tf.cast(x=positions * segment_width, dtype=tf.int32), y=size - min_offset - 1
+            )
+        else:
+            offsets = tf.random_uniform(shape=(num_records,), minval=min_offset, maxval=size, dtype=tf.int32)
+        indices = (index - 1 - offsets) % self.capacity
+
+        if self.sampling == "sequence":
+            # Each sampled index starts a run of `sequence_length` consecutive records (wrapping around the end
+            # of the memory).
+            if self.frame_stack == 1 and self.n_step == 1:
+                return self._read_sequences(start_indices=indices)
+            # Stacked frames and n-step transitions look beyond each record: Gather all runs element-wise.
+            sequence_indices = tf.expand_dims(input=indices, axis=1) + tf.range(start=0, limit=self.sequence_length)
+            indices = tf.reshape(tensor=sequence_indices % self.capacity, shape=(-1,))
         return self.read_records(indices=indices)
+
+    def _read_sequences(self, start_indices):
+        """
+        Reads `sequence_length` consecutive records from each start index with one slice read per sequence and
+        record variable (two if the sequence wraps around the end of the memory). Next states are read along
+        with the states (one more record per sequence) and shifted by one.
+
+        Args:
+            start_indices (tf.Tensor): The indices of the first records of the sequences.
+
+        Returns:
+             FlattenedDataOp: Record value dict (sequence-major, as returned by "get_records").
+        """
+        keys = list(self.record_registry.keys())
+        lengths = [self.sequence_length + 1 if self.next_states and key in self.states else self.sequence_length
+                   for key in keys]
+
+        def read_sequence(start):
+            return tuple(self._read_range(self.record_registry[key], start, length)
+                         for key, length in zip(keys, lengths))
+
+        sequences = tf.map_fn(
+            fn=read_sequence, elems=start_indices, back_prop=False,
+            dtype=tuple(self.record_registry[key].dtype.base_dtype for key in keys)
+        )
+
+        records = FlattenedDataOp()
+        for key, length, values in zip(keys, lengths, sequences):
+            # [num_records, length, ...] -> [num_records * length, ...].
+            record_shape = (-1,) + tuple(self.record_registry[key].get_shape().as_list()[1:])
+            if length > self.sequence_length:
+                next_state_name = re.sub(r'^/states\b', "/next_states", key)
+                records[next_state_name] = self.from_storage(key, tf.reshape(tensor=values[:, 1:], shape=record_shape))
+                values = values[:, :-1]
+            records[key] = self.from_storage(key, tf.reshape(tensor=values, shape=record_shape))
+        return records
+
+    def _read_range(self, variable, start, length):
+        """
+        Slices `length` consecutive records out of a memory variable, continuing at its start if the range
+        reaches past the end of the memory.
+
+        Args:
+            variable (tf.Variable): The memory variable to read from.
+            start (tf.Tensor): The index of the first record to read.
+            length (int): The number of records to read.
+
+        Returns:
+            tf.Tensor: The records (in the storage dtype).
+        """
+        # The part up to the end of the memory and the wrapped-around rest (empty if the range does not wrap).
+        head_length = tf.minimum(x=length, y=self.capacity - start)
+        values = tf.concat(values=[variable[start:start + head_length], variable[:length - head_length]], axis=0)
+        return tf.reshape(tensor=values, shape=(length,) + tuple(variable.get_shape().as_list()[1:]))
@@ -56,6 +56,7 @@ class RingBuffer(Memory):
 
         self.episode_semantics = episode_semantics
         self.num_episodes = None
+        self.episode_start = None
         self.episode_indices = None
         if self.episode_semantics:
             # Extend our interface ("get_episodes").
@@ -79,7 +80,10 @@ class RingBuffer(Memory):
             # Num episodes present.
             self.num_episodes = self.get_variable(name="num-episodes", dtype=int, trainable=False, initializer=0)
 
-            # Terminal indices contiguously arranged.
+            # Position of the oldest episode in `episode_indices`.
+            self.episode_start = self.get_variable(name="episode-start", dtype=int, trainable=False, initializer=0)
+
+            # Terminal indices of all stored episodes (circular, oldest first starting at `episode_start`).
             self.episode_indices = self.get_variable(
                 name="episode-indices",
                 shape=(self.capacity,),
@@ -97,60 +101,34 @@ class RingBuffer(Memory):
         if self.episode_semantics:
             # Episodes before inserting these records.
             prev_num_episodes = self.read_variable(self.num_episodes)
+            episode_start = self.read_variable(self.episode_start)
 
             # Newly inserted episodes.
             inserted_episodes = tf.reduce_sum(input_tensor=tf.cast(records['/terminals'], dtype=tf.int32), axis=0)
 
             # Episodes previously existing in the range we inserted to as indicated
-            # by count of terminals in the that slice.
+            # by count of terminals in the that slice. These are always the oldest ones.
             insert_terminal_slice = self.read_variable(self.record_registry['/terminals'], update_indices)
             episodes_in_insert_range = tf.reduce_sum(
                 input_tensor=tf.cast(insert_terminal_slice, dtype=tf.int32), axis=0
             )
 
-            # prev_num_episodes = tf.Print(prev_num_episodes, [
-            #     prev_num_episodes,
-            #     episodes_in_insert_range,
-            #     inserted_episodes],
-            #     summarize=100, message='previous num eps / prev episodes in insert range / inserted eps = '
-            # )
-            num_episode_update = prev_num_episodes - episodes_in_insert_range + inserted_episodes
-
-            # prev_num_episodes = tf.Print(prev_num_episodes, [prev_num_episodes, episodes_in_insert_range],
-            #                             summarize=100, message='num eps, eps in insert range =')
-            # Remove previous episodes in inserted range.
-            index_updates.append(self.assign_variable(
-                    ref=self.episode_indices[:prev_num_episodes + 1 - episodes_in_insert_range],
-                    value=self.episode_indices[episodes_in_insert_range:prev_num_episodes + 1]
+            # Remove the overwritten episodes by moving the start pointer (no data is moved).
+            new_episode_start = (episode_start + episodes_in_insert_range) % self.capacity
+            remaining_episodes = prev_num_episodes - episodes_in_insert_range
+
+            # Append the terminal indices of the new episodes behind the remaining ones.
+            mask = tf.boolean_mask(tensor=update_indices, mask=records['/terminals'])
+            episode_positions = (new_episode_start + remaining_episodes +
+                                 tf.range(start=0, limit=inserted_episodes)) % self.capacity
+            index_updates.append(self.scatter_update_variable(
+                variable=self.episode_indices,
+                indices=episode_positions,
+                updates=mask
             ))
-
-            # Insert new episodes starting at previous count minus the ones we removed,
-            # ending at previous count minus removed + inserted.
-            slice_start = prev_num_episodes - episodes_in_insert_range
-            slice_end = num_episode_update
-            # update_indices = tf.Print(update_indices, [update_indices, tf.shape(update_indices)],
-            #                           summarize=100, message='\n update indices / shape = ')
-            # slice_start = tf.Print(
-            #     slice_start, [slice_start, slice_end, self.episode_indices],
-            #     summarize=100,
-            #     message='\n slice start/ slice end / episode indices before = '
-            # )
-
-            with tf.control_dependencies(index_updates):
-                index_updates = list()
-                mask = tf.boolean_mask(tensor=update_indices, mask=records['/terminals'])
-                # mask = tf.Print(mask, [mask, update_indices, records['/terminals']], summarize=100,
-                #     message='\n mask /  update indices / records-terminal')
-
-                index_updates.append(self.assign_variable(
-                    ref=self.episode_indices[slice_start:slice_end],
-                    value=mask
-                ))
-                # num_episode_update = tf.Print(num_episode_update, [num_episode_update, self.episode_indices],
-                #     summarize=100,  message='\n num episodes / episode indices after: ')
-
-                # Assign final new episode count.
-                index_updates.append(self.assign_variable(self.num_episodes, num_episode_update))
+            index_updates.append(self.assign_variable(self.episode_start, new_episode_start))
+            # Assign final new episode count.
+            index_updates.append(self.assign_variable(self.num_episodes, remaining_episodes + inserted_episodes))
 
         index_updates.append(self.assign_variable(ref=self.index, value=(index + num_records) % self.capacity))
         update_size = tf.minimum(x=(self.read_variable(self.size) + num_records), y=self.capacity)
@@ -163,7 +141,7 @@ class RingBuffer(Memory):
                 record_updates.append(self.scatter_update_variable(
                     variable=self.record_registry[key],
                     indices=update_indices,
-                    updates=records[key]
+                    updates=self.to_storage(key, records[key])
                 ))
 
         # Nothing to return.
@@ -181,8 +159,8 @@ class RingBuffer(Memory):
              FlattenedDataOp: Record value dict.
         """
         records = FlattenedDataOp()
-        for name, variable in self.record_registry.items():
-            records[name] = self.read_variable(variable, indices)
+        for name in self.record_registry:
+            records[name] = self.read_record_variable(name, indices)
         return records
 
     def _graph_fn_get_records(self, num_records):
@@ -192,26 +170,29 @@ class RingBuffer(Memory):
 
     def _graph_fn_get_episodes(self, num_episodes):
         stored_episodes = self.read_variable(self.num_episodes)
+        episode_start = self.read_variable(self.episode_start)
         available_episodes = tf.minimum(x=num_episodes, y=stored_episodes)
         # available_episodes = tf.Print(available_episodes, [available_episodes, stored_episodes], summarize=100,
         #                               message='\n available eps, stored eps =')
 
         # Say we have two episodes with this layout:
         # terminals = [0 0 1 0 1]
-        # episode_indices = [2, 4]
+        # episode_indices = [2, 4] (episode_start = 0)
         # If we want to fetch the most recent episode, the start index is:
-        # stored_episodes - 1 - num_episodes = 2 - 1 - 1 = 0, which points to buffer index 2
+        # stored_episodes - 1 - num_episodes = 2 - 1 - 1 = 0 (plus episode_start), which points to buffer index 2
         # The next episode starts one element after this, hence + 1.
         # However, this points to index -1 if stored_episodes = available_episodes,
         # in this case we want start = 0 to get everything.
         start = tf.cond(
             pred=tf.equal(x=stored_episodes, y=available_episodes),
             true_fn=lambda: 0,
-            false_fn=lambda: self.episode_indices[stored_episodes - available_episodes - 1] + 1
+            false_fn=lambda: self.episode_indices[
+                (episode_start + stored_episodes - available_episodes - 1) % self.capacity
+            ] + 1
         )
 
         # End index is just the pointer to the most recent episode.
-        limit = self.episode_indices[stored_episodes - 1]
+        limit = self.episode_indices[(episode_start + stored_episodes - 1) % self.capacity]
         limit += tf.where(condition=(start < limit), x=0, y=self.capacity)
 
         indices = tf.range(start=start, limit=limit) % self.capacity
@@ -82,17 +82,58 @@ class SegmentTree(object):
         with tf.control_dependencies(control_inputs=[assignment]):
             return tf.while_loop(cond=cond, body=insert_body, loop_vars=[loop_update_index])
 
+    def insert_batch(self, indices, elements, insert_op=tf.add):
+        """
+        Inserts a batch of elements into the segment tree at once. All leaves are scattered in a single
+        update, then the parent nodes are recomputed one tree level at a time (each level with one
+        vectorized gather and scatter). The number of graph steps thus only depends on the depth of the tree,
+        not on the number of elements inserted. If an index occurs more than once, the last element for it wins.
+
+        Args:
+            indices (tf.Tensor): 1D int tensor of insertion indices.
+            elements (tf.Tensor): 1D tensor of elements to insert (one per index).
+            insert_op (Union(tf.add, tf.minimum, tf.maximum)): Insert operation on the tree.
+
+        Returns:
+            tf.Tensor: The updated storage variable (ref), once all levels have been recomputed.
+        """
+        # Last write wins: Find the last occurrence of each index (the first one in the reversed batch).
+        reversed_indices = tf.reverse(tensor=indices, axis=[0])
+        unique_indices, slots = tf.unique(x=reversed_indices)
+        last_positions = tf.unsorted_segment_min(
+            data=tf.range(start=0, limit=tf.shape(reversed_indices)[0]),
+            segment_ids=slots,
+            num_segments=tf.shape(unique_indices)[0]
+        )
+        elements = tf.gather(params=tf.reverse(tensor=elements, axis=[0]), indices=last_positions)
+
+        update_indices = unique_indices + self.capacity
+        # Chain all updates through the returned refs so each level reads the values of the previous one.
+        values = tf.scatter_update(ref=self.values, indices=update_indices, updates=elements)
+
+        level_size = self.capacity
+        while level_size > 1:
+            update_indices = tf.div(x=update_indices, y=2)
+            update_vals = insert_op(
+                x=tf.gather(params=values, indices=2 * update_indices),
+                y=tf.gather(params=values, indices=2 * update_indices + 1)
+            )
+            values = tf.scatter_update(ref=values, indices=update_indices, updates=update_vals)
+            level_size //= 2
+
+        return values
+
     def get(self, index):
         """
-        Reads an item from the segment tree.
+        Reads an item (or a batch of items) from the segment tree.
 
         Args:
-            index (int):
+            index (Union[int,tf.Tensor]): Index or 1D tensor of indices to read.
 
-        Returns: The element.
+        Returns: The element(s).
 
         """
-        return self.values[self.capacity + index]
+        return tf.gather(params=self.values, indices=self.capacity + index)
 
     def index_of_prefixsum(self, prefix_sum):
         """
@@ -143,6 +184,33 @@ class SegmentTree(object):
 
         return index - self.capacity
 
+    def index_of_prefixsum_batch(self, prefix_sums):
+        """
+        Batched version of `index_of_prefixsum`: Descends the tree for all prefix sums together,
+        one tree level per step, using gathers and `tf.where` instead of one while-loop (with a
+        `tf.cond` per level) per prefix sum.
+
+        Args:
+            prefix_sums (tf.Tensor): 1D float tensor of upper bounds on the prefixes we are allowed to select.
+                Each must be <= the sum of all priorities (the root node).
+
+        Returns:
+            tf.Tensor: 1D int tensor of indices satisfying the prefix sum condition (one per prefix sum).
+        """
+        index = tf.ones_like(tensor=prefix_sums, dtype=tf.int32)
+
+        level_size = self.capacity
+        while level_size > 1:
+            left_values = tf.gather(params=self.values, indices=2 * index)
+            # Go left if the left segment is larger than the prefix sum,
+            # else 'use up' the left segment and go right.
+            go_left = left_values > prefix_sums
+            index = tf.where(condition=go_left, x=2 * index, y=2 * index + 1)
+            prefix_sums = tf.where(condition=go_left, x=prefix_sums, y=prefix_sums - left_values)
+            level_size //= 2
+
+        return index - self.capacity
+
     def reduce(self, start, limit, reduce_op=tf.add):
         """
         Applies an operation to specified segment.
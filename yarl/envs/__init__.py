@@ -21,6 +21,7 @@ from yarl.envs.environment import Environment
 from yarl.envs.grid_world import GridWorld
 from yarl.envs.openai_gym import OpenAIGymEnv
 from yarl.envs.random_env import RandomEnv
+from yarl.envs.subproc_vector_env import SubprocVectorEnv
 
 
 Environment.__lookup_classes__ = dict(
@@ -30,6 +31,8 @@ Environment.__lookup_classes__ = dict(
     openaigym=OpenAIGymEnv,
     randomenv=RandomEnv,
     random = RandomEnv,
+    subproc=SubprocVectorEnv,
+    subprocvectorenv=SubprocVectorEnv,
 )
 
-__all__ = ["Environment", "GridWorld", "OpenAIGymEnv", "RandomEnv"]
+__all__ = ["Environment", "GridWorld", "OpenAIGymEnv", "RandomEnv", "SubprocVectorEnv"]
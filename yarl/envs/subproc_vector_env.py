@@ -0,0 +1,237 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from copy import deepcopy
+import multiprocessing
+import numpy as np
+from six.moves import xrange as range_
+
+from yarl import YARLError
+from yarl.envs.environment import Environment
+from yarl.spaces.space_utils import flatten_op, unflatten_op
+from yarl.utils.util import dtype as dtype_
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+
+def _open_observation_arrays(observation_spec, num_environments, names=None):
+    """
+    Creates (names=None) or attaches to the shared memory blocks holding the latest observation of each env.
+
+    Args:
+        observation_spec (list): Tuples of (flat state key, shape, numpy dtype string).
+        num_environments (int): The number of environments (rows).
+        names (Optional[dict]): The block names to attach to (key=flat state key).
+
+    Returns:
+        tuple: Dict of the SharedMemory blocks and dict of the arrays viewing them (both key=flat state key).
+    """
+    blocks, arrays = dict(), dict()
+    for key, shape, dtype in observation_spec:
+        full_shape = (num_environments,) + shape
+        if names is None:
+            nbytes = max(int(np.prod(full_shape)) * np.dtype(dtype).itemsize, 1)
+            blocks[key] = shared_memory.SharedMemory(create=True, size=nbytes)
+        else:
+            blocks[key] = shared_memory.SharedMemory(name=names[key])
+        arrays[key] = np.ndarray(shape=full_shape, dtype=dtype, buffer=blocks[key].buf)
+    return blocks, arrays
+
+
+def _env_worker(pipe, env_spec, index, observation_spec, num_environments, names):
+    """
+    Runs a single environment in a worker process. Observations are written into row `index` of the shared
+    observation arrays, everything else goes through the pipe.
+    """
+    blocks, arrays = _open_observation_arrays(observation_spec, num_environments, names)
+    environment = Environment.from_spec(env_spec)
+
+    def write_observation(state):
+        for key, value in flatten_op(state).items():
+            arrays[key][index] = value
+
+    try:
+        while True:
+            command, data = pipe.recv()
+            if command == "step":
+                state, reward, terminal, info = environment.step(actions=data)
+                write_observation(state)
+                pipe.send((reward, terminal, info))
+            elif command == "reset":
+                write_observation(environment.reset())
+                pipe.send(None)
+            elif command == "seed":
+                pipe.send(environment.seed(data))
+            elif command == "close":
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        environment.terminate()
+        del arrays
+        for block in blocks.values():
+            block.close()
+        pipe.close()
+
+
+class SubprocVectorEnv(Environment):
+    """
+    Runs `num_environments` copies of an Environment in worker processes, so CPU-heavy envs can use all cores
+    of a node. Observations are written by the workers into shared memory (no pickling), actions and
+    rewards/terminals go through pipes. `reset` and `step` work on all (or a subset of) envs at once and return
+    batched data. `step_async`/`step_wait` issue steps and collect them later (e.g. to overlap env stepping with
+    other work in the agent process).
+    """
+    def __init__(self, env_spec, num_environments=2, start_method=None):
+        """
+        Args:
+            env_spec (dict): The spec of the Environment to run in each worker process.
+            num_environments (int): The number of environments (worker processes).
+            start_method (Optional[str]): The multiprocessing start method (e.g. "fork" or "spawn").
+                Default: None (the platform's default).
+        """
+        if shared_memory is None:
+            raise YARLError("ERROR: SubprocVectorEnv requires `multiprocessing.shared_memory` (python >= 3.8)!")
+
+        # Build a local instance to learn the Spaces.
+        environment = Environment.from_spec(deepcopy(env_spec))
+        super(SubprocVectorEnv, self).__init__(environment.state_space, environment.action_space)
+        environment.terminate()
+
+        self.env_spec = env_spec
+        self.num_environments = num_environments
+
+        observation_spec = [(key, tuple(space.shape), np.dtype(dtype_(space.dtype, to="np")).str)
+                            for key, space in self.state_space.flatten().items()]
+        self.blocks, self.observations = _open_observation_arrays(observation_spec, num_environments)
+
+        context = multiprocessing.get_context(start_method) if start_method else multiprocessing
+        self.pipes, self.processes = list(), list()
+        for index in range_(num_environments):
+            parent_pipe, child_pipe = context.Pipe()
+            process = context.Process(target=_env_worker, args=(
+                child_pipe, deepcopy(env_spec), index, observation_spec, num_environments,
+                {key: block.name for key, block in self.blocks.items()}
+            ))
+            process.daemon = True
+            process.start()
+            child_pipe.close()
+            self.pipes.append(parent_pipe)
+            self.processes.append(process)
+
+        # Env indices with a step in flight (see `step_async`).
+        self.pending_indices = None
+        self.closed = False
+
+    def _read_observations(self, indices):
+        # Copy, as the next step overwrites the shared arrays.
+        return unflatten_op({key: np.array(array[indices]) for key, array in self.observations.items()})
+
+    def seed(self, seed=None):
+        """
+        Seeds the environments with `seed`, `seed + 1`, ...
+
+        Returns:
+            list: The seeds used by each environment.
+        """
+        for index, pipe in enumerate(self.pipes):
+            pipe.send(("seed", None if seed is None else seed + index))
+        return [pipe.recv() for pipe in self.pipes]
+
+    def reset(self, indices=None):
+        """
+        Resets the given environments.
+
+        Args:
+            indices (Optional[List[int]]): The environments to reset. Default: All.
+
+        Returns:
+            any: The batched initial states of the reset environments.
+        """
+        indices = list(range_(self.num_environments)) if indices is None else list(indices)
+        for index in indices:
+            self.pipes[index].send(("reset", None))
+        for index in indices:
+            self.pipes[index].recv()
+        return self._read_observations(indices)
+
+    def step_async(self, actions, indices=None):
+        """
+        Sends actions to the given environments without waiting for the results.
+
+        Args:
+            actions (any): Batched actions, one per environment in `indices`.
+            indices (Optional[List[int]]): The environments to step. Default: All.
+        """
+        assert self.pending_indices is None, "ERROR: Call `step_wait` before issuing the next step!"
+        indices = list(range_(self.num_environments)) if indices is None else list(indices)
+        if isinstance(actions, dict):
+            actions = [{key: value[i] for key, value in actions.items()} for i in range_(len(indices))]
+        for index, action in zip(indices, actions):
+            self.pipes[index].send(("step", action))
+        self.pending_indices = indices
+
+    def step_wait(self):
+        """
+        Collects the results of the last `step_async` call.
+
+        Returns:
+            tuple: Batched next states, rewards and terminals (of the stepped environments) and a list of infos.
+        """
+        assert self.pending_indices is not None, "ERROR: No step in flight!"
+        results = [self.pipes[index].recv() for index in self.pending_indices]
+        rewards, terminals, infos = zip(*results)
+        states = self._read_observations(self.pending_indices)
+        self.pending_indices = None
+        return states, np.asarray(rewards), np.asarray(terminals), list(infos)
+
+    def step(self, actions, indices=None):
+        """
+        Steps the given environments and waits for the results.
+
+        Args:
+            actions (any): Batched actions, one per environment in `indices`.
+            indices (Optional[List[int]]): The environments to step. Default: All.
+
+        Returns:
+            tuple: See `step_wait`.
+        """
+        self.step_async(actions, indices)
+        return self.step_wait()
+
+    def terminate(self):
+        if self.closed:
+            return
+        if self.pending_indices is not None:
+            self.step_wait()
+        for pipe in self.pipes:
+            pipe.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.observations = None
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.closed = True
+
+    def __str__(self):
+        return "SubprocVectorEnv({}x {})".format(self.num_environments, self.env_spec)
@@ -20,11 +20,14 @@ from __future__ import print_function
 from yarl.execution.env_sample import EnvSample
 from yarl.execution.worker import Worker
 from yarl.execution.single_threaded_worker import SingleThreadedWorker
+from yarl.execution.vectorized_worker import VectorizedWorker
 
-__all__ = ["Worker", "SingleThreadedWorker", "EnvSample"]
+__all__ = ["Worker", "SingleThreadedWorker", "VectorizedWorker", "EnvSample"]
 
 Worker.__lookup_classes__ = dict(
    single=SingleThreadedWorker,
    single_threaded_worker=SingleThreadedWorker,
-   single_threaded=SingleThreadedWorker
+   single_threaded=SingleThreadedWorker,
+   vectorized=VectorizedWorker,
+   vectorized_worker=VectorizedWorker
 )
\ No newline at end of file
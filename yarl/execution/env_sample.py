@@ -17,44 +17,178 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import numpy as np
+
+from yarl.spaces.space_utils import flatten_op, unflatten_op
+from yarl.utils.util import dtype as dtype_
+
 
 class EnvSample(object):
     """
     Represents a sampled trajectory from an environment.
+
+    Data is stored columnar in NumPy arrays (one per flat state/action key), preallocated for `capacity`
+    timesteps and filled via `add`. Next states are not stored twice: The state buffer holds one extra row and
+    the next state of step i is the state of step i+1, except at episode boundaries (e.g. after an env reset
+    within the sample), whose next states are kept separately. Only the filled part is returned by `get_batch`
+    and pickled (as raw array buffers), so a sample ending early costs nothing extra.
     """
     def __init__(
         self,
-        states,
-        actions,
-        rewards,
-        terminals,
-        next_states,
+        states=None,
+        actions=None,
+        rewards=None,
+        terminals=None,
+        next_states=None,
         metrics=None,
+        state_space=None,
+        action_space=None,
+        capacity=0,
         **kwargs
     ):
         """
         Args:
-            states (list): List of states in the sample.
-            actions (list): List of actions in the sample.
-            rewards (list): List of rewards in the sample.
-            terminals (list): List of terminals in the sample.
-            next_states (list): List of next_states in the sample.
+            states (Optional[Union[list,ndarray,dict]]): States in the sample (if already collected).
+            actions (Optional[Union[list,ndarray,dict]]): Actions in the sample.
+            rewards (Optional[Union[list,ndarray]]): Rewards in the sample.
+            terminals (Optional[Union[list,ndarray]]): Terminals in the sample.
+            next_states (Optional[Union[list,ndarray,dict]]): Next states in the sample.
             metrics Optional[(dict)]: Metrics, e.g. on timing.
+            state_space (Optional[Space]): If given (together with `action_space` and `capacity`), preallocates
+                empty buffers to be filled via `add` instead of taking the above data.
+            action_space (Optional[Space]): The action Space to preallocate the action buffers with.
+            capacity (int): The maximum number of timesteps to preallocate buffers for.
             **kwargs (dict): Any additional information relevant for processing the sample.
         """
-        self.states = states
-        self.actions = actions
-        self.rewards = rewards
-        self.terminals = terminals
-        self.next_states = next_states
         self.metrics = metrics
         self.kwargs = kwargs
 
+        # Next states differing from the following state (key=timestep, value=flat next state).
+        self.next_state_overrides = dict()
+
+        if state_space is not None:
+            self.capacity = capacity
+            self.num_timesteps = 0
+            self.state_buffers = self._allocate(state_space, capacity + 1)
+            self.action_buffers = self._allocate(action_space, capacity)
+            self.reward_buffer = np.zeros(shape=(capacity,), dtype=np.float32)
+            self.terminal_buffer = np.zeros(shape=(capacity,), dtype=np.bool_)
+        else:
+            # Already collected data: Store as arrays of the given length.
+            self.num_timesteps = len(terminals)
+            self.capacity = self.num_timesteps
+            self.state_buffers = self._from_data(states, extra_row=next_states)
+            self.action_buffers = self._from_data(actions)
+            self.reward_buffer = np.asarray(rewards, dtype=np.float32)
+            self.terminal_buffer = np.asarray(terminals, dtype=np.bool_)
+            if next_states is not None and self.num_timesteps > 0:
+                flat_next_states = self._from_data(next_states)
+                for key, state_buffer in self.state_buffers.items():
+                    boundaries = np.flatnonzero(np.any(
+                        (state_buffer[1:] != flat_next_states[key]).reshape((self.num_timesteps, -1)), axis=1
+                    ))
+                    for i in boundaries:
+                        self.next_state_overrides.setdefault(int(i), dict())[key] = flat_next_states[key][i]
+
+    @staticmethod
+    def _allocate(space, num_rows):
+        """
+        Allocates one zeroed array per flat key of a Space.
+
+        Returns:
+            dict: Flat key -> array of shape [num_rows] + the primitive Space's shape.
+        """
+        return {key: np.zeros(shape=(num_rows,) + tuple(primitive.shape), dtype=dtype_(primitive.dtype, to="np"))
+                for key, primitive in space.flatten().items()}
+
+    @staticmethod
+    def _from_data(data, extra_row=None):
+        """
+        Converts collected (possibly nested) data into flat arrays.
+
+        Args:
+            data (Union[list,ndarray,dict]): The data (batch rank first).
+            extra_row (Optional[Union[list,ndarray,dict]]): If given, the last item of this is appended as
+                an extra row (used to keep the final next state in the state buffers).
+
+        Returns:
+            dict: Flat key -> array.
+        """
+        if isinstance(data, list) and len(data) > 0 and isinstance(data[0], dict):
+            data = {key: [item[key] for item in data] for key in data[0]}
+        flat_data = {key: np.asarray(value) for key, value in flatten_op(data).items()}
+        if extra_row is not None:
+            if isinstance(extra_row, list) and len(extra_row) > 0 and isinstance(extra_row[0], dict):
+                extra_row = {key: [item[key] for item in extra_row] for key in extra_row[0]}
+            for key, value in flatten_op(extra_row).items():
+                flat_data[key] = np.concatenate([flat_data[key], np.asarray(value)[-1:]], axis=0)
+        return flat_data
+
+    def add(self, state, action, reward, terminal, next_state, episode_start=False):
+        """
+        Writes a single timestep into the preallocated buffers.
+
+        Args:
+            state (Union[dict,ndarray]): The state.
+            action (Union[dict,ndarray]): The action taken in `state`.
+            reward (float): The reward received.
+            terminal (bool): Whether the episode ended with this step.
+            next_state (Union[dict,ndarray]): The state after taking `action`.
+            episode_start (bool): Whether `state` was obtained from an env reset (and is thus not the previous
+                step's next state).
+        """
+        i = self.num_timesteps
+        assert i < self.capacity, "ERROR: EnvSample is full ({} timesteps)!".format(self.capacity)
+
+        # The previous step's next state (already copied to row i) is not this state: Keep it separately.
+        if episode_start and i > 0:
+            self.next_state_overrides[i - 1] = {key: np.copy(buffer[i]) for key, buffer in self.state_buffers.items()}
+
+        for key, value in flatten_op(state).items():
+            self.state_buffers[key][i] = value
+        for key, value in flatten_op(action).items():
+            self.action_buffers[key][i] = value
+        self.reward_buffer[i] = reward
+        self.terminal_buffer[i] = terminal
+
+        # Tentatively the next timestep's state.
+        for key, value in flatten_op(next_state).items():
+            self.state_buffers[key][i + 1] = value
+        self.num_timesteps += 1
+
+    @property
+    def states(self):
+        return unflatten_op({key: buffer[:self.num_timesteps] for key, buffer in self.state_buffers.items()})
+
+    @property
+    def actions(self):
+        return unflatten_op({key: buffer[:self.num_timesteps] for key, buffer in self.action_buffers.items()})
+
+    @property
+    def rewards(self):
+        return self.reward_buffer[:self.num_timesteps]
+
+    @property
+    def terminals(self):
+        return self.terminal_buffer[:self.num_timesteps]
+
+    @property
+    def next_states(self):
+        next_states = dict()
+        for key, buffer in self.state_buffers.items():
+            next_states[key] = buffer[1:self.num_timesteps + 1]
+            if self.next_state_overrides:
+                # Copy before patching the episode boundaries (don't touch the state buffer).
+                next_states[key] = np.copy(next_states[key])
+                for i, next_state in self.next_state_overrides.items():
+                    next_states[key][i] = next_state[key]
+        return unflatten_op(next_states)
+
     def get_batch(self):
         """
         Get experience sample in insert format.
         Returns:
-            dict: Sample batch.
+            dict: Sample batch (arrays truncated to the number of collected timesteps).
         """
         return dict(
             states=self.states,
@@ -67,4 +201,17 @@ class EnvSample(object):
     def get_metrics(self):
         return self.metrics
 
+    def __len__(self):
+        return self.num_timesteps
 
+    def __getstate__(self):
+        # Only send the filled part of the buffers (arrays are pickled as raw buffers).
+        state = self.__dict__.copy()
+        state["state_buffers"] = {key: np.ascontiguousarray(buffer[:self.num_timesteps + 1])
+                                  for key, buffer in self.state_buffers.items()}
+        state["action_buffers"] = {key: np.ascontiguousarray(buffer[:self.num_timesteps])
+                                   for key, buffer in self.action_buffers.items()}
+        state["reward_buffer"] = self.reward_buffer[:self.num_timesteps]
+        state["terminal_buffer"] = self.terminal_buffer[:self.num_timesteps]
+        state["capacity"] = self.num_timesteps
+        return state
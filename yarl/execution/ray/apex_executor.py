@@ -19,14 +19,18 @@ from __future__ import print_function
 
 from six.moves import queue
 import numpy as np
-from yarl import get_distributed_backend
+from yarl import YARLError, get_distributed_backend
 from yarl.agents import Agent
 from yarl.execution.ray import RayWorker
 from yarl.execution.ray.ray_executor import RayExecutor
+from yarl.execution.replay_ratio_controller import ReplayRatioController
+from yarl.execution.shared_memory_replay import SharedMemoryReplay
+from yarl.spaces import Dict, BoolBox
 import random
 from threading import Thread
 
-from yarl.execution.ray.ray_util import create_colocated_agents, RayTaskPool
+from yarl.execution.ray.ray_util import create_colocated_agents, split_local_non_local_agents, RayTaskPool
+from yarl.execution.ray.weight_broadcast import WeightBroadcast
 
 if get_distributed_backend() == "ray":
     import ray
@@ -56,23 +60,51 @@ class ApexExecutor(RayExecutor):
         self.agent_config = agent_config
         self.repeat_actions = repeat_actions
 
+        # How long (sec) to wait for any Ray task to complete before moving on in each step, and by which factor
+        # a worker's mean task latency must exceed the median to count as straggler.
+        task_pool_spec = dict(
+            num_returns=1,
+            wait_timeout=self.cluster_spec.get('task_wait_timeout', 0.01),
+            straggler_factor=self.cluster_spec.get('straggler_factor', 2.0)
+        )
+
         # These are the Ray remote tasks which sample batches from the replay memory
         # and pass them to the learner.
-        self.prioritized_replay_tasks = RayTaskPool()
+        self.prioritized_replay_tasks = RayTaskPool(**task_pool_spec)
         self.replay_sampling_task_depth = self.cluster_spec['task_queue_depth']
 
         # How often weights are synced to remote workers.
         self.weight_sync_steps = self.cluster_spec['weight_sync_steps']
+        # Puts each new version of the learner's weights into the object store once.
+        self.weight_broadcast = WeightBroadcast()
         # Necessary for target network updates.
         self.weight_syncs_executed = 0
         self.steps_since_weights_synced = dict()
 
         # These are the tasks actually interacting with the environment.
-        self.env_sample_tasks = RayTaskPool()
+        self.env_sample_tasks = RayTaskPool(**task_pool_spec)
         self.env_interaction_task_depth = self.cluster_spec['env_interaction_task_depth']
 
         self.worker_sample_size = self.cluster_spec['num_worker_samples']
 
+        # Where replay lives: "ray" (prioritized replay in co-located RayAgents) or "shared_memory" (one
+        # SharedMemoryReplay owned by this process with one segment per remote worker, written to directly by
+        # the workers: All remote workers must then run on the driver's node). The replay itself does not use
+        # Ray, but acting still runs in RayWorkers, scheduled by this executor. Call `terminate` to free it.
+        self.replay_backend = self.cluster_spec.get('replay_backend', "ray")
+        assert self.replay_backend in ["ray", "shared_memory"]
+        if self.replay_backend == "shared_memory" and 'replay_capacity' not in self.cluster_spec:
+            raise YARLError("ERROR: cluster_spec must specify 'replay_capacity' for replay_backend "
+                            "'shared_memory'!")
+        self.shared_replay = None
+        self.replay_segments = dict()
+
+        # Optional target replay ratio (samples learned per env sample). Whichever side is ahead is throttled:
+        # Workers/replay agents whose tasks completed are parked here instead of being rescheduled.
+        self.replay_ratio_controller = None
+        self.paused_workers = list()
+        self.paused_replay_agents = list()
+
         self.logger.info("Setting up execution for Apex executor.")
         self.setup_execution()
 
@@ -90,6 +122,12 @@ class ApexExecutor(RayExecutor):
         self.agent_config['state_space'] = environment.state_space
         self.agent_config['action_space'] = environment.action_space
         self.local_agent = self.build_agent_from_config(self.agent_config)
+        if self.cluster_spec.get('replay_ratio') is not None:
+            self.replay_ratio_controller = ReplayRatioController(
+                replay_ratio=self.cluster_spec['replay_ratio'],
+                batch_size=self.local_agent.update_spec["batch_size"],
+                tolerance=self.cluster_spec.get('replay_ratio_tolerance', 0.1)
+            )
 
         # Set up worker thread for performing updates.
         self.update_worker = UpdateWorker(
@@ -102,11 +140,25 @@ class ApexExecutor(RayExecutor):
         self.num_local_workers = self.cluster_spec['num_local_workers']
         self.num_remote_workers = self.cluster_spec['num_remote_workers']
 
-        self.logger.info("Initializing {} local replay agents.".format(self.num_local_workers))
-        self.ray_local_replay_agents = create_colocated_agents(
-            agent_config=self.agent_config,
-            num_agents=self.num_local_workers
-        )
+        if self.replay_backend == "shared_memory":
+            self.logger.info("Initializing shared memory replay with {} segments.".format(self.num_remote_workers))
+            self.ray_local_replay_agents = []
+            self.shared_replay = SharedMemoryReplay(
+                record_space=Dict(
+                    states=environment.state_space, actions=environment.action_space, rewards=float,
+                    terminals=BoolBox(), next_states=environment.state_space, add_batch_rank=False
+                ),
+                capacity=self.cluster_spec['replay_capacity'],
+                num_segments=self.num_remote_workers,
+                alpha=self.cluster_spec.get('replay_alpha', 1.0),
+                beta=self.cluster_spec.get('replay_beta', 0.0)
+            )
+        else:
+            self.logger.info("Initializing {} local replay agents.".format(self.num_local_workers))
+            self.ray_local_replay_agents = create_colocated_agents(
+                agent_config=self.agent_config,
+                num_agents=self.num_local_workers
+            )
 
         # Create remote workers for data collection.
         self.logger.info("Initializing {} remote data collection agents.".format(self.num_remote_workers))
@@ -115,6 +167,13 @@ class ApexExecutor(RayExecutor):
             # *args
             self.environment_spec, self.agent_config, self.repeat_actions
         )
+        if self.shared_replay is not None:
+            # Shared memory cannot be attached across nodes.
+            _, non_local_workers = split_local_non_local_agents(self.ray_remote_workers)
+            if len(non_local_workers) > 0:
+                raise YARLError("ERROR: replay_backend 'shared_memory' requires all remote workers to run on the "
+                                "driver's node ({} of {} do not)!".format(len(non_local_workers),
+                                                                          self.num_remote_workers))
 
     def init_tasks(self):
         # Prioritized replay sampling tasks via RayAgents.
@@ -125,15 +184,36 @@ class ApexExecutor(RayExecutor):
 
         # Env interaction tasks via RayWorkers which each
         # have a local agent.
-        weights = self.local_agent.get_weights()
-        for ray_worker in self.ray_remote_workers:
+        self.weight_broadcast.publish(self.local_agent.get_weights())
+        for segment, ray_worker in enumerate(self.ray_remote_workers):
             self.steps_since_weights_synced[ray_worker] = 0
-            ray_worker.set_weights.remote(weights)
+            self.replay_segments[ray_worker] = segment
+            self.weight_broadcast.sync_worker(ray_worker)
             for _ in range(self.env_interaction_task_depth):
-                self.env_sample_tasks.add_task(ray_worker, ray_worker.execute_and_get_timesteps.remote(
-                    self.worker_sample_size,
-                    break_on_terminal=True
-                ))
+                self.schedule_env_sample_task(ray_worker, break_on_terminal=True)
+
+    def schedule_env_sample_task(self, ray_worker, break_on_terminal=False):
+        """
+        Schedules an env interaction task on a RayWorker. With the shared memory replay backend, the worker
+        writes its samples directly into its own replay segment and only returns metrics.
+
+        Args:
+            ray_worker (RayWorker): The worker to schedule the task on.
+            break_on_terminal (bool): Whether the worker should stop at the first terminal.
+        """
+        if self.shared_replay is not None:
+            task = ray_worker.execute_and_insert_timesteps.remote(
+                self.worker_sample_size,
+                self.shared_replay.handle,
+                self.replay_segments[ray_worker],
+                break_on_terminal=break_on_terminal
+            )
+        else:
+            task = ray_worker.execute_and_get_timesteps.remote(
+                self.worker_sample_size,
+                break_on_terminal=break_on_terminal
+            )
+        self.env_sample_tasks.add_task(ray_worker, task)
 
     def _execute_step(self):
         """
@@ -141,41 +221,55 @@ class ApexExecutor(RayExecutor):
         """
         # Env steps done during this rollout.
         env_steps = 0
-        weights = None
+        update_steps = 0
         # 1. Fetch results from RayWorkers.
         for ray_worker, env_sample in self.env_sample_tasks.get_completed():
-            # Randomly add env sample to a local replay actor.
-            random_actor = random.choice(self.ray_local_replay_agents)
-
-            sample_data = env_sample.get_batch()
             env_steps += self.worker_sample_size
-            random_actor.observe.remote(
-                states=sample_data['states'],
-                actions=sample_data['actions'],
-                internals=None,
-                rewards=sample_data['rewards'],
-                terminal=sample_data['terminal']
-            )
+            if self.replay_ratio_controller is not None:
+                self.replay_ratio_controller.add_inserted(self.worker_sample_size)
+            # With shared memory replay, the worker has already written its samples.
+            if self.shared_replay is None:
+                # Randomly add env sample to a local replay actor.
+                random_actor = random.choice(self.ray_local_replay_agents)
+
+                sample_data = env_sample.get_batch()
+                random_actor.observe.remote(
+                    states=sample_data['states'],
+                    actions=sample_data['actions'],
+                    internals=None,
+                    rewards=sample_data['rewards'],
+                    terminal=sample_data['terminal']
+                )
 
             self.steps_since_weights_synced[ray_worker] += self.worker_sample_size
             if self.steps_since_weights_synced[ray_worker] >= self.weight_sync_steps:
-                if weights is None or self.update_worker.update_done:
+                # New version only if the learner has updated since the last one.
+                if self.update_worker.update_done:
                     self.update_worker.update_done = False
-                    weights = ray.put(self.local_agent.get_weights())
-                ray_worker.set_weights.remote(weights)
-                self.weight_syncs_executed += 1
+                    self.weight_broadcast.publish(self.local_agent.get_weights())
+                if self.weight_broadcast.sync_worker(ray_worker):
+                    self.weight_syncs_executed += 1
                 self.steps_since_weights_synced[ray_worker] = 0
 
-            # Reschedule environment samples.
-            self.env_sample_tasks.add_task(ray_worker, ray_worker.execute_and_get_timesteps.remote(
-                self.worker_sample_size,
-                break_on_terminal=False
-            ))
+            # Reschedule environment samples (unless acting is ahead of learning).
+            if self.replay_ratio_controller is not None and self.replay_ratio_controller.actors_ahead():
+                self.paused_workers.append(ray_worker)
+            else:
+                self.schedule_env_sample_task(ray_worker, break_on_terminal=False)
+
+        # Resume paused workers once learning has caught up.
+        if self.paused_workers and not self.replay_ratio_controller.actors_ahead():
+            for ray_worker in self.paused_workers:
+                self.schedule_env_sample_task(ray_worker, break_on_terminal=False)
+            self.paused_workers = list()
 
         # 2. Fetch completed replay priority sampling task, move to worker, reschedule.
         for ray_agent, replay_remote_task in self.prioritized_replay_tasks.get_completed():
-            # Immediately schedule new batch sampling tasks on these workers.
-            self.prioritized_replay_tasks.add_task(ray_agent, ray_agent.get_batch.remote())
+            # Immediately schedule new batch sampling tasks on these workers (unless learning is ahead).
+            if self.replay_ratio_controller is not None and self.replay_ratio_controller.learner_ahead():
+                self.paused_replay_agents.append(ray_agent)
+            else:
+                self.prioritized_replay_tasks.add_task(ray_agent, ray_agent.get_batch.remote())
 
             # Retrieve results via id.
             result = ray.get(object_ids=replay_remote_task)
@@ -187,15 +281,65 @@ class ApexExecutor(RayExecutor):
             # task (see loop below).
             self.sample_input_queue.put((ray_agent, sampled_batch, sample_indices))
 
+        # Resume paused replay agents once new samples have come in.
+        if self.paused_replay_agents and not self.replay_ratio_controller.learner_ahead():
+            for ray_agent in self.paused_replay_agents:
+                self.prioritized_replay_tasks.add_task(ray_agent, ray_agent.get_batch.remote())
+            self.paused_replay_agents = list()
+
+        # 2b. Shared memory replay: Sample directly (no remote tasks) until the learner queue is full.
+        if self.shared_replay is not None:
+            self.shared_replay.sync()
+            batch_size = self.local_agent.update_spec["batch_size"]
+            while self.shared_replay.size >= batch_size and not self.sample_input_queue.full():
+                if self.replay_ratio_controller is not None and self.replay_ratio_controller.learner_ahead():
+                    break
+                sampled_batch, sample_indices, _ = self.shared_replay.get_records(batch_size)
+                # All sampled rows were being overwritten (torn): Let the writers catch up.
+                if len(sample_indices) == 0:
+                    break
+                self.sample_input_queue.put((None, sampled_batch, sample_indices))
+
         # 3. Update priorities on priority sampling workers using loss values produced by update worker.
         while not self.update_output_queue.empty():
-            ray_agent, indices, loss = self.update_output_queue.get()
+            ray_agent, indices, loss_per_item = self.update_output_queue.get()
+            update_steps += 1
+            # Count samples as learned once the update worker has learned from them (not when queued).
+            if self.replay_ratio_controller is not None:
+                self.replay_ratio_controller.add_learned(1)
+
+            if ray_agent is None:
+                self.shared_replay.update_records(indices, loss_per_item)
+                continue
+
+            ray_agent.update_priorities.remote(indices, loss_per_item)
+        return env_steps, update_steps
+
+    def execute_workload(self, workload):
+        results = super(ApexExecutor, self).execute_workload(workload)
+        results.update(self.weight_broadcast.get_stats())
+        # Env sample task latencies per worker.
+        task_stats = self.env_sample_tasks.get_stats()
+        results.update({"worker_task_" + key: value for key, value in task_stats.items()})
+        self.logger.info("Worker task latency: median={}s max={}s ({} stragglers)".format(
+            task_stats["median_worker_latency"], task_stats["max_worker_latency"], task_stats["num_stragglers"]
+        ))
+        if self.replay_ratio_controller is not None:
+            # Achieved ratio of samples learned per env sample.
+            results.update(self.replay_ratio_controller.get_stats())
+            self.logger.info("Replay ratio: {} (target: {})".format(
+                results["replay_ratio"], results["target_replay_ratio"]
+            ))
+        return results
 
-            # TODO this is not very clean:
-            # The point of this is that the ray agent itself should be generic
-            # and does not need an api method to update priorities.
-            ray_agent.agent.update_priorities.remote(indices, loss)
-        return env_steps
+    def terminate(self):
+        """
+        Frees the shared memory replay (if any) and stops the local agent's background threads.
+        """
+        if self.shared_replay is not None:
+            self.shared_replay.close()
+            self.shared_replay = None
+        self.local_agent.terminate()
 
 
 class UpdateWorker(Thread):
@@ -234,7 +378,7 @@ class UpdateWorker(Thread):
             agent, sample_batch, indices = self.input_queue.get()
 
             if sample_batch is not None:
-                loss = self.agent.update(batch=sample_batch)
-                # Just pass back indices for updating.
-                self.output_queue.put((agent, indices, loss))
+                _, loss_per_item = self.agent.update(batch=sample_batch)
+                # Pass back indices and their per-item losses as new priorities.
+                self.output_queue.put((agent, indices, loss_per_item))
                 self.update_done = True
@@ -67,10 +67,21 @@ class RayAgent(object):
         Returns a batch from observed experiences according to the agent's sampling strategy.
 
         Returns:
-            Sample dict containing the record space specified by the agent's space definitions.
+            tuple: Sample dict containing the record space specified by the agent's space definitions and
+                the sampled indices (to update their priorities later).
         """
-        # Agent must define op to return batches.
-        return self.agent.call_graph_op(op="get_records")
+        # Agent must define a method to return batches (e.g. from a host-side memory without any graph call).
+        return self.agent.get_batch()
+
+    def update_priorities(self, indices, loss):
+        """
+        Updates the priorities of sampled records in the agent's memory.
+
+        Args:
+            indices (ndarray): Indices to update in replay memory.
+            loss (ndarray): Loss values for indices.
+        """
+        self.agent.update_priorities(indices, loss)
 
     def get_host(self):
         """
@@ -136,9 +147,9 @@ class RayAgent(object):
             agent should be configured to sample internally.
 
         Returns:
-            Loss value.
+            Loss value (see the agent's `update` for external batches).
         """
-        self.agent.update(batch)
+        return self.agent.update(batch)
 
 
 
@@ -154,6 +154,13 @@ class RayExecutor(object):
         """
         raise NotImplementedError
 
+    def terminate(self):
+        """
+        Releases the executor's local resources (e.g. shared memory). Call this once the executor is no longer
+        used.
+        """
+        pass
+
     @staticmethod
     def build_agent_from_config(agent_config):
         """
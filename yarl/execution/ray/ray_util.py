@@ -17,9 +17,12 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+from collections import deque
+import logging
+import numpy as np
 import os
+import time
 
-import logging
 from yarl import YARLError, get_distributed_backend
 from yarl.execution.ray import RayAgent
 
@@ -33,11 +36,34 @@ if get_distributed_backend() == "ray":
 class RayTaskPool(object):
     """
     Manages a set of Ray tasks currently being executed (i.e. the RayAgent tasks).
+
+    `get_completed` returns as soon as any task is done (or after `wait_timeout`), together with all other tasks
+    that happen to be done at that point, so callers can reschedule fast workers immediately instead of
+    waiting for the slowest one. Task latencies (time from `add_task` to being returned) are tracked per
+    worker to detect stragglers.
     """
 
-    def __init__(self):
+    def __init__(self, num_returns=1, wait_timeout=0.01, straggler_factor=2.0, latency_window=100):
+        """
+        Args:
+            num_returns (int): The number of completed tasks to wait for in `get_completed`.
+            wait_timeout (Optional[float]): The maximum time (in sec) `get_completed` blocks. None for blocking
+                until `num_returns` tasks are done.
+            straggler_factor (float): Workers whose mean task latency exceeds the median (over all workers)
+                by this factor are reported as stragglers.
+            latency_window (int): The number of recent task latencies per worker to compute statistics over.
+        """
         self.logger = logging.getLogger(__name__)
         self.ray_tasks = dict()
+        self.num_returns = num_returns
+        self.wait_timeout = wait_timeout
+        self.straggler_factor = straggler_factor
+        self.latency_window = latency_window
+
+        # Submission time per pending task and recent task latencies per worker.
+        self.task_start_times = dict()
+        self.worker_latencies = dict()
+        self.tasks_completed = 0
 
     def add_task(self, worker, ray_object_id):
         """
@@ -51,10 +77,12 @@ class RayTaskPool(object):
         ))
         # Map which worker is responsible for completing the Ray task.
         self.ray_tasks[ray_object_id] = worker
+        self.task_start_times[ray_object_id] = time.monotonic()
 
     def get_completed(self):
         """
-        Waits on pending tasks and yields them upon completion.
+        Waits until at least `num_returns` pending tasks are done (at most `wait_timeout` seconds) and yields all
+        tasks completed by then.
 
         Returns:
             generator: Yields completed tasks.
@@ -63,9 +91,71 @@ class RayTaskPool(object):
         pending_tasks = list(self.ray_tasks)
         if pending_tasks:
             # This ray function checks tasks and splits into ready and non-ready tasks.
-            ready, not_ready = ray.wait(pending_tasks, num_returns=len(pending_tasks), timeout=10)
+            ready, not_ready = ray.wait(
+                pending_tasks, num_returns=min(self.num_returns, len(pending_tasks)), timeout=self.wait_timeout
+            )
+            # Also collect whatever else is done already (without blocking).
+            if ready and not_ready:
+                also_ready, _ = ray.wait(not_ready, num_returns=len(not_ready), timeout=0)
+                ready.extend(also_ready)
+            now = time.monotonic()
             for obj_id in ready:
-                yield (self.ray_tasks.pop(obj_id), obj_id)
+                worker = self.ray_tasks.pop(obj_id)
+                self.record_latency(worker, now - self.task_start_times.pop(obj_id))
+                yield (worker, obj_id)
+
+    def record_latency(self, worker, latency):
+        """
+        Records the latency of a completed task.
+
+        Args:
+            worker (any): The worker that completed the task.
+            latency (float): The time (in sec) between scheduling and collecting the task.
+        """
+        if worker not in self.worker_latencies:
+            self.worker_latencies[worker] = deque(maxlen=self.latency_window)
+        self.worker_latencies[worker].append(latency)
+        self.tasks_completed += 1
+
+    def get_worker_latencies(self):
+        """
+        Returns:
+            dict: Mean recent task latency (in sec) per worker.
+        """
+        return {worker: float(np.mean(latencies)) for worker, latencies in self.worker_latencies.items()}
+
+    def get_stragglers(self):
+        """
+        Returns:
+            list: The workers whose mean task latency exceeds `straggler_factor` times the median over all
+                workers.
+        """
+        worker_latencies = self.get_worker_latencies()
+        if len(worker_latencies) < 2:
+            return []
+        median_latency = np.median(list(worker_latencies.values()))
+        return [worker for worker, latency in worker_latencies.items()
+                if latency > self.straggler_factor * median_latency]
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Task latency and straggler statistics.
+        """
+        worker_latencies = list(self.get_worker_latencies().values())
+        if not worker_latencies:
+            return dict(tasks_completed=0, mean_worker_latency=0.0, median_worker_latency=0.0,
+                        max_worker_latency=0.0, num_stragglers=0, straggler_latency_ratio=1.0)
+        median_latency = float(np.median(worker_latencies))
+        return dict(
+            tasks_completed=self.tasks_completed,
+            mean_worker_latency=float(np.mean(worker_latencies)),
+            median_worker_latency=median_latency,
+            max_worker_latency=float(np.max(worker_latencies)),
+            num_stragglers=len(self.get_stragglers()),
+            # How much slower the slowest worker is than the median one.
+            straggler_latency_ratio=float(np.max(worker_latencies)) / median_latency if median_latency > 0 else 1.0
+        )
 
 
 def create_colocated_agents(agent_config, num_agents, max_attempts=10):
@@ -19,11 +19,13 @@ from __future__ import print_function
 
 from six.moves import xrange
 import numpy as np
+import os
 import time
 
 from yarl.backend_system import get_distributed_backend
 from yarl.execution.env_sample import EnvSample
 from yarl.execution.ray import RayExecutor
+from yarl.execution.ray.weight_broadcast import unflatten_weights
 
 if get_distributed_backend() == "ray":
     import ray
@@ -74,6 +76,12 @@ class RayWorker(object):
         # Was the last state a terminal state so env should be reset in next call?
         self.last_terminal = False
 
+        # Shared memory replay to insert into (attached on first use).
+        self.shared_replay = None
+
+        # Version of the broadcast weights currently set (see `pull_weights`).
+        self.weights_version = 0
+
     # Remote functions to interact with this workers agent.
     def call_agent_op(self, op, inputs=None):
         self.agent.call_graph_op(op, inputs)
@@ -97,11 +105,11 @@ class RayWorker(object):
         # Executed episodes within this exec call.
         episodes_executed = 0
         env_frames = 0
-        states = []
-        actions = []
-        rewards = []
-        terminals = []
-        next_states = []
+        sample = EnvSample(
+            state_space=self.environment.state_space,
+            action_space=self.environment.action_space,
+            capacity=num_timesteps
+        )
 
         # Continue in last state from prior execution.
         state = self.last_state
@@ -109,8 +117,10 @@ class RayWorker(object):
         while timesteps_executed < num_timesteps:
             # Reset env either if finished an episode in current loop or if last state
             # from previous execution was terminal.
+            episode_start = False
             if self.last_terminal is True or episodes_executed > 0:
                 state = self.environment.reset()
+                episode_start = True
 
             # The reward accumulated over one episode.
             episode_reward = 0
@@ -119,8 +129,6 @@ class RayWorker(object):
             terminal = False
             while True:
                 action = self.agent.get_action(states=state, deterministic=deterministic)
-                states.append(state)
-                actions.append(action)
 
                 # Accumulate the reward over n env-steps (equals one action pick). n=self.repeat_actions
                 reward = 0
@@ -130,9 +138,8 @@ class RayWorker(object):
                     env_frames += 1
                     reward += step_reward
 
-                rewards.append(reward)
-                terminals.append(terminal)
-                next_states.append(next_state)
+                sample.add(state, action, reward, terminal, next_state, episode_start=episode_start)
+                episode_start = False
                 timesteps_executed += 1
                 episode_timestep += 0
                 state = next_state
@@ -151,27 +158,21 @@ class RayWorker(object):
                         self.sample_steps.append(timesteps_executed)
                         self.sample_times.append(total_time)
                         self.sample_env_frames.append(env_frames)
-                        return EnvSample(
-                            states=states,
-                            actions=actions,
-                            rewards=rewards,
-                            terminals=terminals,
-                            next_states=next_states,
-                            metrics=dict(
-                                # Just pass this to know later how this sample was configured.
-                                break_on_terminal=break_on_terminal,
-                                runtime=total_time,
-                                # Agent act/observe throughput.
-                                timesteps_executed=timesteps_executed,
-                                ops_per_second=(timesteps_executed / total_time),
-                                # Env frames including action repeats.
-                                env_frames=env_frames,
-                                env_frames_per_second=(env_frames / total_time),
-                                episodes_executed=1,
-                                episodes_per_minute=(1 / (total_time / 60)),
-                                episode_rewards=episode_reward
-                            )
+                        sample.metrics = dict(
+                            # Just pass this to know later how this sample was configured.
+                            break_on_terminal=break_on_terminal,
+                            runtime=total_time,
+                            # Agent act/observe throughput.
+                            timesteps_executed=timesteps_executed,
+                            ops_per_second=(timesteps_executed / total_time),
+                            # Env frames including action repeats.
+                            env_frames=env_frames,
+                            env_frames_per_second=(env_frames / total_time),
+                            episodes_executed=1,
+                            episodes_per_minute=(1 / (total_time / 60)),
+                            episode_rewards=episode_reward
                         )
+                        return sample
                     else:
                         break
 
@@ -184,30 +185,71 @@ class RayWorker(object):
         self.sample_times.append(total_time)
         self.sample_env_frames.append(env_frames)
 
-        return EnvSample(
-            states=states,
-            actions=actions,
-            rewards=rewards,
-            terminals=terminals,
-            next_states=next_states,
-            metrics=dict(
-                break_on_terminal=break_on_terminal,
-                runtime=total_time,
-                # Agent act/observe throughput.
-                timesteps_executed=timesteps_executed,
-                ops_per_second=(timesteps_executed / total_time),
-                # Env frames including action repeats.
-                env_frames=env_frames,
-                env_frames_per_second=(env_frames / total_time),
-                episodes_executed=self.episodes_executed,
-                episodes_per_minute=(1 / (total_time / 60)),
-                episode_rewards=self.episode_rewards,
-            )
+        sample.metrics = dict(
+            break_on_terminal=break_on_terminal,
+            runtime=total_time,
+            # Agent act/observe throughput.
+            timesteps_executed=timesteps_executed,
+            ops_per_second=(timesteps_executed / total_time),
+            # Env frames including action repeats.
+            env_frames=env_frames,
+            env_frames_per_second=(env_frames / total_time),
+            episodes_executed=self.episodes_executed,
+            episodes_per_minute=(1 / (total_time / 60)),
+            episode_rewards=self.episode_rewards,
         )
+        return sample
+
+    def execute_and_insert_timesteps(self, num_timesteps, replay_handle, segment, break_on_terminal=False):
+        """
+        Collects timestep experience (see `execute_and_get_timesteps`) and writes it directly into a
+        SharedMemoryReplay living on the same node instead of returning it.
+
+        Args:
+            replay_handle (dict): Handle of the SharedMemoryReplay to insert into.
+            segment (int): The replay segment owned by this worker.
+
+        Returns:
+            dict: The metrics of the collected sample.
+        """
+        if self.shared_replay is None:
+            from yarl.execution.shared_memory_replay import SharedMemoryReplay
+            self.shared_replay = SharedMemoryReplay.attach(replay_handle)
+
+        env_sample = self.execute_and_get_timesteps(num_timesteps, break_on_terminal=break_on_terminal)
+        self.shared_replay.insert_records(env_sample.get_batch(), segment=segment)
+        return env_sample.get_metrics()
+
+    def get_host(self):
+        """
+        Returns host node identifier.
+
+        Returns:
+            str: Node name this worker is running on.
+        """
+        return os.uname()[1]
 
     def set_weights(self, weights):
         self.agent.set_weights(weights)
 
+    def pull_weights(self, version, weights_ids):
+        """
+        Fetches and sets broadcast weights (see `WeightBroadcast`) unless this worker already has `version`.
+
+        Args:
+            version (int): The version of the broadcast weights.
+            weights_ids (list): The object id of the broadcast weights (wrapped in a list so Ray does not
+                fetch it before this call).
+
+        Returns:
+            int: The weights version of this worker.
+        """
+        if version > self.weights_version:
+            weights = ray.get(weights_ids[0])
+            self.agent.set_weights(unflatten_weights(weights["buffer"], weights["spec"], weights["other"]))
+            self.weights_version = weights["version"]
+        return self.weights_version
+
     def get_batch(self):
         return self.agent.call_graph_op("sample")
 
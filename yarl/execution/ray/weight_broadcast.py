@@ -0,0 +1,155 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import numpy as np
+
+from yarl.backend_system import get_distributed_backend
+from yarl.spaces.space_utils import flatten_op, unflatten_op
+
+if get_distributed_backend() == "ray":
+    import ray
+
+
+def flatten_weights(weights):
+    """
+    Packs a (possibly nested) dict of weight arrays into one contiguous float32 buffer.
+
+    Args:
+        weights (Optional[Union[dict,np.ndarray]]): The weights as returned by `Agent.get_weights`.
+
+    Returns:
+        tuple:
+            - np.ndarray: The 1D buffer holding all floating point weights.
+            - list: The spec to unpack the buffer with: Tuples of (flat key, shape, dtype).
+            - dict: Non-floating point weights (e.g. counters), which are not cast but passed as is.
+    """
+    if weights is None:
+        return np.zeros(shape=(0,), dtype=np.float32), None, dict()
+
+    flat_weights = flatten_op(weights)
+    spec, values, other = list(), list(), dict()
+    for key in sorted(flat_weights):
+        value = np.asarray(flat_weights[key])
+        if np.issubdtype(value.dtype, np.floating):
+            spec.append((key, value.shape, value.dtype.str))
+            values.append(value.ravel())
+        else:
+            other[key] = value
+    if len(values) == 1:
+        # Already a single array (e.g. the flat weights vector of `Agent.get_weights`): No copy if float32.
+        buffer = values[0].astype(np.float32, copy=False)
+    elif values:
+        buffer = np.concatenate(values).astype(np.float32, copy=False)
+    else:
+        buffer = np.zeros(shape=(0,), dtype=np.float32)
+    return buffer, spec, other
+
+
+def unflatten_weights(buffer, spec, other=None):
+    """
+    Inverse of `flatten_weights`.
+
+    Args:
+        buffer (np.ndarray): The 1D weights buffer.
+        spec (Optional[list]): The spec returned by `flatten_weights`.
+        other (Optional[dict]): The non-floating point weights returned by `flatten_weights`.
+
+    Returns:
+        Optional[dict]: The (re-nested) weights.
+    """
+    if spec is None:
+        return None
+
+    flat_weights = dict(other or {})
+    offset = 0
+    for key, shape, dtype in spec:
+        size = int(np.prod(shape))
+        flat_weights[key] = buffer[offset:offset + size].reshape(shape).astype(dtype, copy=False)
+        offset += size
+    return unflatten_op(flat_weights)
+
+
+class WeightBroadcast(object):
+    """
+    Distributes versioned weights to Ray workers.
+
+    Each call to `publish` packs the weights into a single float buffer, tags it with a new (monotonically
+    increasing) version and puts it into the Ray object store exactly once. `sync_worker` only notifies a worker
+    if its last known version is stale, and the worker then pulls the object (workers on the same node share
+    one copy in the object store). Sync traffic therefore scales with the number of published versions instead
+    of with workers x syncs.
+    """
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        # The latest version and its object id.
+        self.version = 0
+        self.weights_id = None
+        # The last version sent to each worker.
+        self.worker_versions = dict()
+
+        self.num_syncs = 0
+        self.num_skipped_syncs = 0
+
+    def publish(self, weights):
+        """
+        Publishes a new version of the weights.
+
+        Args:
+            weights (Optional[dict]): The weights (as returned by `Agent.get_weights`).
+
+        Returns:
+            int: The new version.
+        """
+        buffer, spec, other = flatten_weights(weights)
+        self.version += 1
+        self.weights_id = ray.put(dict(version=self.version, buffer=buffer, spec=spec, other=other))
+        self.logger.debug("Published weights version {} ({} floats).".format(self.version, len(buffer)))
+        return self.version
+
+    def sync_worker(self, ray_worker):
+        """
+        Tells a worker to pull the latest weights (only if its version is stale).
+
+        Args:
+            ray_worker (RayWorker): The worker to sync.
+
+        Returns:
+            bool: True if the worker was notified, False if it already had the latest version.
+        """
+        assert self.weights_id is not None, "ERROR: No weights have been published yet!"
+        if self.worker_versions.get(ray_worker, 0) >= self.version:
+            self.num_skipped_syncs += 1
+            return False
+        # Wrap the id in a list, so Ray does not resolve (fetch) it before the call.
+        ray_worker.pull_weights.remote(self.version, [self.weights_id])
+        self.worker_versions[ray_worker] = self.version
+        self.num_syncs += 1
+        return True
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: The number of published versions and of sent/skipped worker syncs.
+        """
+        return dict(
+            weight_versions=self.version,
+            weight_syncs=self.num_syncs,
+            weight_syncs_skipped=self.num_skipped_syncs
+        )
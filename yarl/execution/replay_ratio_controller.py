@@ -0,0 +1,97 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+
+class ReplayRatioController(object):
+    """
+    Keeps the replay ratio (samples learned from per sample inserted into the memory) close to a target.
+    Counts inserted and learned samples and tells the caller whether acting or learning is ahead, so that the
+    faster side can be throttled.
+    """
+    def __init__(self, replay_ratio, batch_size, tolerance=0.1, min_inserted=0):
+        """
+        Args:
+            replay_ratio (float): The target number of learned samples per inserted sample. E.g. 8.0 with a batch
+                size of 32 means one update per 4 inserted samples.
+            batch_size (int): The number of samples learned per update.
+            tolerance (float): The relative deviation from the target ratio allowed before throttling.
+            min_inserted (int): The number of inserted samples before any learning happens (e.g.
+                `steps_before_update`). These do not count towards the ratio.
+        """
+        assert replay_ratio > 0.0, "ERROR: replay_ratio must be > 0.0!"
+        self.replay_ratio = replay_ratio
+        self.batch_size = batch_size
+        self.tolerance = tolerance
+        self.min_inserted = min_inserted
+
+        self.samples_inserted = 0
+        self.samples_learned = 0
+
+    def add_inserted(self, num_samples):
+        self.samples_inserted += num_samples
+
+    def add_learned(self, num_updates=1):
+        self.samples_learned += num_updates * self.batch_size
+
+    def num_updates_due(self):
+        """
+        Returns:
+            int: The number of updates needed to get back to the target ratio (0 if learning is ahead).
+        """
+        inserted = self.samples_inserted - self.min_inserted
+        if inserted <= 0:
+            return 0
+        return max(int(inserted * self.replay_ratio - self.samples_learned) // self.batch_size, 0)
+
+    def learner_ahead(self):
+        """
+        Returns:
+            bool: True if learning is ahead of the target ratio (by more than the tolerance) and should wait for
+                new samples.
+        """
+        inserted = self.samples_inserted - self.min_inserted
+        if inserted <= 0:
+            return True
+        return self.samples_learned > inserted * self.replay_ratio * (1.0 + self.tolerance)
+
+    def actors_ahead(self):
+        """
+        Returns:
+            bool: True if acting is ahead of the target ratio (by more than the tolerance) and should wait for
+                learning to catch up.
+        """
+        inserted = self.samples_inserted - self.min_inserted
+        if inserted <= 0:
+            return False
+        # Allow at least one batch of lag so that a single outstanding update doesn't stall the actors.
+        return inserted * self.replay_ratio - self.samples_learned > \
+            max(inserted * self.replay_ratio * self.tolerance, self.batch_size)
+
+    @property
+    def achieved_ratio(self):
+        inserted = self.samples_inserted - self.min_inserted
+        return self.samples_learned / inserted if inserted > 0 else 0.0
+
+    def get_stats(self):
+        return dict(
+            target_replay_ratio=self.replay_ratio,
+            replay_ratio=self.achieved_ratio,
+            samples_inserted=self.samples_inserted,
+            samples_learned=self.samples_learned
+        )
@@ -0,0 +1,388 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from six.moves import xrange
+import numpy as np
+
+from yarl import YARLError
+from yarl.components.memories.mem_segment_tree import MemSegmentTree
+from yarl.spaces.space_utils import flatten_op, unflatten_op
+from yarl.utils.util import dtype as dtype_
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    resource_tracker = None
+    shared_memory = None
+
+
+def _tracker_pid():
+    """
+    Returns:
+        Optional[int]: The pid of this process' resource tracker (shared with the processes it forked or spawned).
+    """
+    if resource_tracker is None:
+        return None
+    return getattr(getattr(resource_tracker, "_resource_tracker", None), "_pid", None)
+
+
+def _attach_block(name, owner_tracker_pid):
+    """
+    Attaches to an existing shared memory block without registering it with a resource tracker other than the
+    owner's. Otherwise (python < 3.13), the tracker of an attaching process that is not a descendant of the
+    owner (e.g. a Ray worker) would unlink the owner's block when that process exits.
+
+    Args:
+        name (str): The name of the block.
+        owner_tracker_pid (Optional[int]): The pid of the owner's resource tracker.
+
+    Returns:
+        shared_memory.SharedMemory: The attached block.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Python < 3.13: No `track` arg.
+    except TypeError:
+        block = shared_memory.SharedMemory(name=name)
+        # Processes forked/spawned by the owner share its tracker: Keep the owner's registration there.
+        if os.name == "posix" and _tracker_pid() != owner_tracker_pid:
+            resource_tracker.unregister(block._name, "shared_memory")
+        return block
+
+
+class SharedMemoryReplay(object):
+    """
+    Prioritized replay whose record arrays live in POSIX shared memory, so actor processes on the same node can
+    insert transitions without pickling or copying them through a pipe.
+
+    The memory is split into `num_segments` ring segments, one per actor process. Each segment has exactly one
+    writer, which claims the slots it is about to overwrite (claim counter), writes the records and then
+    publishes them (insert counter), so inserts need no lock. The owning (learner) process picks up newly
+    published records via the insert counters before each sampling call, assigns them the current max priority
+    and samples proportionally (as `MemPrioritizedReplay`). Sampled rows whose slots were claimed by a writer
+    while (or before) they were read may be torn (partly old, partly new record) and are sampled again. Rows
+    still torn after that are dropped, so batches may come out smaller than requested under heavy insert load.
+
+    The replay itself only depends on NumPy and `multiprocessing.shared_memory`: Writers may be any processes on
+    the node that get the (picklable) `handle`, e.g. `multiprocessing.Process`es or Ray actors.
+
+    Usage:
+        replay = SharedMemoryReplay(record_space, capacity=1000000, num_segments=64)
+        # In actor process i:
+        writer = SharedMemoryReplay.attach(replay.handle)
+        writer.insert_records(records, segment=i)
+        # In the learner (owner) process:
+        records, indices, weights = replay.get_records(512)
+        replay.update_records(indices, loss_per_item)
+    """
+    def __init__(self, record_space, capacity=1000, num_segments=1, next_states=False, alpha=1.0, beta=0.0,
+                 handle=None):
+        """
+        Args:
+            record_space (Dict): The (non-batched) record Space. Must contain 'terminals'.
+            capacity (int): Total capacity over all segments (rounded down to a multiple of `num_segments`).
+            num_segments (int): Number of ring segments (= max number of concurrently inserting processes).
+            next_states (bool): Whether to return s' (read via index shift within a segment) in `get_records`.
+                Not needed if the records carry their own 'next_states'.
+            alpha (float): Degree to which prioritization is applied, 0.0 implies no
+                prioritization (uniform), 1.0 full prioritization.
+            beta (float): Importance weight factor, 0.0 for no importance correction, 1.0
+                for full correction.
+            handle (Optional[dict]): Handle of an existing replay to attach to (see `attach`). If given, all other
+                args are ignored and no shared memory is created.
+        """
+        if shared_memory is None:
+            raise YARLError("ERROR: SharedMemoryReplay requires `multiprocessing.shared_memory` (python >= 3.8)!")
+
+        if handle is None:
+            flat_spaces = record_space.flatten()
+            assert "/terminals" in flat_spaces, "ERROR: Record space must contain 'terminals'!"
+            segment_capacity = capacity // num_segments
+            assert segment_capacity > 0, "ERROR: Capacity must be at least `num_segments`!"
+            handle = dict(
+                segment_capacity=segment_capacity,
+                num_segments=num_segments,
+                next_states=next_states,
+                record_spec=[(key, tuple(space.shape), np.dtype(dtype_(space.dtype, to="np")).str)
+                             for key, space in flat_spaces.items()],
+                names=None
+            )
+            self.owner = True
+        else:
+            self.owner = False
+
+        self.segment_capacity = handle["segment_capacity"]
+        self.num_segments = handle["num_segments"]
+        self.capacity = self.segment_capacity * self.num_segments
+        self.next_states = handle["next_states"]
+        self.record_spec = handle["record_spec"]
+
+        # Shared memory blocks (key=flat record key, plus one for the insert counters).
+        self.blocks = dict()
+        self.record_registry = dict()
+        names = dict()
+        counter_keys = ["counters", "claims"]
+        for key, shape, dtype in self.record_spec + [(key, (), np.dtype(np.int64).str) for key in counter_keys]:
+            full_shape = (self.num_segments,) if key in counter_keys else (self.capacity,) + shape
+            nbytes = max(int(np.prod(full_shape)) * np.dtype(dtype).itemsize, 1)
+            if self.owner:
+                block = shared_memory.SharedMemory(create=True, size=nbytes)
+            else:
+                block = _attach_block(handle["names"][key], handle["tracker_pid"])
+            self.blocks[key] = block
+            names[key] = block.name
+            array = np.ndarray(shape=full_shape, dtype=dtype, buffer=block.buf)
+            if self.owner:
+                array.fill(0)
+            if key == "counters":
+                # Total number of records ever inserted (published) into each segment.
+                self.counters = array
+            elif key == "claims":
+                # Total number of records ever claimed for writing in each segment (runs ahead of `counters`
+                # while a write is in progress).
+                self.claims = array
+            else:
+                self.record_registry[key] = array
+        handle["names"] = names
+        if self.owner:
+            handle["tracker_pid"] = _tracker_pid()
+        self.handle = handle
+
+        if self.next_states:
+            self.flat_state_keys = [key[len("/states"):] for key, _, _ in self.record_spec
+                                    if key == "/states" or key.startswith("/states/")]
+            assert len(self.flat_state_keys) > 0, "ERROR: Records must contain 'states' to return next states!"
+
+        # Prioritization state (only used by the owner).
+        assert alpha > 0.0
+        self.alpha = alpha
+        self.beta = beta
+        self.max_priority = 1.0
+        self.size = 0
+        # Insert counters as of the last sync with the priority trees.
+        self.synced_counters = np.zeros(shape=(self.num_segments,), dtype=np.int64)
+        if self.owner:
+            priority_capacity = 1
+            while priority_capacity < self.capacity:
+                priority_capacity *= 2
+            self.sum_segment_tree = MemSegmentTree(priority_capacity, operator=np.add)
+            self.min_segment_tree = MemSegmentTree(priority_capacity, operator=np.minimum)
+
+    @staticmethod
+    def attach(handle):
+        """
+        Attaches to an existing replay (e.g. from an actor process).
+
+        Args:
+            handle (dict): The `handle` property of the owning SharedMemoryReplay (picklable).
+
+        Returns:
+            SharedMemoryReplay: A replay object sharing all record arrays with the owner.
+        """
+        return SharedMemoryReplay(record_space=None, handle=handle)
+
+    def insert_records(self, records, segment=0):
+        """
+        Writes a batch of records into the given segment. Must only be called by one process per segment.
+
+        Args:
+            records (dict): (Possibly nested) dict of record arrays. Must match the record space.
+            segment (int): The segment to write to.
+        """
+        flat_records = flatten_op(records)
+        num_records = len(flat_records["/terminals"])
+        assert num_records <= self.segment_capacity, "ERROR: Batch does not fit into a single segment!"
+
+        count = int(self.counters[segment])
+        update_indices = segment * self.segment_capacity + \
+            np.arange(count, count + num_records) % self.segment_capacity
+        # Claim the slots before overwriting them (so the owner can detect torn reads).
+        self.claims[segment] = count + num_records
+        for key, variable in self.record_registry.items():
+            variable[update_indices] = flat_records[key]
+        # Publish the records only after they have been written.
+        self.counters[segment] = count + num_records
+
+    def sync(self):
+        """
+        Picks up all records inserted since the last call and gives them the current max priority.
+        Only called by the owner (automatically done by `get_records`).
+
+        Returns:
+            int: The number of newly picked up records.
+        """
+        counters = np.array(self.counters)
+        new_indices = list()
+        for segment in xrange(self.num_segments):
+            num_new = min(counters[segment] - self.synced_counters[segment], self.segment_capacity)
+            if num_new > 0:
+                start = counters[segment] - num_new
+                new_indices.append(segment * self.segment_capacity +
+                                   np.arange(start, start + num_new) % self.segment_capacity)
+        self.synced_counters = counters
+        self.size = int(np.sum(np.minimum(counters, self.segment_capacity)))
+        if len(new_indices) == 0:
+            return 0
+
+        new_indices = np.concatenate(new_indices)
+        weight = self.max_priority ** self.alpha
+        self.sum_segment_tree.insert_batch(new_indices, weight)
+        self.min_segment_tree.insert_batch(new_indices, weight)
+        return len(new_indices)
+
+    def read_records(self, indices):
+        """
+        Obtains record values for the provided indices.
+
+        Args:
+            indices (ndarray): Indices to read.
+
+        Returns:
+             dict: (Re-nested) record dict.
+        """
+        return unflatten_op(self._read_flat_records(indices))
+
+    def _read_flat_records(self, indices):
+        records = dict()
+        for name, variable in self.record_registry.items():
+            records[name] = variable[indices]
+        if self.next_states:
+            # Next states are read via index shift within the same segment.
+            next_indices = self._next_indices(indices)
+            for flat_state_key in self.flat_state_keys:
+                next_states = self.record_registry["/states" + flat_state_key][next_indices]
+                records["/next_states" + flat_state_key] = next_states
+        return records
+
+    def _next_indices(self, indices):
+        segment_start = indices - indices % self.segment_capacity
+        return segment_start + (indices - segment_start + 1) % self.segment_capacity
+
+    def overwritten(self, indices):
+        """
+        Checks which slots were claimed by a writer since the last `sync` (i.e. may have been overwritten, fully
+        or partly, after the records there were prioritized). Call after reading the slots.
+
+        Args:
+            indices (ndarray): The indices to check.
+
+        Returns:
+            ndarray: Boolean mask (True=slot may have been overwritten).
+        """
+        claims = np.array(self.claims)
+        segments = indices // self.segment_capacity
+        num_claimed = (claims - self.synced_counters)[segments]
+        positions = (indices % self.segment_capacity - self.synced_counters[segments]) % self.segment_capacity
+        return positions < num_claimed
+
+    def get_records(self, num_records, max_attempts=10):
+        """
+        Samples a batch of records proportionally to their priorities. Rows that a writer overwrote while they
+        were read are sampled again (up to `max_attempts` rounds, each picking up the records published in the
+        meantime first). Rows still torn after that are dropped from the batch.
+
+        Args:
+            num_records (int): Number of records to sample.
+            max_attempts (int): The maximum number of sampling rounds for rows with torn reads.
+
+        Returns:
+            tuple:
+                - dict: The sampled records (at most `num_records`, possibly none).
+                - ndarray: The indices of the sampled records (for `update_records`).
+                - ndarray: The importance-sampling weights of the sampled records.
+        """
+        assert self.owner, "ERROR: Only the owning process can sample from a SharedMemoryReplay!"
+        self.sync()
+        assert self.size > 0, "ERROR: Cannot sample from an empty memory!"
+
+        prob_sum = self.sum_segment_tree.reduce()
+        indices = self._sample_indices(num_records, prob_sum)
+        records = self._read_flat_records(indices)
+        torn = self._torn(indices)
+        for _ in xrange(max_attempts):
+            if not np.any(torn):
+                break
+            # Slots claimed before the last sync are reported until the next one (e.g. all of a segment's slots
+            # after a writer lapped it): Sync again before resampling.
+            self.sync()
+            prob_sum = self.sum_segment_tree.reduce()
+            indices[torn] = self._sample_indices(int(np.sum(torn)), prob_sum)
+            for key, value in self._read_flat_records(indices[torn]).items():
+                records[key][torn] = value
+            torn[torn] = self._torn(indices[torn])
+
+        # Never hand out torn rows.
+        if np.any(torn):
+            keep = np.logical_not(torn)
+            indices = indices[keep]
+            records = {key: value[keep] for key, value in records.items()}
+
+        # Importance correction.
+        min_prob = self.min_segment_tree.reduce() / prob_sum
+        max_weight = (min_prob * self.size) ** (-self.beta)
+        sample_probs = self.sum_segment_tree.get(indices) / prob_sum
+        weights = (sample_probs * self.size) ** (-self.beta) / max_weight
+
+        return unflatten_op(records), indices, weights
+
+    def _torn(self, indices):
+        """
+        Returns:
+            ndarray: Boolean mask of the rows (including their next states, if returned) that may have been
+                overwritten while they were read (see `overwritten`).
+        """
+        torn = self.overwritten(indices)
+        if self.next_states:
+            torn |= self.overwritten(self._next_indices(indices))
+        return torn
+
+    def _sample_indices(self, num_records, prob_sum):
+        samples = np.random.random(size=(num_records,)) * prob_sum
+        # Guard against float round-off at the right edge of the stored range.
+        return np.minimum(self.sum_segment_tree.index_of_prefixsum_batch(samples), self.capacity - 1)
+
+    def update_records(self, indices, update):
+        """
+        Updates the priorities of the given indices. If an index occurs more than once, the last
+        update for it wins.
+
+        Args:
+            indices (ndarray): Indices of the records to update.
+            update (ndarray): New (not yet alpha-exponentiated) priorities, e.g. the losses of the records.
+        """
+        assert self.owner, "ERROR: Only the owning process can update priorities!"
+        update = np.asarray(update, dtype=np.float64)
+        priorities = update ** self.alpha
+        self.sum_segment_tree.insert_batch(indices, priorities)
+        self.min_segment_tree.insert_batch(indices, priorities)
+        self.max_priority = max(self.max_priority, float(np.max(update)))
+
+    def close(self):
+        """
+        Detaches from the shared memory. The owner also frees (unlinks) it.
+        """
+        self.record_registry = dict()
+        self.counters = None
+        self.claims = None
+        for block in self.blocks.values():
+            block.close()
+            if self.owner:
+                block.unlink()
+        self.blocks = dict()
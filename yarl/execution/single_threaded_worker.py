@@ -17,8 +17,10 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from six.moves import xrange as range_
+from six.moves import queue, xrange as range_
+import threading
 import time
 
 from yarl.utils.util import default_dict
@@ -26,12 +28,41 @@ from yarl.execution.worker import Worker
 
 
 class SingleThreadedWorker(Worker):
+    """
+    Worker acting in a single environment.
 
+    In pipelined mode (`pipelined=True`), the environment is stepped on a helper thread while the agent's graph
+    observes the previous step, and updates run on a separate update thread. All graph calls of the agent
+    (act, observe, update) are serialized via the worker's session lock. The update thread may fall behind acting
+    by at most `max_update_lag` timesteps before acting blocks, which bounds how much the update schedule drifts.
+
+    Otherwise, each step's transition is observed together with acting on the next state via
+    `Agent.act_and_observe` (one graph execution per step). On steps with updates, the transition is observed
+    before the update instead, so updates see the same records as with separate observe calls.
+    """
     def __init__(self, **kwargs):
+        """
+        Keyword Args:
+            render (bool): Whether to render the environment after each step. Default: False.
+            pipelined (bool): Whether to overlap env stepping, graph calls and updates. Default: False.
+            max_update_lag (Optional[int]): In pipelined mode, the maximum number of timesteps the update
+                thread may lag behind acting. Default: None (the update interval).
+        """
         self.render = kwargs.pop("render", False)
+        self.pipelined = kwargs.pop("pipelined", False)
+        self.max_update_lag = kwargs.pop("max_update_lag", None)
 
         super(SingleThreadedWorker, self).__init__(**kwargs)
 
+        # Pipelined mode: Env stepping thread, update thread and its queue of executed timesteps.
+        self.env_thread_pool = None
+        self.update_thread = None
+        self.update_queue = None
+        self.update_error = None
+        # Non-pipelined mode: Reward and terminal of the transition pending in the agent's `act_and_observe`.
+        self.pending_reward = None
+        self.pending_terminal = None
+
         self.logger.info("Initialized single-threaded executor with\n environment id {} and agent {}".format(
             self.environment, self.agent
         ))
@@ -95,16 +126,25 @@ class SingleThreadedWorker(Worker):
         episode_rewards = list()
         episode_durations = list()
         episode_steps = list()
+        # Time spent in each stage (summed up, these are the runtime of a strictly serialized loop).
+        self.update_time = 0.0
+        stage_times = dict(act_time=0.0, env_time=0.0, observe_time=0.0)
         start = time.monotonic()
 
+        if self.pipelined:
+            self.start_pipeline()
+        # Pipelined mode: The last transition, observed while the env executes the next step.
+        pending_observation = None
+        # Non-pipelined mode: Reward and terminal of the last transition, observed with the next action.
+        reward = None
+        terminal = None
+
         # Only run everything for at most num_timesteps (if defined).
         while not (0 < num_timesteps <= timesteps_executed):
             # The reward accumulated over one episode.
             episode_reward = 0
             # The number of steps taken in the episode.
             episode_timestep = 0
-            # Whether the episode has terminated.
-            terminal = False
 
             # Start a new episode.
             episode_start = time.monotonic()  # wall time
@@ -112,25 +152,37 @@ class SingleThreadedWorker(Worker):
             if self.render:
                 self.environment.render()
             while True:
-                action = self.agent.get_action(states=state, deterministic=deterministic)
-
-                # Accumulate the reward over n env-steps (equals one action pick). n=self.repeat_actions
-                reward = 0
-                next_state = None
-                for _ in range_(self.repeat_actions):
-                    next_state, step_reward, terminal, info = self.environment.step(actions=action)
-                    if self.render:
-                        self.environment.render()
-                    env_frames += 1
-                    reward += step_reward
-                    if terminal:
-                        break
-
-                self.agent.observe(states=state, actions=action, internals=[], rewards=reward, terminals=terminal)
+                with self.session_lock:
+                    stage_start = time.monotonic()
+                    if self.pipelined:
+                        action = self.agent.get_action(states=state, deterministic=deterministic)
+                    else:
+                        action = self.agent.act_and_observe(
+                            states=state, rewards=reward, terminals=terminal, deterministic=deterministic
+                        )
+                    stage_times["act_time"] += time.monotonic() - stage_start
 
-                loss = self.update_if_necessary(timesteps_executed)
-                if loss is not None:
-                    self.logger.info("LOSS: {}".format(loss))
+                if self.pipelined:
+                    # Step the env in the background while the graph observes the previous transition.
+                    env_future = self.env_thread_pool.submit(self.step_environment, action)
+                    if pending_observation is not None:
+                        self.observe(pending_observation, stage_times)
+                    next_state, reward, terminal, frames, env_time = env_future.result()
+                    pending_observation = dict(
+                        states=state, actions=action, internals=[], rewards=reward, terminals=terminal
+                    )
+                else:
+                    next_state, reward, terminal, frames, env_time = self.step_environment(action)
+                    self.pending_reward, self.pending_terminal = reward, terminal
+                env_frames += frames
+                stage_times["env_time"] += env_time
+
+                if self.pipelined:
+                    self.schedule_update(timesteps_executed)
+                else:
+                    loss = self.update_if_necessary(timesteps_executed)
+                    if loss is not None:
+                        self.logger.info("LOSS: {}".format(loss))
 
                 episode_reward += reward
                 timesteps_executed += 1
@@ -142,6 +194,11 @@ class SingleThreadedWorker(Worker):
 
                 state = next_state
 
+            # Observe the episode's last transition before the env gets reset.
+            if pending_observation is not None:
+                self.observe(pending_observation, stage_times)
+                pending_observation = None
+
             episodes_executed += 1
             episode_rewards.append(episode_reward)
             episode_durations.append(time.monotonic() - episode_start)
@@ -152,6 +209,20 @@ class SingleThreadedWorker(Worker):
             if 0 < num_episodes <= episodes_executed:
                 break
 
+        if self.pipelined:
+            self.stop_pipeline()
+        else:
+            # Observe the last transition (no next action to compute it with).
+            with self.session_lock:
+                stage_start = time.monotonic()
+                self.agent.flush_observation(rewards=reward, terminals=terminal)
+                stage_times["observe_time"] += time.monotonic() - stage_start
+        # Insert the records still held back in the observe buffer.
+        with self.session_lock:
+            stage_start = time.monotonic()
+            self.agent.flush_buffers()
+            stage_times["observe_time"] += time.monotonic() - stage_start
+
         total_time = (time.monotonic() - start) or 1e-10
 
         results = dict(
@@ -167,8 +238,18 @@ class SingleThreadedWorker(Worker):
             mean_episode_runtime=np.mean(episode_durations),
             mean_episode_reward=np.mean(episode_rewards),
             max_episode_reward=np.max(episode_rewards),
-            final_episode_reward=episode_rewards[-1]
+            final_episode_reward=episode_rewards[-1],
+            # Stage timing: `serialized_time` is what the loop would take without any overlap.
+            update_time=self.update_time,
+            serialized_time=sum(stage_times.values()) + self.update_time,
+            overlapped_time=total_time
         )
+        results.update(stage_times)
+        if self.replay_ratio_controller is not None:
+            results["replay_ratio"] = self.replay_ratio_controller.achieved_ratio
+        # Batch prefetching (totals over the Agent's lifetime, e.g. prefetch_starved_time).
+        if self.agent.prefetch_stats["updates"] > 0:
+            results.update({"prefetch_" + key: value for key, value in self.agent.prefetch_stats.items()})
 
         # Total time of run.
         self.logger.info("Finished execution in {} s".format(total_time))
@@ -185,5 +266,123 @@ class SingleThreadedWorker(Worker):
         self.logger.info("Mean episode reward: {}".format(results['mean_episode_reward']))
         self.logger.info("Max. episode reward: {}".format(results['max_episode_reward']))
         self.logger.info("Final episode reward: {}".format(results['final_episode_reward']))
+        self.logger.info("Stage times: act={}s env={}s observe={}s update={}s (serialized={}s, overlapped={}s)".format(
+            results['act_time'], results['env_time'], results['observe_time'], results['update_time'],
+            results['serialized_time'], results['overlapped_time']))
+        if "replay_ratio" in results:
+            self.logger.info("Replay ratio (samples learned per sample observed): {}".format(results['replay_ratio']))
+        if "prefetch_updates" in results:
+            self.logger.info("Prefetch: {} of {} updates waited for a batch ({}s in total)".format(
+                results['prefetch_starved_updates'], results['prefetch_updates'], results['prefetch_starved_time']))
 
         return results
+
+    def step_environment(self, action):
+        """
+        Executes an action in the environment (repeated `repeat_actions` times, stopping at a terminal).
+
+        Args:
+            action (any): The action to execute.
+
+        Returns:
+            tuple: The next state, the accumulated reward, the terminal flag, the number of env frames executed
+                and the time spent stepping.
+        """
+        start = time.monotonic()
+        reward = 0
+        next_state = None
+        terminal = False
+        frames = 0
+        for _ in range_(self.repeat_actions):
+            next_state, step_reward, terminal, info = self.environment.step(actions=action)
+            if self.render:
+                self.environment.render()
+            frames += 1
+            reward += step_reward
+            if terminal:
+                break
+        return next_state, reward, terminal, frames, time.monotonic() - start
+
+    def observe(self, observation, stage_times):
+        """
+        Passes a transition to the agent (holding the session lock).
+
+        Args:
+            observation (dict): The kwargs for `Agent.observe`.
+            stage_times (dict): The stage timing dict to add the observe time to.
+        """
+        with self.session_lock:
+            start = time.monotonic()
+            self.agent.observe(**observation)
+            stage_times["observe_time"] += time.monotonic() - start
+
+    def update_agent(self):
+        """
+        Performs a single agent update. In non-pipelined mode, first observes the transition pending in the
+        agent's `act_and_observe` (the next `act_and_observe` call then only acts). The time spent on this is
+        counted as part of the update.
+
+        Returns:
+            float: The update's loss.
+        """
+        if not self.pipelined and self.agent.pending_transition is not None:
+            with self.session_lock:
+                start = time.monotonic()
+                self.agent.flush_observation(rewards=self.pending_reward, terminals=self.pending_terminal)
+                self.update_time += time.monotonic() - start
+        return super(SingleThreadedWorker, self).update_agent()
+
+    def start_pipeline(self):
+        """
+        Starts the env stepping and update threads for pipelined execution.
+        """
+        self.env_thread_pool = ThreadPoolExecutor(max_workers=1)
+        self.update_error = None
+        if self.updating:
+            max_update_lag = self.max_update_lag or self.update_interval
+            self.update_queue = queue.Queue(maxsize=max(max_update_lag, 1))
+            self.update_thread = threading.Thread(target=self._update_loop, name="update-thread")
+            self.update_thread.daemon = True
+            self.update_thread.start()
+
+    def stop_pipeline(self):
+        """
+        Waits for all scheduled updates and shuts down the pipeline threads.
+        """
+        if self.update_thread is not None:
+            self.update_queue.put(None)
+            self.update_thread.join()
+            self.update_thread = None
+            self.update_queue = None
+        self.env_thread_pool.shutdown()
+        self.env_thread_pool = None
+        if self.update_error is not None:
+            raise self.update_error
+
+    def schedule_update(self, timesteps_executed):
+        """
+        Hands an executed timestep to the update thread (blocks while it lags `max_update_lag` timesteps behind).
+
+        Args:
+            timesteps_executed (int): Timesteps executed thus far.
+        """
+        if self.update_thread is None:
+            return
+        if self.update_error is not None:
+            self.stop_pipeline()
+        self.update_queue.put(timesteps_executed)
+
+    def _update_loop(self):
+        while True:
+            timesteps_executed = self.update_queue.get()
+            if timesteps_executed is None:
+                break
+            # After an error, keep draining the queue so acting never blocks.
+            if self.update_error is not None:
+                continue
+            try:
+                loss = self.update_if_necessary(timesteps_executed)
+                if loss is not None:
+                    self.logger.info("LOSS: {}".format(loss))
+            except Exception as e:
+                self.update_error = e
@@ -0,0 +1,320 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+from six.moves import xrange as range_
+import time
+
+from yarl import YARLError
+from yarl.envs.subproc_vector_env import SubprocVectorEnv
+from yarl.utils.util import default_dict
+from yarl.execution.worker import Worker
+
+
+class VectorizedWorker(Worker):
+    """
+    Worker stepping N environments in lock-step. Actions for all N states are computed with a single call to
+    `Agent.get_action` (one graph execution), then every environment is stepped and reset individually when
+    its episode ends.
+
+    Experiences are collected per environment and handed to `Agent.observe` (with the environment's index as
+    `env_id`) as batched arrays, one contiguous trajectory chunk per environment: At the end of each of its episodes and as soon as the chunk reaches the
+    agent's observe buffer size, so updates sample from the records observed so far. Each chunk is inserted as a
+    whole, so records of different environments are never interleaved within a chunk. Memories reading next states
+    via index shift therefore only see a wrong next state for the last record of a chunk cut off mid-episode (at
+    most one in `buffer_size` records). Stepping more than one environment thus requires observe buffering. When a
+    run ends, the partial chunks of all environments are inserted (see `Agent.flush_buffers`).
+    """
+    def __init__(self, environments, agent, repeat_actions=1):
+        """
+        Args:
+            environments (Union[List[Environment],SubprocVectorEnv]): The environments to step (all with the
+                same Spaces) or a SubprocVectorEnv running them in worker processes.
+        """
+        if isinstance(environments, SubprocVectorEnv):
+            self.vector_env = environments
+            self.num_environments = environments.num_environments
+        else:
+            assert len(environments) > 0, "ERROR: VectorizedWorker needs at least one environment!"
+            self.vector_env = None
+            self.num_environments = len(environments)
+        super(VectorizedWorker, self).__init__(
+            environment=self.vector_env or environments[0], agent=agent, repeat_actions=repeat_actions
+        )
+        self.environments = environments
+
+        # Single records (chunks of size 1) of all environments would be interleaved in the memory.
+        if self.num_environments > 1 and self.agent.observe_spec["buffer_enabled"] is not True:
+            raise YARLError("ERROR: VectorizedWorker with {} environments requires observe buffering "
+                            "(observe_spec['buffer_enabled']=True)!".format(self.num_environments))
+
+        self.logger.info("Initialized vectorized worker with {} environments and agent {}".format(
+            self.num_environments, self.agent
+        ))
+
+    def execute_timesteps(self, num_timesteps, max_timesteps_per_episode=0, update_spec=None, deterministic=False):
+        return self._execute(
+            num_timesteps=num_timesteps,
+            max_timesteps_per_episode=max_timesteps_per_episode,
+            deterministic=deterministic,
+            update_spec=update_spec
+        )
+
+    def execute_episodes(self, num_episodes, max_timesteps_per_episode=0, update_spec=None, deterministic=False):
+        return self._execute(
+            num_episodes=num_episodes,
+            max_timesteps_per_episode=max_timesteps_per_episode,
+            deterministic=deterministic,
+            update_spec=update_spec
+        )
+
+    def reset_environment(self, index):
+        """
+        Resets a single environment.
+
+        Args:
+            index (int): The index of the environment to reset.
+
+        Returns:
+            any: The environment's initial state.
+        """
+        if self.vector_env is not None:
+            return self._unstack(self.vector_env.reset(indices=[index]), 1)[0]
+        return self.environments[index].reset()
+
+    def step_environments(self, actions):
+        """
+        Steps all environments once (repeating each action `repeat_actions` times, stopping at terminals).
+
+        Args:
+            actions (list): One action per environment.
+
+        Returns:
+            tuple: Lists of next states, (accumulated) rewards, terminals and the number of env frames executed.
+        """
+        if self.vector_env is not None:
+            return self._step_vector_env(actions)
+
+        next_states, rewards, terminals = list(), list(), list()
+        env_frames = 0
+        for environment, action in zip(self.environments, actions):
+            reward = 0
+            next_state = None
+            terminal = False
+            for _ in range_(self.repeat_actions):
+                next_state, step_reward, terminal, info = environment.step(actions=action)
+                env_frames += 1
+                reward += step_reward
+                if terminal:
+                    break
+            next_states.append(next_state)
+            rewards.append(reward)
+            terminals.append(terminal)
+        return next_states, rewards, terminals, env_frames
+
+    def _step_vector_env(self, actions):
+        """
+        `step_environments` for a SubprocVectorEnv: Each action repeat is one parallel step of all environments
+        whose episode has not ended yet.
+        """
+        next_states = [None] * self.num_environments
+        rewards = [0] * self.num_environments
+        terminals = [False] * self.num_environments
+        env_frames = 0
+        indices = list(range_(self.num_environments))
+        for _ in range_(self.repeat_actions):
+            states, step_rewards, step_terminals, _ = self.vector_env.step(
+                actions=[actions[i] for i in indices], indices=indices
+            )
+            env_frames += len(indices)
+            for i, state, reward, terminal in zip(
+                    indices, self._unstack(states, len(indices)), step_rewards, step_terminals):
+                next_states[i] = state
+                rewards[i] += reward
+                terminals[i] = bool(terminal)
+            indices = [i for i in indices if not terminals[i]]
+            if len(indices) == 0:
+                break
+        return next_states, rewards, terminals, env_frames
+
+    @staticmethod
+    def _stack(items):
+        """
+        Stacks a list of (possibly dict) items into a batch.
+        """
+        if isinstance(items[0], dict):
+            return {key: np.stack([item[key] for item in items]) for key in items[0]}
+        return np.stack(items)
+
+    @staticmethod
+    def _unstack(batch, num_items):
+        """
+        Splits a batch (e.g. of actions) into a list of single items.
+        """
+        if isinstance(batch, dict):
+            return [{key: value[i] for key, value in batch.items()} for i in range_(num_items)]
+        return [batch[i] for i in range_(num_items)]
+
+    def observe_chunk_size(self):
+        """
+        Returns:
+            int: The number of records per environment after which its trajectory chunk is passed to the agent
+                (the agent's observe buffer size, 1 if buffering is disabled, which requires a single environment).
+        """
+        if self.agent.observe_spec["buffer_enabled"] is True:
+            return max(self.agent.observe_spec["buffer_size"], 1)
+        return 1
+
+    def _observe_trajectory(self, trajectory, env_id):
+        """
+        Passes an environment's collected trajectory chunk to the agent (as one batch) and clears it.
+        """
+        if len(trajectory["rewards"]) == 0:
+            return
+        self.agent.observe(
+            states=self._stack(trajectory["states"]),
+            actions=self._stack(trajectory["actions"]),
+            internals=[],
+            rewards=np.asarray(trajectory["rewards"]),
+            terminals=np.asarray(trajectory["terminals"]),
+            env_id=env_id
+        )
+        for value in trajectory.values():
+            del value[:]
+
+    def _execute(
+        self,
+        num_timesteps=None,
+        num_episodes=None,
+        max_timesteps_per_episode=None,
+        deterministic=False,
+        update_spec=None
+    ):
+        """
+        Actual implementation underlying `execute_timesteps` and `execute_episodes`. Same semantics as in
+        `SingleThreadedWorker._execute`, with timesteps, env frames and episodes counted over all environments.
+        """
+        assert num_timesteps is not None or num_episodes is not None, "ERROR: One of `num_timesteps` or " \
+                                                                      "`num_episodes` must be provided!"
+        # Are we updating or just acting/observing?
+        update_spec = default_dict(update_spec, self.agent.update_spec)
+        self.set_update_schedule(update_spec)
+
+        num_timesteps = num_timesteps or 0
+        num_episodes = num_episodes or 0
+        max_timesteps_per_episode = max_timesteps_per_episode or 0
+
+        # Stats.
+        timesteps_executed = 0
+        episodes_executed = 0
+        env_frames = 0
+        episode_rewards = list()
+        episode_durations = list()
+        episode_steps = list()
+        start = time.monotonic()
+
+        # Per-environment episode state.
+        states = [self.reset_environment(i) for i in range_(self.num_environments)]
+        episode_reward = [0] * self.num_environments
+        episode_timestep = [0] * self.num_environments
+        episode_start = [time.monotonic()] * self.num_environments
+        trajectories = [dict(states=[], actions=[], rewards=[], terminals=[]) for _ in range_(self.num_environments)]
+        chunk_size = self.observe_chunk_size()
+
+        # Only run everything for at most num_timesteps (if defined).
+        while not (0 < num_timesteps <= timesteps_executed) and not (0 < num_episodes <= episodes_executed):
+            # One graph execution for all environments.
+            actions = self._unstack(
+                self.agent.get_action(states=self._stack(states), deterministic=deterministic), self.num_environments
+            )
+            next_states, rewards, terminals, frames = self.step_environments(actions)
+            env_frames += frames
+
+            for i in range_(self.num_environments):
+                trajectories[i]["states"].append(states[i])
+                trajectories[i]["actions"].append(actions[i])
+                trajectories[i]["rewards"].append(rewards[i])
+                trajectories[i]["terminals"].append(terminals[i])
+                episode_reward[i] += rewards[i]
+                episode_timestep[i] += 1
+                states[i] = next_states[i]
+
+                # Is the episode finished or do we have to terminate it prematurely because of other restrictions?
+                if terminals[i] or (0 < max_timesteps_per_episode <= episode_timestep[i]):
+                    self._observe_trajectory(trajectories[i], env_id=i)
+                    episodes_executed += 1
+                    episode_rewards.append(episode_reward[i])
+                    episode_durations.append(time.monotonic() - episode_start[i])
+                    episode_steps.append(episode_timestep[i])
+                    self.logger.info("Finished episode (env {}): reward={}, actions={}, duration={}s.".format(
+                        i, episode_reward[i], episode_timestep[i], episode_durations[-1]))
+
+                    states[i] = self.reset_environment(i)
+                    episode_reward[i] = 0
+                    episode_timestep[i] = 0
+                    episode_start[i] = time.monotonic()
+                # Don't hold records back until the episode ends: Updates below sample from the memory.
+                elif len(trajectories[i]["rewards"]) >= chunk_size:
+                    self._observe_trajectory(trajectories[i], env_id=i)
+
+            # Keep the update schedule per timestep (N timesteps were just executed).
+            for _ in range_(self.num_environments):
+                loss = self.update_if_necessary(timesteps_executed)
+                if loss is not None:
+                    self.logger.info("LOSS: {}".format(loss))
+                timesteps_executed += 1
+
+        # Hand over the unfinished episodes and insert everything still buffered.
+        for i, trajectory in enumerate(trajectories):
+            self._observe_trajectory(trajectory, env_id=i)
+        self.agent.flush_buffers()
+
+        total_time = (time.monotonic() - start) or 1e-10
+
+        results = dict(
+            runtime=total_time,
+            # Agent act/observe throughput (over all environments).
+            timesteps_executed=timesteps_executed,
+            ops_per_second=(timesteps_executed / total_time),
+            # Env frames including action repeats (over all environments).
+            env_frames=env_frames,
+            env_frames_per_second=(env_frames / total_time),
+            episodes_executed=episodes_executed,
+            episodes_per_minute=(episodes_executed/(total_time / 60)),
+            mean_episode_runtime=np.mean(episode_durations) if episode_durations else 0.0,
+            mean_episode_reward=np.mean(episode_rewards) if episode_rewards else 0.0,
+            max_episode_reward=np.max(episode_rewards) if episode_rewards else 0.0,
+            final_episode_reward=episode_rewards[-1] if episode_rewards else 0.0
+        )
+        if self.replay_ratio_controller is not None:
+            results["replay_ratio"] = self.replay_ratio_controller.achieved_ratio
+        # Batch prefetching (totals over the Agent's lifetime, e.g. prefetch_starved_time).
+        if self.agent.prefetch_stats["updates"] > 0:
+            results.update({"prefetch_" + key: value for key, value in self.agent.prefetch_stats.items()})
+
+        self.logger.info("Finished execution in {} s".format(total_time))
+        self.logger.info("Time steps (actions) executed: {} ({} ops/s)".
+                         format(results['timesteps_executed'], results['ops_per_second']))
+        self.logger.info("Env frames executed (incl. action repeats): {} ({} frames/s)".
+                         format(results['env_frames'], results['env_frames_per_second']))
+        self.logger.info("Episodes finished: {} ({} episodes/min)".
+                         format(results['episodes_executed'], results['episodes_per_minute']))
+        self.logger.info("Mean episode reward: {}".format(results['mean_episode_reward']))
+
+        return results
@@ -19,8 +19,11 @@ from __future__ import print_function
 
 import logging
 from six.moves import xrange as range_
+import threading
+import time
 
 from yarl import Specifiable
+from yarl.execution.replay_ratio_controller import ReplayRatioController
 
 
 class Worker(Specifiable):
@@ -47,6 +50,13 @@ class Worker(Specifiable):
         self.update_interval = None
         self.update_steps = None
         self.sync_interval = None
+        # Replaces the fixed update schedule if a target replay ratio is given.
+        self.replay_ratio_controller = None
+
+        # Guards the agent's graph calls if acting and updating run on different threads.
+        self.session_lock = threading.RLock()
+        # Time spent in `Agent.update` calls (see `update_agent`).
+        self.update_time = 0.0
 
     def execute_timesteps(self, num_timesteps, max_timesteps_per_episode=0, update_spec=None, deterministic=False):
         """
@@ -124,7 +134,21 @@ class Worker(Specifiable):
         Returns:
             float: The summed up loss (over all self.update_steps).
         """
-        if self.updating:
+        if self.updating and self.replay_ratio_controller is not None:
+            # One more sample observed. Update as often as needed to reach the target replay ratio (acting
+            # waits for learning), or not at all while learning is ahead.
+            self.replay_ratio_controller.add_inserted(1)
+            if timesteps_executed > self.steps_before_update and \
+                    (self.agent.observe_spec["buffer_enabled"] is False or
+                     timesteps_executed >= self.agent.observe_spec["buffer_size"]):
+                num_updates = self.replay_ratio_controller.num_updates_due()
+                if num_updates > 0:
+                    loss = 0
+                    for _ in range_(num_updates):
+                        loss += self.update_agent()
+                    self.replay_ratio_controller.add_learned(num_updates)
+                    return loss
+        elif self.updating:
             # Are we allowed to update?
             if timesteps_executed > self.steps_before_update and \
                     (self.agent.observe_spec["buffer_enabled"] is False or  # no update before some data in buffer
@@ -133,13 +157,26 @@ class Worker(Specifiable):
                 loss = 0
                 for _ in range_(self.update_steps):
                     #l, s_, a_, r_, t_ = self.agent.update()
-                    loss += self.agent.update()
+                    loss += self.update_agent()
                     #self.logger.info("FROM MEM: s={} a={} r={} t={}".format(s_, a_, r_, t_))
                     #loss += l
                 return loss
 
         return None
 
+    def update_agent(self):
+        """
+        Performs a single agent update while holding the session lock and adds its duration to `update_time`.
+
+        Returns:
+            float: The update's loss.
+        """
+        with self.session_lock:
+            start = time.monotonic()
+            loss = self.agent.update()
+            self.update_time += time.monotonic() - start
+        return loss
+
     def set_update_schedule(self, update_schedule=None):
         """
         Sets this worker's update schedule. By default, a worker is not updating but only acting
@@ -149,11 +186,20 @@ class Worker(Specifiable):
             update_schedule (Optional[dict]): Update parameters. If None, the worker only performs rollouts.
                 Expects keys 'update_interval' to indicate how frequent update is called, 'num_updates'
                 to indicate how many updates to perform every update interval, and 'steps_before_update' to indicate
-                how many steps to perform before beginning to update.
+                how many steps to perform before beginning to update. If 'replay_ratio' is given (samples
+                learned per sample observed), updates are scheduled to keep that ratio instead of every
+                'update_interval' steps.
         """
+        self.replay_ratio_controller = None
         if update_schedule is not None:
             self.updating = True
             self.steps_before_update = update_schedule['steps_before_update']
             self.update_interval = update_schedule['update_interval']
             self.update_steps = update_schedule['update_steps']
             self.sync_interval= update_schedule['sync_interval']
+            if update_schedule.get('replay_ratio') is not None:
+                self.replay_ratio_controller = ReplayRatioController(
+                    replay_ratio=update_schedule['replay_ratio'],
+                    batch_size=update_schedule['batch_size'],
+                    min_inserted=self.steps_before_update
+                )
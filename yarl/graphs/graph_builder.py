@@ -536,7 +536,29 @@ class GraphBuilder(Specifiable):
 
         Returns:
             tuple: fetch-dict, feed-dict with relevant args.
-9       """
+        """
+        fetch_list, feed_list = self.get_execution_plan(output_socket_names, inputs)
+        feed_dict = dict()
+        for in_op, in_sock_name in feed_list:
+            feed_dict[in_op] = self.get_feed_value(inputs, in_sock_name)
+        return fetch_list, feed_dict
+
+    def get_execution_plan(self, output_socket_names, inputs=None):
+        """
+        Resolves the ops to fetch and the placeholders to feed for an execution call. The result only depends on
+        `output_socket_names` and the in-Socket names in `inputs` (not on the input values), so it can be
+        reused for all calls with the same signature.
+
+        Args:
+            output_socket_names (Union[str,List[str]]): See `get_execution_inputs`.
+            inputs (Optional[dict,data]): See `get_execution_inputs`.
+
+        Returns:
+            tuple:
+                - list: The ops to fetch.
+                - list: Tuples of (placeholder op, in-Socket name) in feed order. The in-Socket name is None if the
+                    placeholder is fed with `inputs` itself (data given directly, not as an in-Socket name dict).
+        """
         output_socket_names = force_list(output_socket_names)
 
         # Sanity check out-Socket names.
@@ -546,6 +568,8 @@ class GraphBuilder(Specifiable):
                                 "correct out-Socket name.".format(out_sock_name))
 
         only_input_socket_name = None  # the name of the only in-Socket possible here
+        # The in-Socket name, whose data is `inputs` itself (not an item of it).
+        direct_input_socket_name = None
         # Some input is given.
         if inputs is not None:
             # Get only in-Socket ..
@@ -562,14 +586,14 @@ class GraphBuilder(Specifiable):
                     raise YARLError("ERROR: Input data (`inputs`) given directly (not as dict) AND more than one \n"
                                     "in-Socket in Model OR more than one in-Socket needed for given out-Sockets '{}'!".
                                     format(output_socket_names))
-                inputs = {only_input_socket_name: inputs}
+                direct_input_socket_name = only_input_socket_name
             # Is a dict: Check whether it's a in-Socket name dict (leave as is) or a
             # data dict (add in-Socket name as key).
             else:
                 # We have more than one necessary in-Sockets (leave as is) OR
                 # the only necessary in-Socket name is not key of the dict -> wrap it.
                 if only_input_socket_name is not None and only_input_socket_name not in inputs:
-                    inputs = {only_input_socket_name: inputs}
+                    direct_input_socket_name = only_input_socket_name
 
             # Try all possible input combinations to see whether we got an op for that.
             # Input Socket names will be sorted alphabetically and combined from short sequences up to longer ones.
@@ -577,7 +601,10 @@ class GraphBuilder(Specifiable):
             #   input_combinations=[ABC, AB, AC, BC, A, B, C]
 
             # These combinations have been memoized for fast lookup.
-            key = tuple(sorted(inputs.keys()))
+            if direct_input_socket_name is not None:
+                key = (direct_input_socket_name,)
+            else:
+                key = tuple(sorted(inputs.keys()))
             input_combinations = self.input_combinations.get(key)
             if not input_combinations:
                 raise YARLError("ERROR: At least one of the given in-Socket names {} seems to be non-existent "
@@ -589,16 +616,38 @@ class GraphBuilder(Specifiable):
 
         # Go through each (core) out-Socket names and collect the correct ops to go into the fetch_list.
         fetch_list = list()
-        feed_dict = dict()
+        feed_list = list()
         for out_socket_name in output_socket_names:
             # Updates with relevant ops
-            fetch_list, feed_dict = self._get_execution_inputs_for_socket(
-                out_socket_name, input_combinations, fetch_list, inputs, feed_dict)
-        return fetch_list, feed_dict
+            fetch_list, feed_list = self._get_execution_inputs_for_socket(
+                out_socket_name, input_combinations, fetch_list, feed_list)
+
+        if direct_input_socket_name is not None:
+            feed_list = [(in_op, None if in_sock_name == direct_input_socket_name else in_sock_name)
+                         for in_op, in_sock_name in feed_list]
+        return fetch_list, feed_list
+
+    @staticmethod
+    def get_feed_value(inputs, in_sock_name):
+        """
+        Returns the value to feed for an in-Socket (see `get_execution_plan`).
+
+        Args:
+            inputs (Optional[dict,data]): The inputs given to the execution call.
+            in_sock_name (Optional[str]): The in-Socket name. None if `inputs` is the data itself.
+
+        Returns:
+            any: The value to feed.
+        """
+        value = inputs if in_sock_name is None else inputs[in_sock_name]
+        # Numpy'ize scalar values (tf doesn't sometimes like python primitives).
+        if isinstance(value, (float, int, bool)):
+            value = np.array(value)
+        return value
 
-    def _get_execution_inputs_for_socket(self, socket_name, input_combinations, fetch_list, input_dict, feed_dict):
+    def _get_execution_inputs_for_socket(self, socket_name, input_combinations, fetch_list, feed_list):
         """
-        Helper (to avoid nested for loop-break) for the loop in get_execution_inputs.
+        Helper (to avoid nested for loop-break) for the loop in get_execution_plan.
 
         Args:
             socket_name (str): The name of the (core) out-Socket to process.
@@ -606,13 +655,10 @@ class GraphBuilder(Specifiable):
                 with the most Socket names, then going towards combinations with only one Socket name.
                 Each combination in itself should already be sorted alphabetically on the in-Socket names.
             fetch_list (list): Appends to this list, which ops to actually fetch.
-            input_dict (Optional[dict]): Dict specifying the provided inputs for some (core) in-Sockets.
-                Passed through directly from the call method.
-            feed_dict (dict): The feed_dict we are trying to build. When done,
-                needs to map input ops (not Socket names) to data.
+            feed_list (list): The (placeholder op, in-Socket name) tuples to feed. Appends to this list.
 
         Returns:
-            tuple: fetch_list, feed-dict with relevant args.
+            tuple: fetch_list, feed_list.
         """
         if len(input_combinations) > 0:
             # Check all (input+shape)-combinations and it we find one that matches what the user passed in as
@@ -627,20 +673,17 @@ class GraphBuilder(Specifiable):
                 # This is a good combination -> Use the looked up op, return to process next out-Socket.
                 if key in self.call_registry:
                     fetch_list.append(self.call_registry[key])
-                    # Add items to feed_dict.
+                    # Add items to the feeds (once per placeholder).
                     for in_sock_name, in_op in zip(input_combination, ops):
-                        value = input_dict[in_sock_name]
-                        # Numpy'ize scalar values (tf doesn't sometimes like python primitives).
-                        if isinstance(value, (float, int, bool)):
-                            value = np.array(value)
-                        feed_dict[in_op] = value
-                    return fetch_list, feed_dict
+                        if all(in_op is not op for op, _ in feed_list):
+                            feed_list.append((in_op, in_sock_name))
+                    return fetch_list, feed_list
         # No inputs -> Try whether this output socket comes without any inputs.
         else:
             key = (socket_name, (), ())
             if key in self.call_registry:
                 fetch_list.append(self.call_registry[key])
-                return fetch_list, feed_dict
+                return fetch_list, feed_list
 
         required_inputs = [k[1] for k in self.call_registry.keys() if k[0] == socket_name]
         raise YARLError("ERROR: No op found for out-Socket '{}' given the input-combinations: {}! "
@@ -145,6 +145,27 @@ class GraphExecutor(Specifiable):
         """
         raise NotImplementedError
 
+    def store_memories(self, path, blocking=False, chunk_size=100000):
+        """
+        Writes a snapshot of all memories in the graph to disk (memories are not part of model checkpoints).
+
+        Args:
+            path (str): The directory to store the snapshot in.
+            blocking (bool): Whether to wait for the snapshot to be written (otherwise, it is written in the
+                background).
+            chunk_size (int): The number of memory rows to read and write at once.
+        """
+        raise NotImplementedError
+
+    def load_memories(self, path):
+        """
+        Restores all memories in the graph from a snapshot written by `store_memories`.
+
+        Args:
+            path (str): The directory of the snapshot.
+        """
+        raise NotImplementedError
+
     def get_device_assignments(self, device_names=None):
         """
         Get assignments for device(s).
@@ -163,7 +184,8 @@ class GraphExecutor(Specifiable):
         Returns all weights for computation graph of  this graph executor.
 
         Returns:
-            any: Weights for this graph..
+            any: Weights for this graph (for agents exposing "get_flat_weights": one flat float32 array
+                holding all policy weights).
         """
         raise NotImplementedError
 
@@ -17,15 +17,60 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import json
+import numpy as np
 import os
+import re
+import shutil
+import threading
 import tensorflow as tf
-from tensorflow.python.client import device_lib
+from tensorflow.python.client import device_lib, timeline
+from collections import OrderedDict
+from six.moves import xrange as range_
 
+from yarl import YARLError
+from yarl.components.memories.memory import Memory
 from yarl.graphs.graph_executor import GraphExecutor
 from yarl.backend_system import get_distributed_backend
 import yarl.utils as util
 
 
+class SharedExclusiveLock(object):
+    """
+    A lock that may be held by any number of threads at once (shared) or by a single thread alone (exclusive).
+    Pending exclusive acquisitions block new shared ones, so a stream of shared holders cannot starve them.
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.num_shared = 0
+        self.exclusive = False
+
+    def acquire_shared(self):
+        with self.condition:
+            while self.exclusive:
+                self.condition.wait()
+            self.num_shared += 1
+
+    def release_shared(self):
+        with self.condition:
+            self.num_shared -= 1
+            if self.num_shared == 0:
+                self.condition.notify_all()
+
+    def acquire_exclusive(self):
+        with self.condition:
+            while self.exclusive:
+                self.condition.wait()
+            self.exclusive = True
+            while self.num_shared > 0:
+                self.condition.wait()
+
+    def release_exclusive(self):
+        with self.condition:
+            self.exclusive = False
+            self.condition.notify_all()
+
+
 class TensorFlowExecutor(GraphExecutor):
     """
     A Tensorflow executioner manages execution via TensorFlow sessions.
@@ -44,6 +89,23 @@ class TensorFlowExecutor(GraphExecutor):
         # tf.Scaffold.
         self.scaffold = None
 
+        # Memory snapshots: Start/limit placeholders for chunked reads/writes, the ops per memory and variable
+        # (key=memory scope, value=dict(key=variable name, value=(num rows, read op, write op, value placeholder)))
+        # and the background thread writing the last snapshot.
+        self.snapshot_start = None
+        self.snapshot_limit = None
+        self.memory_snapshot_ops = None
+        # The names of each memory's record variables (key=memory scope), whose rows only change on insert.
+        self.memory_snapshot_records = None
+        self.memory_snapshot_thread = None
+        # Held shared by all graph executions and exclusively while a snapshot reads from the memories (so no
+        # insert or priority update can interleave with a single read).
+        self.memory_snapshot_lock = SharedExclusiveLock()
+        # Out-Sockets run without the snapshot lock: They only read the memories and may block for long (enqueueing
+        # into a full prefetch queue), so holding the lock would keep a snapshot from ever starting while the
+        # learner (whose dequeue would drain the queue) waits for the snapshot.
+        self.snapshot_unlocked_sockets = {"prefetch_batch", "prefetch_queue_size", "close_prefetch_queue"}
+
         # The Server (for distributed mode).
         self.server = None  # The tf.Server object (if any).
 
@@ -57,20 +119,32 @@ class TensorFlowExecutor(GraphExecutor):
         self.session = None
         self.monitored_session = None
 
+        # Memoized execution plans (fetch list, feed order, session callable) per (out-Socket names, in-Socket
+        # names) signature (see `get_execution_plan`).
+        self.execution_plans = dict()
+        # Out-Sockets (e.g. the act path) executed via session callables. These calls skip the monitored
+        # session's hooks (saving checkpoints and summaries), which are run by all other calls.
+        self.callable_sockets = set(self.execution_spec["callable_sockets"])
+        # `execute` is called from several threads (e.g. batch prefetching, pipelined updates): Guards the
+        # execution plan cache and the profiler state.
+        self.execution_lock = threading.Lock()
+
         self.graph_default_context = None
         self.local_device_protos = device_lib.list_local_devices()
         self.available_devices = [x.name for x in self.local_device_protos]
 
-        # Tf profiler.
-        self.session_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
-        self.run_metadata = tf.RunMetadata()
-
-        # Tf Profiler config.
+        # Tf profiler config: Only steps chosen via `profiler_frequency` (or `profiler_sampling_rate`) are run
+        # with full tracing, all others take the plain `session.run` path.
         self.profiling_enabled = self.execution_spec["enable_profiler"]
         if self.profiling_enabled is True:
             self.profiler = None
             self.profile_step = 0
             self.profiling_frequency = self.execution_spec["profiler_frequency"]
+            self.profiling_sampling_rate = self.execution_spec["profiler_sampling_rate"]
+            # Separate RNG for sampling profiling steps (don't interfere with seeded numpy randomness).
+            self.profiling_rng = np.random.RandomState()
+            self.timeline_directory = self.execution_spec["profiler_timeline_directory"]
+            self.session_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
 
         # Default device is first available CPUs
         default_device = self.execution_spec.get("default_device", None)
@@ -97,28 +171,113 @@ class TensorFlowExecutor(GraphExecutor):
         self.finish_graph_setup()
 
     def execute(self, sockets, inputs=None):
-        fetch_list, feed_dict = self.graph_builder.get_execution_inputs(output_socket_names=sockets, inputs=inputs)
-        ret = self.monitored_session.run(fetch_list, feed_dict=feed_dict,
-                                         options=self.session_options, run_metadata=self.run_metadata)
+        plan = self.get_execution_plan(sockets, inputs)
+        feeds = [self.graph_builder.get_feed_value(inputs, in_sock_name) for _, in_sock_name in plan["feed_list"]]
+        fetch_list = plan["fetch_list"]
 
+        # The step number to trace (if any).
+        profile_step = None
         if self.profiling_enabled:
-            self.update_profiler_if_necessary()
+            with self.execution_lock:
+                if self.is_profiling_step():
+                    profile_step = self.profile_step
+                self.profile_step += 1
+
+        if plan["snapshot_lock"]:
+            self.memory_snapshot_lock.acquire_shared()
+        try:
+            if profile_step is not None:
+                run_metadata = tf.RunMetadata()
+                ret = self.monitored_session.run(fetch_list, feed_dict=dict(zip(plan["feed_ops"], feeds)),
+                                                 options=self.session_options, run_metadata=run_metadata)
+                with self.execution_lock:
+                    self.update_profiler(run_metadata, profile_step)
+            # Fast path: Positional feeds into a cached session callable (bypasses the session hooks).
+            elif plan["callable"] is not None:
+                ret = plan["callable"](*feeds)
+            else:
+                ret = self.monitored_session.run(fetch_list, feed_dict=dict(zip(plan["feed_ops"], feeds)))
+        finally:
+            if plan["snapshot_lock"]:
+                self.memory_snapshot_lock.release_shared()
+
         if len(fetch_list) == 1:
             return ret[0]
         else:
             return ret
 
-    def update_profiler_if_necessary(self):
+    def get_execution_plan(self, sockets, inputs=None):
+        """
+        Returns the memoized fetch list and feed order (and, for sockets in `callable_sockets`, the session
+        callable) for an execution signature: The out-Socket names plus the names of the given in-Sockets.
+
+        Args:
+            sockets (Union[str,List[str]]): The out-Socket name(s) to fetch.
+            inputs (Optional[dict,data]): The inputs given to `execute`.
+
+        Returns:
+            dict: The plan with keys "fetch_list", "feed_list", "feed_ops", "callable" (None if the call
+                has to go through the monitored session) and "snapshot_lock" (whether the call holds the memory
+                snapshot lock, see `snapshot_unlocked_sockets`).
         """
-        Updates profiler according to specification.
+        sockets = tuple(util.force_list(sockets))
+        if inputs is None:
+            input_names = None
+        elif isinstance(inputs, dict):
+            input_names = tuple(sorted(inputs.keys()))
+        else:
+            # Data given directly (not as in-Socket name dict).
+            input_names = ""
+        key = (sockets, input_names)
+
+        plan = self.execution_plans.get(key)
+        if plan is None:
+            with self.execution_lock:
+                # Another thread may have created the plan in the meantime.
+                plan = self.execution_plans.get(key)
+                if plan is None:
+                    fetch_list, feed_list = self.graph_builder.get_execution_plan(list(sockets), inputs)
+                    feed_ops = [in_op for in_op, _ in feed_list]
+                    session_callable = None
+                    if all(socket in self.callable_sockets for socket in sockets):
+                        session_callable = self.session.make_callable(fetches=fetch_list, feed_list=feed_ops)
+                    snapshot_lock = not all(socket in self.snapshot_unlocked_sockets for socket in sockets)
+                    plan = dict(fetch_list=fetch_list, feed_list=feed_list, feed_ops=feed_ops,
+                                callable=session_callable, snapshot_lock=snapshot_lock)
+                    self.execution_plans[key] = plan
+        return plan
+
+    def is_profiling_step(self):
         """
-        if self.profile_step % self.profiling_frequency == 0:
-            self.profiler.add_step(self.profile_step, self.run_metadata)
-            self.profiler.profile_operations(
-                options=tf.profiler.ProfileOptionBuilder(
-                    options=tf.profiler.ProfileOptionBuilder.time_and_memory()).with_node_names().build()
-            )
-        self.profile_step += 1
+        Returns:
+            bool: Whether the current step should be traced: With probability `profiler_sampling_rate` (if
+                given), otherwise every `profiler_frequency` steps.
+        """
+        if self.profiling_sampling_rate is not None:
+            return self.profiling_rng.random_sample() < self.profiling_sampling_rate
+        return self.profile_step % self.profiling_frequency == 0
+
+    def update_profiler(self, run_metadata, step):
+        """
+        Adds the trace of a profiled step to the profiler and writes it as a Chrome trace timeline
+        (`timeline-[step].json`, viewable under chrome://tracing) into the timeline directory.
+
+        Args:
+            run_metadata (tf.RunMetadata): The metadata collected during the traced `session.run` call.
+            step (int): The number of the traced step.
+        """
+        self.profiler.add_step(step, run_metadata)
+        self.profiler.profile_operations(
+            options=tf.profiler.ProfileOptionBuilder(
+                options=tf.profiler.ProfileOptionBuilder.time_and_memory()).with_node_names().build()
+        )
+        if self.timeline_directory is not None:
+            if not os.path.exists(self.timeline_directory):
+                os.makedirs(self.timeline_directory)
+            trace = timeline.Timeline(step_stats=run_metadata.step_stats)
+            path = os.path.join(self.timeline_directory, "timeline-{}.json".format(step))
+            with open(path, "w") as file:
+                file.write(trace.generate_chrome_trace_format())
 
     def read_variable_values(self, variables):
         """
@@ -207,6 +366,7 @@ class TensorFlowExecutor(GraphExecutor):
         hooks = []  # Will be appended to in the following functions.
         self.setup_saver(hooks)
         self.setup_summaries(hooks)
+        self.setup_memory_snapshots()
         self.setup_scaffold()
 
         # Finalize our graph, create and enter the session.
@@ -219,8 +379,11 @@ class TensorFlowExecutor(GraphExecutor):
         Args:
             hooks (list): List of hooks to use for Saver and Summarizer in Session. Should be appended to.
         """
+        # Memories are not part of model checkpoints (see `store_memories`).
+        memory_variables = set(name for memory in self.get_memories() for name in memory.variables)
         self.saver = tf.train.Saver(
-            var_list=list(self.graph_builder.core_component.variables.values()),
+            var_list=[variable for name, variable in self.graph_builder.core_component.variables.items()
+                      if name not in memory_variables],
             reshape=False,
             sharded=False,
             max_to_keep=self.saver_spec["max_checkpoints"],  # TODO: open question: how to handle settings?
@@ -285,6 +448,260 @@ class TensorFlowExecutor(GraphExecutor):
             # ... and append it to our list of hooks to use in the session.
             hooks.append(summary_saver_hook)
 
+    def get_memories(self):
+        """
+        Returns:
+            List[Memory]: All Memory Components in our core Component (at any depth).
+        """
+        memories = list()
+        components = [self.graph_builder.core_component]
+        while len(components) > 0:
+            component = components.pop()
+            if isinstance(component, Memory):
+                memories.append(component)
+            components.extend(component.sub_components.values())
+        return memories
+
+    def setup_memory_snapshots(self):
+        """
+        Creates the ops to read and write all memory variables chunk by chunk (must happen before the graph
+        gets finalized) and stores them in `self.memory_snapshot_ops`.
+        """
+        self.snapshot_start = tf.placeholder(dtype=tf.int32, shape=(), name="snapshot-start")
+        self.snapshot_limit = tf.placeholder(dtype=tf.int32, shape=(), name="snapshot-limit")
+        self.memory_snapshot_ops = OrderedDict()
+        self.memory_snapshot_records = dict()
+        for memory in self.get_memories():
+            ops = OrderedDict()
+            record_variable_names = set(variable.name for variable in (memory.record_registry or dict()).values())
+            self.memory_snapshot_records[memory.global_scope] = list()
+            for name, variable in memory.variables.items():
+                name = re.sub(r'^{}/'.format(re.escape(memory.global_scope)), "", name)
+                if variable.name in record_variable_names and variable.get_shape().ndims > 0:
+                    self.memory_snapshot_records[memory.global_scope].append(name)
+                value = tf.placeholder(dtype=variable.dtype.base_dtype, shape=None)
+                # Scalars (e.g. index, size) are read and written as a whole.
+                if variable.get_shape().ndims == 0:
+                    ops[name] = (None, tf.identity(input=variable), tf.assign(ref=variable, value=value), value)
+                else:
+                    ops[name] = (
+                        variable.get_shape().as_list()[0],
+                        variable[self.snapshot_start:self.snapshot_limit],
+                        variable[self.snapshot_start:self.snapshot_limit].assign(value),
+                        value
+                    )
+            self.memory_snapshot_ops[memory.global_scope] = ops
+
+    def store_memories(self, path, blocking=False, chunk_size=100000):
+        """
+        Writes a snapshot of all memories (records, indices, sizes, priority trees, etc..) to disk, one directory per
+        memory and variable with one .npy file per chunk of `chunk_size` rows. Runs in a background thread and
+        writes each chunk to disk as soon as it is read, so only one chunk is held in RAM at a time.
+        Graph executions (acting, inserts, updates) only pause for short reads: Record rows are read chunk by chunk,
+        each chunk under its own hold of the snapshot lock together with the memory's insert index. A final hold
+        reads everything else (scalars, priority trees) and re-reads the record rows inserted since their chunk
+        was read, so each memory's snapshot is consistent as of that final read. If more than a memory's capacity
+        gets inserted while its records are read, its snapshot is instead read under a single hold of the lock.
+        The snapshot only replaces a previous one at `path` once it is complete.
+
+        Args:
+            path (str): The directory to store the snapshot in.
+            blocking (bool): Whether to wait for the snapshot to be written.
+            chunk_size (int): The number of memory rows to read and write at once.
+
+        Returns:
+            threading.Thread: The thread writing the snapshot.
+        """
+        # Only one snapshot at a time.
+        if self.memory_snapshot_thread is not None:
+            self.memory_snapshot_thread.join()
+        self.memory_snapshot_thread = threading.Thread(
+            target=self._store_memories, args=(path, chunk_size), name="memory-snapshot-thread"
+        )
+        self.memory_snapshot_thread.daemon = True
+        self.memory_snapshot_thread.start()
+        if blocking:
+            self.memory_snapshot_thread.join()
+        return self.memory_snapshot_thread
+
+    def _store_memories(self, path, chunk_size):
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+
+        for memory_scope in self.memory_snapshot_ops:
+            if not self._store_memory_by_chunks(tmp_path, memory_scope, chunk_size):
+                self._store_memory_exclusive(tmp_path, memory_scope, chunk_size)
+
+        with open(os.path.join(tmp_path, "snapshot.json"), "w") as fp:
+            json.dump(dict(memories=list(self.memory_snapshot_ops.keys()), chunk_size=chunk_size), fp)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(tmp_path, path)
+        self.logger.info("Stored memory snapshot to path: {}".format(path))
+
+    @staticmethod
+    def _snapshot_file(snapshot_path, memory_scope, name, chunk):
+        directory = os.path.join(snapshot_path, re.sub(r'/', "-", memory_scope), re.sub(r'/', "-", name))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        return os.path.join(directory, "chunk-{:05d}.npy".format(chunk))
+
+    def _read_rows(self, read_op, start, limit):
+        return self.session.run(read_op, feed_dict={self.snapshot_start: start, self.snapshot_limit: limit})
+
+    def _store_memory_exclusive(self, snapshot_path, memory_scope, chunk_size):
+        """
+        Writes the snapshot of a single memory, reading all of it under one hold of the snapshot lock.
+        """
+        ops = self.memory_snapshot_ops[memory_scope]
+        shutil.rmtree(os.path.join(snapshot_path, re.sub(r'/', "-", memory_scope)), ignore_errors=True)
+        self.memory_snapshot_lock.acquire_exclusive()
+        try:
+            for name, (num_rows, read_op, _, _) in ops.items():
+                if num_rows is None:
+                    np.save(self._snapshot_file(snapshot_path, memory_scope, name, 0), self.session.run(read_op))
+                    continue
+                for i, start in enumerate(range_(0, num_rows, chunk_size)):
+                    value = self._read_rows(read_op, start, min(start + chunk_size, num_rows))
+                    np.save(self._snapshot_file(snapshot_path, memory_scope, name, i), value)
+        finally:
+            self.memory_snapshot_lock.release_exclusive()
+
+    @staticmethod
+    def _count_inserts(counters, last_counters, capacity):
+        """
+        Returns:
+            int: The number of records inserted between two reads of a memory's insert index (and size). Exact as
+                long as fewer than `capacity` records are inserted in between, `capacity` if the index is unchanged
+                but the size grew.
+        """
+        num_inserted = int((counters[0] - last_counters[0]) % capacity)
+        if num_inserted == 0 and list(counters[1:]) != list(last_counters[1:]):
+            return capacity
+        return num_inserted
+
+    def _store_memory_by_chunks(self, snapshot_path, memory_scope, chunk_size):
+        """
+        Writes the snapshot of a single memory, holding the snapshot lock only per record chunk and once for the
+        remaining variables plus the record rows inserted in between (see `store_memories`).
+
+        Returns:
+            bool: False if the memory cannot be read this way (no insert index or too many inserts while
+                reading), True otherwise.
+        """
+        ops = self.memory_snapshot_ops[memory_scope]
+        record_names = self.memory_snapshot_records[memory_scope]
+        if "index" not in ops or ops["index"][0] is not None or len(record_names) == 0:
+            return False
+        # Insert index (and size, if any) to count the records inserted between reads.
+        counter_ops = [ops["index"][1]]
+        if "size" in ops and ops["size"][0] is None:
+            counter_ops.append(ops["size"][1])
+        capacity = ops[record_names[0]][0]
+
+        # Read (and write) record rows chunk by chunk, each together with the insert counters.
+        # Chunks as (name, chunk number, start, limit, number of records inserted before the chunk was read).
+        chunks = list()
+        num_inserted = 0
+        first_index = last_counters = None
+        for name in record_names:
+            num_rows, read_op, _, _ = ops[name]
+            for i, start in enumerate(range_(0, num_rows, chunk_size)):
+                limit = min(start + chunk_size, num_rows)
+                self.memory_snapshot_lock.acquire_exclusive()
+                try:
+                    value, counters = self.session.run([read_op, counter_ops], feed_dict={
+                        self.snapshot_start: start, self.snapshot_limit: limit
+                    })
+                finally:
+                    self.memory_snapshot_lock.release_exclusive()
+                if last_counters is None:
+                    first_index = counters[0]
+                else:
+                    num_inserted += self._count_inserts(counters, last_counters, capacity)
+                last_counters = counters
+                if num_inserted >= capacity:
+                    return False
+                np.save(self._snapshot_file(snapshot_path, memory_scope, name, i), value)
+                chunks.append((name, i, start, limit, num_inserted))
+
+        # Everything else plus the record rows inserted since their chunk was read, with no insert in between.
+        others = OrderedDict()
+        patches = list()
+        self.memory_snapshot_lock.acquire_exclusive()
+        try:
+            num_inserted += self._count_inserts(self.session.run(counter_ops), last_counters, capacity)
+            if num_inserted >= capacity:
+                return False
+            for name, (num_rows, read_op, _, _) in ops.items():
+                if name in record_names:
+                    continue
+                if num_rows is None:
+                    others[name] = [self.session.run(read_op)]
+                else:
+                    others[name] = [self._read_rows(read_op, start, min(start + chunk_size, num_rows))
+                                    for start in range_(0, num_rows, chunk_size)]
+            for name, i, start, limit, num_inserted_before in chunks:
+                # The rows inserted after this chunk was read (a range that may wrap around the end).
+                first_new = (first_index + num_inserted_before) % capacity
+                num_new = num_inserted - num_inserted_before
+                for range_start, range_limit in [(first_new, min(first_new + num_new, capacity)),
+                                                 (0, max(first_new + num_new - capacity, 0))]:
+                    range_start, range_limit = max(range_start, start), min(range_limit, limit)
+                    if range_start < range_limit:
+                        patches.append((name, i, range_start - start, self._read_rows(
+                            ops[name][1], range_start, range_limit
+                        )))
+        finally:
+            self.memory_snapshot_lock.release_exclusive()
+
+        for name, values in others.items():
+            for i, value in enumerate(values):
+                np.save(self._snapshot_file(snapshot_path, memory_scope, name, i), value)
+        for name, i, offset, rows in patches:
+            file = self._snapshot_file(snapshot_path, memory_scope, name, i)
+            value = np.load(file)
+            value[offset:offset + len(rows)] = rows
+            np.save(file, value)
+        return True
+
+    def load_memories(self, path):
+        """
+        Restores all memories from a snapshot written by `store_memories`.
+
+        Args:
+            path (str): The directory of the snapshot.
+        """
+        if not os.path.exists(os.path.join(path, "snapshot.json")):
+            raise YARLError("ERROR: No (complete) memory snapshot found in '{}'!".format(path))
+
+        # No inserts in between the writes (the restored memories would mix records from both).
+        self.memory_snapshot_lock.acquire_exclusive()
+        try:
+            self._load_memories(path)
+        finally:
+            self.memory_snapshot_lock.release_exclusive()
+        self.logger.info("Loaded memory snapshot from path: {}".format(path))
+
+    def _load_memories(self, path):
+        for memory_scope, ops in self.memory_snapshot_ops.items():
+            for name, (num_rows, _, write_op, value_placeholder) in ops.items():
+                directory = os.path.join(path, re.sub(r'/', "-", memory_scope), re.sub(r'/', "-", name))
+                if not os.path.exists(directory):
+                    self.logger.warning("No snapshot for memory variable {}/{}.".format(memory_scope, name))
+                    continue
+                start = 0
+                for file in sorted(os.listdir(directory)):
+                    value = np.load(os.path.join(directory, file))
+                    if num_rows is None:
+                        self.session.run(write_op, feed_dict={value_placeholder: value})
+                        continue
+                    self.session.run(write_op, feed_dict={
+                        self.snapshot_start: start, self.snapshot_limit: start + len(value), value_placeholder: value
+                    })
+                    start += len(value)
+
     def setup_scaffold(self):
         """
         Creates a tf.train.Scaffold object to be used by the session to initialize variables and to save models
@@ -409,9 +826,9 @@ class TensorFlowExecutor(GraphExecutor):
         self.saver.export_meta_graph(filename=filename)
 
     def get_weights(self):
-        # Default out-socket pulls on variables.
-        return self.execute(sockets="_variables")
+        # One contiguous float32 vector holding all policy variables (see `FlatWeights`).
+        return self.execute(sockets="get_flat_weights")
 
     def set_weights(self, weights):
-        # Note that this can only assign components which have been declared synchronizable.
-        self.execute(sockets="sync", inputs=dict(sync_in=weights))
\ No newline at end of file
+        # Split and assigned in-graph from a single fed buffer.
+        self.execute(sockets="set_flat_weights", inputs=dict(flat_weights=weights))
\ No newline at end of file
@@ -89,3 +89,102 @@ class TestApexAgent(unittest.TestCase):
         batch = agent.get_batch()
         print(batch)
         # Sample a batch and its indices.
+
+    def test_update_priorities(self):
+        """
+        Tests sampling a batch with its indices from the in-graph memory and updating their priorities
+        externally (as the Ape-X replay shards do).
+        """
+        env = RandomEnv(state_space=spaces.IntBox(2), action_space=spaces.IntBox(2), deterministic=True)
+        state_space = env.state_space
+        action_space = env.action_space
+        agent = ApexAgent.from_spec(
+            "configs/apex_agent_for_random_env.json",
+            state_space=state_space,
+            action_space=action_space
+        )
+        self.assertFalse(agent.host_memory)
+        rewards = FloatBox()
+        terminals = BoolBox()
+
+        agent.observe(
+            states=state_space.sample(size=10),
+            actions=action_space.sample(size=10),
+            internals=[],
+            rewards=rewards.sample(size=10),
+            terminals=terminals.sample(size=10)
+        )
+
+        batch, indices = agent.get_batch()
+        self.assertEqual(len(indices), agent.update_spec["batch_size"])
+        self.assertTrue("next_states" in batch)
+        agent.update_priorities(indices, [0.5] * len(indices))
+
+        # Learning from the batch as an external one returns one loss (priority) per record.
+        loss, loss_per_item = agent.update(batch=batch)
+        self.assertEqual(len(loss_per_item), len(indices))
+        agent.update_priorities(indices, loss_per_item)
+
+    def test_n_step_external_update(self):
+        """
+        Tests learning from an external n-step batch (as sampled by a replay shard), including its discounts.
+        """
+        env = RandomEnv(state_space=spaces.IntBox(2), action_space=spaces.IntBox(2), deterministic=True)
+        state_space = env.state_space
+        action_space = env.action_space
+        agent = ApexAgent.from_spec(
+            "configs/apex_agent_for_random_env.json",
+            state_space=state_space,
+            action_space=action_space,
+            memory_spec=dict(type="prioritized_replay", capacity=10, n_step=3)
+        )
+        rewards = FloatBox()
+        terminals = BoolBox()
+
+        agent.observe(
+            states=state_space.sample(size=10),
+            actions=action_space.sample(size=10),
+            internals=[],
+            rewards=rewards.sample(size=10),
+            terminals=terminals.sample(size=10)
+        )
+
+        batch, indices = agent.get_batch()
+        self.assertTrue("discounts" in batch)
+        loss, loss_per_item = agent.update(batch=batch)
+        self.assertEqual(len(loss_per_item), len(indices))
+
+    def test_host_side_memory(self):
+        """
+        Tests inserting, sampling and re-prioritizing via a host-side memory selected through the memory spec.
+        """
+        env = RandomEnv(state_space=spaces.IntBox(2), action_space=spaces.IntBox(2), deterministic=True)
+        state_space = env.state_space
+        action_space = env.action_space
+        agent = ApexAgent.from_spec(
+            "configs/apex_agent_for_random_env.json",
+            state_space=state_space,
+            action_space=action_space,
+            memory_spec=dict(type="mem_prioritized", capacity=10)
+        )
+        self.assertTrue(agent.host_memory)
+        rewards = FloatBox()
+        terminals = BoolBox()
+
+        agent.observe(
+            states=state_space.sample(size=10),
+            actions=action_space.sample(size=10),
+            internals=[],
+            rewards=rewards.sample(size=10),
+            terminals=terminals.sample(size=10)
+        )
+        self.assertEqual(agent.memory.size, 10)
+
+        batch, indices = agent.get_batch()
+        self.assertEqual(len(indices), agent.update_spec["batch_size"])
+        self.assertTrue("next_states" in batch)
+        agent.update_priorities(indices, [0.5] * len(indices))
+
+        # Updates from memory sample on the host and feed the batch in as an external one.
+        loss = agent.update()
+        self.assertTrue(loss is not None)
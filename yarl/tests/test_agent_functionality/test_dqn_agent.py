@@ -18,9 +18,13 @@ from __future__ import division
 from __future__ import print_function
 
 import logging
+import os
+import tempfile
+import threading
 import unittest
 
 from yarl.agents import DQNAgent
+from yarl.components.memories import MemCompressedReplay
 import yarl.spaces as spaces
 from yarl.envs import GridWorld, RandomEnv, OpenAIGymEnv
 from yarl.execution.single_threaded_worker import SingleThreadedWorker
@@ -59,6 +63,217 @@ class TestDQNAgentFunctionality(unittest.TestCase):
         self.assertAlmostEqual(results["max_episode_reward"], 14.312868008192979)
         self.assertAlmostEqual(results["final_episode_reward"], 0.14325251090518198)
 
+    def test_dqn_profiling_timelines(self):
+        """
+        Runs a DQNAgent with the profiler tracing every 10th graph call and checks the written timelines.
+        """
+        env = RandomEnv(state_space=spaces.IntBox(2), action_space=spaces.IntBox(2), deterministic=True)
+        timeline_directory = tempfile.mkdtemp()
+        agent = DQNAgent.from_spec(
+            "configs/dqn_agent_for_random_env.json",
+            double_q=False,
+            dueling_q=False,
+            state_space=env.state_space,
+            action_space=env.action_space,
+            execution_spec=dict(enable_profiler=True, profiler_frequency=10,
+                                profiler_timeline_directory=timeline_directory)
+        )
+        for _ in range(20):
+            agent.get_action(env.state_space.sample())
+
+        self.assertEqual(agent.graph_executor.profile_step, 20)
+        self.assertEqual(sorted(os.listdir(timeline_directory)), ["timeline-0.json", "timeline-10.json"])
+
+    def test_dqn_profiling_from_several_threads(self):
+        """
+        Checks that steps are counted (and traced) exactly once when acting from several threads.
+        """
+        env = RandomEnv(state_space=spaces.IntBox(2), action_space=spaces.IntBox(2), deterministic=True)
+        timeline_directory = tempfile.mkdtemp()
+        agent = DQNAgent.from_spec(
+            "configs/dqn_agent_for_random_env.json",
+            double_q=False,
+            dueling_q=False,
+            state_space=env.state_space,
+            action_space=env.action_space,
+            execution_spec=dict(enable_profiler=True, profiler_frequency=10,
+                                profiler_timeline_directory=timeline_directory)
+        )
+        states = [env.state_space.sample() for _ in range(10)]
+
+        def act():
+            for state in states:
+                agent.get_action(state)
+
+        threads = [threading.Thread(target=act) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(agent.graph_executor.profile_step, 40)
+        self.assertEqual(len(agent.graph_executor.execution_plans), 1)
+        self.assertEqual(sorted(os.listdir(timeline_directory)),
+                         ["timeline-0.json", "timeline-10.json", "timeline-20.json", "timeline-30.json"])
+
+    def test_dqn_cached_session_callables(self):
+        """
+        Checks that repeated act calls reuse one memoized execution plan, with a session callable only if
+        opted in via `callable_sockets` (all other calls run the session hooks).
+        """
+        env = RandomEnv(state_space=spaces.IntBox(2), action_space=spaces.IntBox(2), deterministic=True)
+        for callable_sockets in [None, ["get_actions"]]:
+            agent = DQNAgent.from_spec(
+                "configs/dqn_agent_for_random_env.json",
+                double_q=False,
+                dueling_q=False,
+                state_space=env.state_space,
+                action_space=env.action_space,
+                execution_spec=dict(callable_sockets=callable_sockets) if callable_sockets else None
+            )
+            for _ in range(5):
+                action = agent.get_action(env.state_space.sample(), deterministic=True)
+                self.assertTrue(env.action_space.contains(action))
+
+            plans = agent.graph_executor.execution_plans
+            act_plans = [plan for (sockets, _), plan in plans.items() if sockets == ("get_actions",)]
+            self.assertEqual(len(act_plans), 1)
+            if callable_sockets is None:
+                self.assertIsNone(act_plans[0]["callable"])
+            else:
+                self.assertIsNotNone(act_plans[0]["callable"])
+
+    def test_dqn_n_step_memory_uses_agent_discount(self):
+        """
+        Checks that an n-step memory discounts with the Agent's discount and that n-step updates run.
+        """
+        env = RandomEnv(state_space=spaces.IntBox(2), action_space=spaces.IntBox(2), deterministic=True)
+        agent = DQNAgent.from_spec(
+            "configs/dqn_agent_for_random_env.json",
+            discount=0.9,
+            double_q=False,
+            dueling_q=False,
+            memory_spec=dict(type="replay", capacity=10, n_step=3),
+            state_space=env.state_space,
+            action_space=env.action_space
+        )
+        self.assertEqual(agent.memory.discount, 0.9)
+
+        worker = SingleThreadedWorker(environment=env, agent=agent)
+        worker.execute_timesteps(20, deterministic=True)
+        self.assertTrue(agent.update() is not None)
+
+    def test_dqn_compressed_memory(self):
+        """
+        Builds a DQNAgent with a MemCompressedReplay memory from its spec and runs a few updates.
+        """
+        env = RandomEnv(state_space=spaces.IntBox(2), action_space=spaces.IntBox(2), deterministic=True)
+        agent = DQNAgent.from_spec(
+            "configs/dqn_agent_for_random_env.json",
+            double_q=False,
+            dueling_q=False,
+            memory_spec=dict(type="compressed", capacity=10),
+            observe_spec=dict(buffer_enabled=False),
+            state_space=env.state_space,
+            action_space=env.action_space
+        )
+        self.assertTrue(isinstance(agent.memory, MemCompressedReplay))
+
+        worker = SingleThreadedWorker(environment=env, agent=agent)
+        worker.execute_timesteps(20, deterministic=True)
+        self.assertEqual(agent.memory.size, 10)
+        self.assertTrue(agent.update() is not None)
+
+    def test_dqn_batch_prefetching(self):
+        """
+        Checks that updates consume prefetched batches, report prefetch stats and that terminate stops the thread.
+        """
+        env = RandomEnv(state_space=spaces.IntBox(2), action_space=spaces.IntBox(2), deterministic=True)
+        agent = DQNAgent.from_spec(
+            "configs/dqn_agent_for_random_env.json",
+            double_q=False,
+            dueling_q=False,
+            update_spec=dict(steps_before_update=8, update_interval=4, batch_size=4, sync_interval=16,
+                             prefetch_batches=2),
+            observe_spec=dict(buffer_enabled=False),
+            state_space=env.state_space,
+            action_space=env.action_space
+        )
+        worker = SingleThreadedWorker(environment=env, agent=agent)
+        results = worker.execute_timesteps(40, deterministic=True)
+
+        self.assertGreater(results["prefetch_updates"], 0)
+        self.assertLessEqual(results["prefetch_starved_updates"], results["prefetch_updates"])
+        self.assertIsNotNone(agent.prefetch_thread)
+
+        agent.terminate()
+        self.assertIsNone(agent.prefetch_thread)
+
+    def test_dqn_snapshot_while_prefetching(self):
+        """
+        Checks that a memory snapshot completes while the prefetch thread blocks on a full queue and that
+        updates continue afterwards.
+        """
+        env = RandomEnv(state_space=spaces.IntBox(2), action_space=spaces.IntBox(2), deterministic=True)
+        agent = DQNAgent.from_spec(
+            "configs/dqn_agent_for_random_env.json",
+            double_q=False,
+            dueling_q=False,
+            update_spec=dict(steps_before_update=8, update_interval=4, batch_size=4, sync_interval=16,
+                             prefetch_batches=2),
+            observe_spec=dict(buffer_enabled=False),
+            state_space=env.state_space,
+            action_space=env.action_space
+        )
+        worker = SingleThreadedWorker(environment=env, agent=agent)
+        worker.execute_timesteps(20, deterministic=True)
+        self.assertIsNotNone(agent.prefetch_thread)
+        # Let the prefetch thread fill the queue (it then blocks on the next enqueue).
+        with agent.prefetch_condition:
+            while agent.prefetched_batches < 2:
+                agent.prefetch_condition.wait(timeout=1.0)
+
+        path = tempfile.mkdtemp()
+        snapshot_thread = threading.Thread(target=agent.store_memory, args=(os.path.join(path, "memory"), True))
+        snapshot_thread.daemon = True
+        snapshot_thread.start()
+        snapshot_thread.join(timeout=30.0)
+        self.assertFalse(snapshot_thread.is_alive())
+        self.assertTrue(os.path.exists(os.path.join(path, "memory", "snapshot.json")))
+
+        self.assertTrue(agent.update() is not None)
+        agent.terminate()
+
+    def test_dqn_act_and_observe(self):
+        """
+        Checks that `act_and_observe` inserts each completed transition in the graph call computing the next action.
+        """
+        env = RandomEnv(state_space=spaces.IntBox(2), action_space=spaces.IntBox(2), deterministic=True)
+        agent = DQNAgent.from_spec(
+            "configs/dqn_agent_for_random_env.json",
+            double_q=False,
+            dueling_q=False,
+            state_space=env.state_space,
+            action_space=env.action_space,
+            observe_spec=dict(buffer_enabled=False)
+        )
+        state = env.reset()
+        reward, terminal = None, None
+        for _ in range(5):
+            action = agent.act_and_observe(state, rewards=reward, terminals=terminal, deterministic=True)
+            self.assertTrue(env.action_space.contains(action))
+            state, reward, terminal, _ = env.step(action)
+
+        plans = agent.graph_executor.execution_plans
+        sockets_executed = [sockets for sockets, _ in plans.keys()]
+        self.assertIn(("get_actions", "insert_records"), sockets_executed)
+        self.assertNotIn(("insert_records",), sockets_executed)
+
+        # The last transition has no next action: Inserted by itself.
+        agent.flush_observation(rewards=reward, terminals=terminal)
+        self.assertIsNone(agent.pending_transition)
+        self.assertIn(("insert_records",), [sockets for sockets, _ in plans.keys()])
+
     def test_dqn_functionality(self):
         """
         Creates a DQNAgent and runs it for a few steps in a GridWorld to vigorously test
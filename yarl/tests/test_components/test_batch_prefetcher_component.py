@@ -0,0 +1,52 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+
+from yarl.components import BatchPrefetcher
+from yarl.spaces import BoolBox, Dict
+from yarl.tests import ComponentTest
+from yarl.tests.test_util import recursive_assert_almost_equal
+
+
+class TestBatchPrefetcherComponent(unittest.TestCase):
+    """
+    Tests the batch prefetcher component.
+    """
+    def test_batch_prefetcher_component(self):
+        input_space = Dict(
+            states=dict(state1=float, state2=float),
+            reward=float,
+            terminals=BoolBox(),
+            add_batch_rank=True
+        )
+
+        prefetcher = BatchPrefetcher(capacity=2)
+        test = ComponentTest(component=prefetcher, input_spaces=dict(input=input_space))
+
+        batches = [input_space.sample(size=10), input_space.sample(size=10)]
+        for batch in batches:
+            test.test(out_socket_names="enqueue", inputs=batch, expected_outputs=None)
+        test.test(out_socket_names="queue_size", inputs=batches[0], expected_outputs=2)
+
+        # Batches come out in the order they were put in.
+        for batch in batches:
+            out = test.test(out_socket_names="output", inputs=batch, expected_outputs=None)
+            recursive_assert_almost_equal(out, batch, decimals=5)
+        test.test(out_socket_names="queue_size", inputs=batches[0], expected_outputs=0)
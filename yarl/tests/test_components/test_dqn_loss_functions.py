@@ -249,3 +249,41 @@ class TestDQNLossFunctions(unittest.TestCase):
         # Expect the mean over the batch.
         expected_loss = expected_loss_per_item.mean()
         test.test(out_socket_names="loss", inputs=input_, expected_outputs=expected_loss)
+
+    def test_n_step_dqn_loss_function_with_bootstrap_discounts(self):
+        # Create a shape=() 2-action discrete-space.
+        action_space = IntBox(2, shape=(), add_batch_rank=True)
+        q_values_space = FloatBox(shape=action_space.get_shape(with_category_rank=True), add_batch_rank=True)
+        dqn_loss_function = DQNLossFunction(discount=0.5, n_step=3)
+
+        test = ComponentTest(
+            component=dqn_loss_function,
+            input_spaces=dict(q_values=q_values_space,
+                              actions=action_space,
+                              rewards=FloatBox(add_batch_rank=True),
+                              terminals=BoolBox(add_batch_rank=True),
+                              qt_values_s_=q_values_space,
+                              discounts=FloatBox(add_batch_rank=True)
+                              ),
+            action_space=action_space
+        )
+
+        # Batch of size=2: The second transition was truncated to 2 steps.
+        input_ = dict(
+            q_values=np.array([[10.0, -10.0], [-0.101, -90.6]]),
+            actions=np.array([0, 1]),
+            rewards=np.array([9.4, -1.23]),
+            terminals=np.array([False, False]),
+            qt_values_s_=np.array([[12.0, -8.0], [22.3, 10.5]]),
+            discounts=np.array([0.125, 0.25])
+        )
+        """
+        Calculation:
+        batch of 2, gamma=0.5, bootstrap discounts = [gamma^3, gamma^2]
+        Qt(s'a') = [12 -8] [22.3 10.5] -> max(a') = [12] [22.3]
+        Q(s,a)  = [10.0] [-90.6]
+        L = ((9.4 + 0.125*12 - 10.0)^2 + (-1.23 + 0.25*22.3 - -90.6)^2) / 2
+        L = ((0.81) + (9014.553025)) / 2
+        """
+        expected_loss_per_item = np.array([0.81, 9014.553], dtype=np.float32)
+        test.test(out_socket_names="loss_per_item", inputs=input_, expected_outputs=expected_loss_per_item)
@@ -0,0 +1,56 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import unittest
+
+from yarl.components import Component, FlatWeights
+from yarl.spaces import FloatBox
+from yarl.tests import ComponentTest
+from yarl.tests.test_components.test_synchronizable import MyCompWithVars, VARIABLE_NAMES
+
+
+class TestFlatWeightsComponent(unittest.TestCase):
+
+    def test_get_and_set_flat_weights(self):
+        comp_with_vars = MyCompWithVars(initializer1=2.0, initializer2=3.0, scope="comp-with-vars")
+        flat_weights = FlatWeights()
+        component_to_test = Component(comp_with_vars, flat_weights, scope="container")
+        component_to_test.define_inputs("flat_weights_in", space=FloatBox(add_batch_rank=True))
+        component_to_test.define_outputs("flat_weights", "set_flat_weights")
+        component_to_test.connect((comp_with_vars, "_variables"), (flat_weights, "variables"))
+        component_to_test.connect("flat_weights_in", (flat_weights, "flat_weights_in"))
+        component_to_test.connect((flat_weights, "flat_weights"), "flat_weights")
+        component_to_test.connect((flat_weights, "set_flat_weights"), "set_flat_weights")
+        test = ComponentTest(component=component_to_test)
+
+        # Both variables (sorted by name) in one vector.
+        size = int(np.prod(comp_with_vars.space.shape))
+        expected = np.concatenate([np.full(size, 2.0), np.full(size, 3.0)]).astype(np.float32)
+        test.test(out_socket_names="flat_weights", inputs=None, expected_outputs=expected)
+
+        # Assign from a single vector and re-read.
+        new_weights = np.arange(2 * size, dtype=np.float32)
+        test.test(out_socket_names="set_flat_weights", inputs=dict(flat_weights_in=new_weights),
+                  expected_outputs=None)
+        test.variable_test(comp_with_vars.get_variables(VARIABLE_NAMES), {
+            "container/comp-with-vars/"+VARIABLE_NAMES[0]: new_weights[:size].reshape(comp_with_vars.space.shape),
+            "container/comp-with-vars/"+VARIABLE_NAMES[1]: new_weights[size:].reshape(comp_with_vars.space.shape)
+        })
+        test.test(out_socket_names="flat_weights", inputs=None, expected_outputs=new_weights)
@@ -0,0 +1,89 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+import numpy as np
+
+from yarl.components.memories import MemCompressedReplay
+
+
+class TestMemCompressedReplay(unittest.TestCase):
+    """
+    Tests insertion and (decompressed) retrieval of the compressed host-side replay memory.
+    """
+    capacity = 10
+
+    def test_insert_and_retrieve(self):
+        """
+        Tests if sampled states and next states are decompressed back to the inserted values, also after
+        wrapping around the capacity.
+        """
+        memory = MemCompressedReplay(capacity=self.capacity, next_states=True, num_threads=3)
+        num_records = 14
+        states = np.arange(num_records * 6, dtype=np.float32).reshape((num_records, 2, 3))
+        memory.insert_records(dict(states=states[:8], reward=np.arange(8.0),
+                                   terminals=np.zeros(shape=(8,), dtype=np.bool_)))
+        memory.insert_records(dict(states=states[8:], reward=np.arange(8.0, num_records),
+                                   terminals=np.zeros(shape=(6,), dtype=np.bool_)))
+        self.assertEqual(memory.size, self.capacity)
+        self.assertEqual(memory.index, 4)
+        # Only states are compressed.
+        self.assertEqual(list(memory.compressed_specs.keys()), ["/states"])
+
+        batch = memory.get_records(50)
+        self.assertEqual(batch["states"].shape, (50, 2, 3))
+        self.assertEqual(batch["states"].dtype, np.float32)
+        for state, reward, next_state in zip(batch["states"], batch["reward"], batch["next_states"]):
+            t = int(reward)
+            self.assertGreaterEqual(t, num_records - self.capacity)
+            # The newest record is never sampled (its next state is not known yet).
+            self.assertLess(t, num_records - 1)
+            self.assertTrue(np.array_equal(state, states[t]))
+            self.assertTrue(np.array_equal(next_state, states[t + 1]))
+
+    def test_retrieve_partially_filled(self):
+        """
+        Tests sampling from a memory that has not wrapped around yet (next states of unwritten slots must not
+        be read).
+        """
+        memory = MemCompressedReplay(capacity=100, next_states=True)
+        states = np.arange(10 * 4, dtype=np.float32).reshape((10, 4))
+        memory.insert_records(dict(states=states[:1], reward=np.arange(1.0),
+                                   terminals=np.zeros(shape=(1,), dtype=np.bool_)))
+        self.assertRaises(AssertionError, memory.get_records, 8)
+
+        memory.insert_records(dict(states=states[1:], reward=np.arange(1.0, 10.0),
+                                   terminals=np.zeros(shape=(9,), dtype=np.bool_)))
+        for _ in range(20):
+            batch = memory.get_records(8)
+            for state, reward, next_state in zip(batch["states"], batch["reward"], batch["next_states"]):
+                t = int(reward)
+                self.assertLess(t, 9)
+                self.assertTrue(np.array_equal(state, states[t]))
+                self.assertTrue(np.array_equal(next_state, states[t + 1]))
+
+    def test_compression_ratio(self):
+        """
+        Tests if mostly constant image frames take up less space.
+        """
+        memory = MemCompressedReplay(capacity=100, next_states=False)
+        frames = np.zeros(shape=(50, 84, 84), dtype=np.uint8)
+        frames[:, 10:20, 10:20] = 255
+        memory.insert_records(dict(states=frames, terminals=np.zeros(shape=(50,), dtype=np.bool_)))
+        self.assertGreater(memory.compression_ratio, 10.0)
@@ -0,0 +1,99 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+import numpy as np
+
+from yarl.components.memories import MemPrioritizedReplay
+from yarl.components.memories.mem_segment_tree import MemSegmentTree
+from yarl.spaces import Dict, BoolBox
+from yarl.tests.test_util import non_terminal_records
+
+
+class TestMemPrioritizedReplay(unittest.TestCase):
+    """
+    Tests sampling and insertion behaviour of the host-side (NumPy) prioritized replay.
+    """
+    record_space = Dict(
+        states=dict(state1=float, state2=float),
+        actions=dict(action1=float),
+        reward=float,
+        terminals=BoolBox(),
+        add_batch_rank=True
+    )
+
+    capacity = 10
+    alpha = 1.0
+    beta = 1.0
+
+    def test_segment_tree_insert_batch(self):
+        """
+        Tests batch inserts into sum and min trees, including duplicate indices (last write wins).
+        """
+        sum_tree = MemSegmentTree(capacity=8, operator=np.add)
+        min_tree = MemSegmentTree(capacity=8, operator=np.minimum)
+        sum_tree.insert_batch(np.asarray([0, 1, 2, 2]), np.asarray([1.0, 5.0, 3.0, 2.0]))
+        min_tree.insert_batch(np.asarray([0, 1, 2, 2]), np.asarray([1.0, 5.0, 3.0, 2.0]))
+
+        self.assertEqual(sum_tree.get(2), 2.0)
+        self.assertEqual(sum_tree.reduce(), 8.0)
+        self.assertEqual(min_tree.reduce(), 1.0)
+
+        # Prefix sums: [0, 1) -> 0, [1, 6) -> 1, [6, 8) -> 2.
+        indices = sum_tree.index_of_prefixsum_batch(np.asarray([0.0, 0.99, 1.0, 5.99, 6.0, 7.99]))
+        self.assertListEqual(list(indices), [0, 0, 1, 1, 2, 2])
+
+    def test_capacity(self):
+        """
+        Tests if insert correctly manages capacity.
+        """
+        memory = MemPrioritizedReplay(capacity=self.capacity, next_states=True, alpha=self.alpha, beta=self.beta)
+        memory.insert_records(self.record_space.sample(size=self.capacity + 1))
+
+        self.assertEqual(memory.size, self.capacity)
+        self.assertEqual(memory.index, 1)
+        self.assertEqual(memory.sum_segment_tree.reduce(), self.capacity)
+
+    def test_batch_retrieve(self):
+        """
+        Tests if retrieval returns records, indices and weights.
+        """
+        memory = MemPrioritizedReplay(capacity=self.capacity, next_states=True, alpha=self.alpha, beta=self.beta)
+        memory.insert_records(non_terminal_records(self.record_space, 2))
+
+        records, indices, weights = memory.get_records(5)
+        self.assertEqual(5, len(records["terminals"]))
+        self.assertTrue("next_states" in records)
+        self.assertTrue(np.all(indices < 2))
+        self.assertEqual(5, len(weights))
+
+    def test_update_records(self):
+        """
+        Tests if updated priorities change sampling probabilities and the max priority.
+        """
+        memory = MemPrioritizedReplay(capacity=self.capacity, next_states=False, alpha=self.alpha, beta=self.beta)
+        memory.insert_records(non_terminal_records(self.record_space, 5))
+
+        memory.update_records(np.asarray([0, 1, 2, 3, 4]), np.asarray([0.0, 0.0, 0.0, 0.0, 2.0]))
+        self.assertEqual(memory.max_priority, 2.0)
+
+        # Only index 4 has non-zero priority.
+        records, indices, weights = memory.get_records(20)
+        self.assertTrue("next_states" not in records)
+        self.assertTrue(np.all(indices == 4))
@@ -0,0 +1,156 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from yarl.components.memories import MemmapReplayMemory
+from yarl.spaces import Dict, BoolBox, FloatBox
+from yarl.tests import ComponentTest
+from yarl.tests.test_util import non_terminal_records
+
+
+class TestMemmapReplayMemory(unittest.TestCase):
+    """
+    Tests sampling, insertion and reopening behaviour of the memmap_replay_memory module.
+    """
+    record_space = Dict(
+        states=dict(state1=float, state2=float),
+        actions=dict(action1=float),
+        reward=float,
+        terminals=BoolBox(),
+        add_batch_rank=True
+    )
+    capacity = 10
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_capacity(self):
+        """
+        Tests if insert correctly manages capacity.
+        """
+        memory = MemmapReplayMemory(capacity=self.capacity, next_states=True, directory=self.directory)
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=self.record_space,
+            num_records=int
+        ))
+
+        observation = self.record_space.sample(size=self.capacity + 1)
+        test.test(out_socket_names="insert_records", inputs=observation, expected_outputs=None)
+
+        self.assertEqual(memory.size, self.capacity)
+        self.assertEqual(memory.index, 1)
+
+    def test_batch_retrieve(self):
+        """
+        Tests if retrieval returns records and next states.
+        """
+        memory = MemmapReplayMemory(capacity=self.capacity, next_states=True, directory=self.directory)
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=self.record_space,
+            num_records=int
+        ))
+
+        observation = non_terminal_records(self.record_space, 2)
+        test.test(out_socket_names="insert_records", inputs=observation, expected_outputs=None)
+
+        batch = test.test(out_socket_names="get_records", inputs=5, expected_outputs=None)
+        self.assertEqual(5, len(batch['terminals']))
+        self.assertTrue('next_states' in batch)
+        for reward in batch['reward']:
+            self.assertTrue(reward in observation['reward'])
+
+    def test_reopen(self):
+        """
+        Tests if a new memory on the same directory continues with the stored records.
+        """
+        memory = MemmapReplayMemory(capacity=self.capacity, next_states=False, directory=self.directory)
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=self.record_space,
+            num_records=int
+        ))
+        observation = non_terminal_records(self.record_space, 3)
+        test.test(out_socket_names="insert_records", inputs=observation, expected_outputs=None)
+        memory.flush()
+
+        memory = MemmapReplayMemory(capacity=self.capacity, next_states=False, directory=self.directory)
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=self.record_space,
+            num_records=int
+        ))
+        self.assertEqual(memory.size, 3)
+        self.assertEqual(memory.index, 3)
+        self.assertTrue(np.allclose(memory.record_registry["/reward"][:3], observation["reward"]))
+
+    def test_reopen_with_changed_record_space(self):
+        """
+        Tests if the stored index and size are discarded when a record file has to be recreated.
+        """
+        memory = MemmapReplayMemory(capacity=self.capacity, next_states=False, directory=self.directory)
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=self.record_space,
+            num_records=int
+        ))
+        observation = non_terminal_records(self.record_space, 3)
+        test.test(out_socket_names="insert_records", inputs=observation, expected_outputs=None)
+        memory.flush()
+
+        record_space = Dict(
+            states=dict(state1=float, state2=FloatBox(shape=(2,))),
+            actions=dict(action1=float),
+            reward=float,
+            terminals=BoolBox(),
+            add_batch_rank=True
+        )
+        memory = MemmapReplayMemory(capacity=self.capacity, next_states=False, directory=self.directory)
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=record_space,
+            num_records=int
+        ))
+        self.assertEqual(memory.size, 0)
+        self.assertEqual(memory.index, 0)
+
+    def test_storage_dtypes(self):
+        """
+        Tests if records with a storage dtype are stored on disk in that dtype and read back as the Space's dtype.
+        """
+        memory = MemmapReplayMemory(
+            capacity=self.capacity,
+            next_states=True,
+            directory=self.directory,
+            storage_dtypes=dict(states="uint8"),
+            storage_scales=dict(states=255.0)
+        )
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=self.record_space,
+            num_records=int
+        ))
+        observation = non_terminal_records(self.record_space, 5)
+        test.test(out_socket_names="insert_records", inputs=observation, expected_outputs=None)
+
+        self.assertEqual(memory.record_registry["/states/state1"].dtype, np.uint8)
+        batch = test.test(out_socket_names="get_records", inputs=5, expected_outputs=None)
+        self.assertEqual(batch["states"]["state1"].dtype, np.float32)
+        self.assertEqual(batch["next_states"]["state1"].dtype, np.float32)
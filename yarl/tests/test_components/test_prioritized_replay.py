@@ -23,7 +23,7 @@ import numpy as np
 from yarl.components.memories import PrioritizedReplay
 from yarl.spaces import Dict, IntBox, BoolBox, FloatBox
 from yarl.tests import ComponentTest
-from yarl.tests.test_util import non_terminal_records
+from yarl.tests.test_util import non_terminal_records, recursive_assert_almost_equal
 
 
 class TestPrioritizedReplay(unittest.TestCase):
@@ -210,6 +210,60 @@ class TestPrioritizedReplay(unittest.TestCase):
         # Does not return anything
         test.test(out_socket_names=["update_records"], inputs=input_params, expected_outputs=None)
 
+    def test_update_records_batched(self):
+        """
+        Tests if a batched priority update sets all (deduplicated) leaves and keeps a running max priority.
+        """
+        memory = PrioritizedReplay(
+            capacity=self.capacity,
+            next_states=True,
+            alpha=self.alpha,
+            beta=self.beta
+        )
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=self.record_space,
+            num_records=int,
+            indices=IntBox(shape=(), add_batch_rank=True),
+            update=FloatBox(shape=(), add_batch_rank=True)
+        ))
+        priority_capacity = 1
+        while priority_capacity < self.capacity:
+            priority_capacity *= 2
+
+        memory_variables = memory.get_variables(["sum-segment-tree", "min-segment-tree", "max-priority"],
+                                                global_scope=False)
+        sum_segment_tree = memory_variables['sum-segment-tree']
+        min_segment_tree = memory_variables['min-segment-tree']
+        max_priority = memory_variables['max-priority']
+
+        observation = non_terminal_records(self.record_space, 4)
+        test.test(out_socket_names="insert_records", inputs=observation, expected_outputs=None)
+
+        # Index 1 occurs twice (last one wins), the last element in the batch must not be skipped.
+        input_params = dict(
+            indices=np.asarray([0, 1, 2, 1, 3]),
+            update=np.asarray([0.5, 3.0, 0.25, 0.75, 2.0])
+        )
+        test.test(out_socket_names="update_records", inputs=input_params, expected_outputs=None)
+        sum_segment_values, min_segment_values, max_priority_value = test.get_variable_values(
+            sum_segment_tree, min_segment_tree, max_priority
+        )
+
+        expected_leaves = [0.5, 0.75, 0.25, 2.0]
+        for i, expected in enumerate(expected_leaves):
+            self.assertAlmostEqual(sum_segment_values[priority_capacity + i], expected)
+            self.assertAlmostEqual(min_segment_values[priority_capacity + i], expected)
+        self.assertAlmostEqual(sum_segment_values[1], sum(expected_leaves))
+        self.assertAlmostEqual(min_segment_values[1], 0.25)
+        # Running max over all updates (including the overwritten 3.0).
+        self.assertAlmostEqual(max_priority_value, 3.0)
+
+        # A batch with lower priorities does not decrease the max priority.
+        input_params = dict(indices=np.asarray([0]), update=np.asarray([0.1]))
+        test.test(out_socket_names="update_records", inputs=input_params, expected_outputs=None)
+        max_priority_value = test.get_variable_values(max_priority)
+        self.assertAlmostEqual(max_priority_value, 3.0)
+
     def test_segment_tree_insert_values(self):
         """
         Tests if segment tree inserts into correct positions.
@@ -276,4 +330,83 @@ class TestPrioritizedReplay(unittest.TestCase):
             self.assertEqual(sum_segment_values[start], 2.0)
             # min is still 1.
             self.assertEqual(min_segment_values[start], 1.0)
-            start = int(start / 2)
\ No newline at end of file
+            start = int(start / 2)
+
+    def test_segment_tree_insert_batch(self):
+        """
+        Tests if a batch insert updates all leaves and their ancestors at once.
+        """
+        memory = PrioritizedReplay(
+            capacity=self.capacity,
+            next_states=True,
+            alpha=self.alpha,
+            beta=self.beta
+        )
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=self.record_space,
+            num_records=int,
+            indices=IntBox(shape=(), add_batch_rank=True),
+            update=FloatBox(shape=(), add_batch_rank=True)
+        ))
+        priority_capacity = 1
+        while priority_capacity < self.capacity:
+            priority_capacity *= 2
+
+        memory_variables = memory.get_variables(["sum-segment-tree", "min-segment-tree"], global_scope=False)
+        sum_segment_tree = memory_variables['sum-segment-tree']
+        min_segment_tree = memory_variables['min-segment-tree']
+
+        # Insert 3 Elements in one batch.
+        observation = non_terminal_records(self.record_space, 3)
+        test.test(out_socket_names="insert_records", inputs=observation, expected_outputs=None)
+        sum_segment_values, min_segment_values = test.get_variable_values(sum_segment_tree, min_segment_tree)
+
+        # All leaves set to max-priority.
+        for i in range(3):
+            self.assertEqual(sum_segment_values[priority_capacity + i], 1.0)
+            self.assertEqual(min_segment_values[priority_capacity + i], 1.0)
+        self.assertEqual(sum_segment_values[priority_capacity + 3], 0.0)
+
+        # Every inner node is the sum/min of its children.
+        for node in range(1, priority_capacity):
+            self.assertEqual(sum_segment_values[node],
+                             sum_segment_values[2 * node] + sum_segment_values[2 * node + 1])
+            self.assertEqual(min_segment_values[node],
+                             min(min_segment_values[2 * node], min_segment_values[2 * node + 1]))
+        self.assertEqual(sum_segment_values[1], 3.0)
+        self.assertEqual(min_segment_values[1], 1.0)
+
+    def test_batch_retrieve_indices_and_weights(self):
+        """
+        Tests if batched prefix-sum sampling only returns stored indices and one weight per sample.
+        """
+        memory = PrioritizedReplay(
+            capacity=self.capacity,
+            next_states=True,
+            alpha=self.alpha,
+            beta=self.beta
+        )
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=self.record_space,
+            num_records=int,
+            indices=IntBox(shape=(), add_batch_rank=True),
+            update=FloatBox(shape=(), add_batch_rank=True)
+        ))
+
+        # Insert 3 Elements.
+        observation = non_terminal_records(self.record_space, 3)
+        test.test(out_socket_names="insert_records", inputs=observation, expected_outputs=None)
+
+        num_records = 100
+        indices, weights = test.test(
+            out_socket_names=["record_indices", "weights"],
+            inputs=dict(num_records=num_records),
+            expected_outputs=None
+        )
+        self.assertEqual(num_records, len(indices))
+        self.assertEqual(num_records, len(weights))
+        # Only indices that hold records can be sampled.
+        self.assertTrue(np.all(indices >= 0))
+        self.assertTrue(np.all(indices < 3))
+        # All priorities are equal -> all weights are equal.
+        recursive_assert_almost_equal(weights, np.full(shape=(num_records,), fill_value=weights[0]), decimals=5)
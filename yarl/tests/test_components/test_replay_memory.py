@@ -17,10 +17,15 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import os
+import shutil
+import tempfile
+import threading
 import unittest
+import numpy as np
 
 from yarl.components.memories.replay_memory import ReplayMemory
-from yarl.spaces import Dict, BoolBox
+from yarl.spaces import Dict, BoolBox, FloatBox
 from yarl.tests import ComponentTest
 from yarl.tests.test_util import non_terminal_records, terminal_records
 
@@ -182,3 +187,365 @@ class TestReplayMemory(unittest.TestCase):
         batch = test.test(out_socket_names="get_records", inputs=num_records, expected_outputs=None)
         self.assertTrue('next_states' not in batch)
 
+    def test_frame_stack(self):
+        """
+        Tests that stacked states are stored as single frames and rebuilt correctly on retrieval,
+        without stacking frames across episode boundaries.
+        """
+        frame_stack = 3
+        record_space = Dict(
+            states=FloatBox(shape=(2, frame_stack)),
+            reward=float,
+            terminals=BoolBox(),
+            add_batch_rank=True
+        )
+        memory = ReplayMemory(
+            capacity=self.capacity,
+            next_states=True,
+            frame_stack=frame_stack
+        )
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=record_space,
+            num_records=int
+        ))
+
+        # Two episodes: Frames 0-3 (terminal at 3) and frames 4-6. Each frame is filled with its time step.
+        terminals = np.asarray([False, False, False, True, False, False, False])
+        episode_starts = [0, 0, 0, 0, 4, 4, 4]
+        num_frames = len(terminals)
+
+        def stacked_state(t):
+            # Pad with the episode's first frame (like the Sequence preprocessor does after a reset).
+            frames = [max(t - i, episode_starts[t]) for i in reversed(range(frame_stack))]
+            return np.tile(np.asarray(frames, dtype=np.float32), (2, 1))
+
+        records = dict(
+            states=np.stack([stacked_state(t) for t in range(num_frames)]),
+            reward=np.zeros(shape=(num_frames,)),
+            terminals=terminals
+        )
+        test.test(out_socket_names="insert_records", inputs=records, expected_outputs=None)
+
+        # State variable only stores one frame per record.
+        self.assertEqual(memory.record_registry["/states"].get_shape().as_list(), [self.capacity, 2, 1])
+
+        batch = test.test(out_socket_names="get_records", inputs=100, expected_outputs=None)
+        for state, next_state in zip(batch["states"], batch["next_states"]):
+            # The newest frame identifies the time step.
+            t = int(state[0, -1])
+            self.assertTrue(np.array_equal(state, stacked_state(t)))
+            # No valid next state for the newest record.
+            if t < num_frames - 1:
+                self.assertTrue(np.array_equal(next_state, stacked_state(t + 1)))
+
+    def test_storage_dtype(self):
+        """
+        Tests storing float states as scaled uint8 and converting them back on retrieval.
+        """
+        record_space = Dict(
+            states=FloatBox(shape=(4,)),
+            reward=float,
+            terminals=BoolBox(),
+            add_batch_rank=True
+        )
+        memory = ReplayMemory(
+            capacity=self.capacity,
+            next_states=True,
+            storage_dtypes=dict(states="uint8"),
+            storage_scales=dict(states=255.0)
+        )
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=record_space,
+            num_records=int
+        ))
+        self.assertEqual(memory.record_registry["/states"].dtype.base_dtype.name, "uint8")
+
+        records = non_terminal_records(record_space, self.capacity)
+        records["states"] = np.random.uniform(size=(self.capacity, 4)).astype(np.float32)
+        test.test(out_socket_names="insert_records", inputs=records, expected_outputs=None)
+
+        batch = test.test(out_socket_names="get_records", inputs=self.capacity, expected_outputs=None)
+        self.assertEqual(batch["states"].dtype, np.float32)
+        # Each retrieved state must match one inserted state up to quantization error.
+        for state in batch["states"]:
+            errors = np.max(np.abs(records["states"] - state), axis=-1)
+            self.assertLessEqual(np.min(errors), 0.5 / 255.0 + 1e-6)
+
+    def test_storage_dtype_key_matching(self):
+        """
+        Tests that storage dtype keys only match their own flat key and the keys nested below it.
+        """
+        record_space = Dict(
+            states=dict(image=FloatBox(shape=(4,)), pos=float),
+            states_mask=FloatBox(shape=(4,)),
+            reward=float,
+            terminals=BoolBox(),
+            add_batch_rank=True
+        )
+        memory = ReplayMemory(
+            capacity=self.capacity,
+            storage_dtypes={"states/image": "uint8", "reward.*": "float16"}
+        )
+        ComponentTest(component=memory, input_spaces=dict(
+            records=record_space,
+            num_records=int
+        ))
+        self.assertEqual(memory.record_registry["/states/image"].dtype.base_dtype.name, "uint8")
+        self.assertEqual(memory.record_registry["/states/pos"].dtype.base_dtype.name, "float32")
+        self.assertEqual(memory.record_registry["/states_mask"].dtype.base_dtype.name, "float32")
+        # Keys are not patterns.
+        self.assertEqual(memory.record_registry["/reward"].dtype.base_dtype.name, "float32")
+
+    def test_n_step(self):
+        """
+        Tests n-step rewards, terminals and next states, including truncation at terminals.
+        """
+        n_step = 3
+        discount = 0.5
+        record_space = Dict(
+            states=float,
+            reward=float,
+            terminals=BoolBox(),
+            add_batch_rank=True
+        )
+        memory = ReplayMemory(
+            capacity=self.capacity,
+            next_states=True,
+            n_step=n_step,
+            discount=discount
+        )
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=record_space,
+            num_records=int
+        ))
+
+        # Episode ends at t=3.
+        rewards = np.asarray([1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0])
+        terminals = np.asarray([False, False, False, True, False, False, False, False])
+        num_records = len(rewards)
+        records = dict(states=np.arange(num_records, dtype=np.float32), reward=rewards, terminals=terminals)
+        test.test(out_socket_names="insert_records", inputs=records, expected_outputs=None)
+
+        batch = test.test(out_socket_names="get_records", inputs=100, expected_outputs=None)
+        for state, reward, terminal, next_state, bootstrap_discount in zip(
+                batch["states"], batch["reward"], batch["terminals"], batch["next_states"], batch["discounts"]):
+            t = int(state)
+            # Only records followed by n-1 records are sampled.
+            self.assertLessEqual(t, num_records - n_step)
+            expected_reward = 0.0
+            last = t
+            for i in range(n_step):
+                # Transitions end before the newest record (its next state is not stored yet).
+                if i > 0 and t + i >= num_records - 1:
+                    break
+                expected_reward += discount ** i * rewards[t + i]
+                last = t + i
+                if terminals[t + i]:
+                    break
+            self.assertAlmostEqual(reward, expected_reward, places=5)
+            self.assertEqual(terminal, np.any(terminals[t:last + 1]))
+            self.assertEqual(int(next_state), last + 1)
+            # Truncated transitions bootstrap with gamma^k (k = their number of steps).
+            self.assertAlmostEqual(bootstrap_discount, discount ** (last - t + 1), places=5)
+
+    def test_stratified_sampling(self):
+        """
+        Tests if stratified sampling draws each stored record exactly once when asking for all of them.
+        """
+        record_space = Dict(
+            states=float,
+            reward=float,
+            terminals=BoolBox(),
+            add_batch_rank=True
+        )
+        memory = ReplayMemory(capacity=self.capacity, next_states=False, sampling="stratified")
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=record_space,
+            num_records=int
+        ))
+
+        num_records = 8
+        records = dict(states=np.arange(num_records, dtype=np.float32), reward=np.zeros(shape=(num_records,)),
+                       terminals=np.zeros(shape=(num_records,), dtype=np.bool_))
+        test.test(out_socket_names="insert_records", inputs=records, expected_outputs=None)
+
+        batch = test.test(out_socket_names="get_records", inputs=num_records, expected_outputs=None)
+        self.assertEqual(sorted(batch["states"].astype(np.int32).tolist()), list(range(num_records)))
+
+        # Fewer records: No duplicates.
+        batch = test.test(out_socket_names="get_records", inputs=3, expected_outputs=None)
+        self.assertEqual(len(set(batch["states"].tolist())), 3)
+
+    def test_sequence_sampling(self):
+        """
+        Tests if sequence sampling returns runs of consecutive records (also across the buffer's end).
+        """
+        sequence_length = 4
+        record_space = Dict(
+            states=float,
+            reward=float,
+            terminals=BoolBox(),
+            add_batch_rank=True
+        )
+        memory = ReplayMemory(
+            capacity=self.capacity, next_states=True, sampling="sequence", sequence_length=sequence_length
+        )
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=record_space,
+            num_records=int
+        ))
+
+        # Wrap around the buffer end.
+        num_records = 14
+        records = dict(states=np.arange(num_records, dtype=np.float32), reward=np.zeros(shape=(num_records,)),
+                       terminals=np.zeros(shape=(num_records,), dtype=np.bool_))
+        test.test(out_socket_names="insert_records", inputs=records, expected_outputs=None)
+
+        num_sequences = 20
+        batch = test.test(out_socket_names="get_records", inputs=num_sequences, expected_outputs=None)
+        states = batch["states"].reshape((num_sequences, sequence_length))
+        next_states = batch["next_states"].reshape((num_sequences, sequence_length))
+        for sequence, next_sequence in zip(states, next_states):
+            # Only stored records (4 to 13).
+            self.assertGreaterEqual(sequence[0], num_records - self.capacity)
+            self.assertLessEqual(sequence[-1], num_records - 1)
+            self.assertListEqual(list(np.diff(sequence)), [1.0] * (sequence_length - 1))
+            self.assertListEqual(list(next_sequence[:-1]), list(sequence[1:]))
+
+    def test_snapshot_and_restore(self):
+        """
+        Tests if a memory snapshot restores records, index and size (and that memories are not checkpointed).
+        """
+        memory = ReplayMemory(
+            capacity=self.capacity,
+            next_states=False
+        )
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=self.record_space,
+            num_records=int
+        ))
+        memory_variables = memory.get_variables(self.memory_variables, global_scope=False)
+        buffer_size = memory_variables['size']
+        buffer_index = memory_variables['index']
+        rewards = memory.record_registry["/reward"]
+
+        # Model checkpoints leave out memory variables.
+        for variable in memory.variables.values():
+            self.assertTrue(variable not in test.graph_executor.saver._var_list)
+
+        observation = non_terminal_records(self.record_space, 3)
+        test.test(out_socket_names="insert_records", inputs=observation, expected_outputs=None)
+        stored_rewards = test.get_variable_values(rewards)
+
+        path = tempfile.mkdtemp()
+        try:
+            test.graph_executor.store_memories(path, blocking=True, chunk_size=4)
+
+            # Change the memory, then restore the snapshot.
+            observation = non_terminal_records(self.record_space, 5)
+            test.test(out_socket_names="insert_records", inputs=observation, expected_outputs=None)
+            test.graph_executor.load_memories(path)
+        finally:
+            shutil.rmtree(path)
+
+        size_value, index_value, rewards_value = test.get_variable_values(buffer_size, buffer_index, rewards)
+        self.assertEqual(size_value, 3)
+        self.assertEqual(index_value, 3)
+        self.assertTrue(np.allclose(rewards_value, stored_rewards))
+
+    def test_snapshot_during_inserts(self):
+        """
+        Tests if a snapshot written while another thread keeps inserting has index and size matching its records.
+        """
+        memory = ReplayMemory(
+            capacity=self.capacity,
+            next_states=False
+        )
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=self.record_space,
+            num_records=int
+        ))
+        memory_variables = memory.get_variables(self.memory_variables, global_scope=False)
+        buffer_size = memory_variables['size']
+        buffer_index = memory_variables['index']
+        rewards = memory.record_registry["/reward"]
+
+        # One record at a time with reward i + 1 (never wraps around, so exactly the first `size` rows are set).
+        def insert():
+            for i in range(self.capacity):
+                observation = non_terminal_records(self.record_space, 1)
+                observation["reward"] = np.asarray([i + 1.0])
+                test.graph_executor.execute(sockets="insert_records", inputs=observation)
+
+        directory = tempfile.mkdtemp()
+        try:
+            insert_thread = threading.Thread(target=insert)
+            insert_thread.start()
+            paths = list()
+            while insert_thread.is_alive() or len(paths) == 0:
+                paths.append(os.path.join(directory, "snapshot-{}".format(len(paths))))
+                test.graph_executor.store_memories(paths[-1], blocking=True, chunk_size=1)
+            insert_thread.join()
+
+            snapshots = list()
+            for path in paths:
+                test.graph_executor.load_memories(path)
+                snapshots.append(test.get_variable_values(buffer_size, buffer_index, rewards))
+        finally:
+            shutil.rmtree(directory)
+
+        for size_value, index_value, rewards_value in snapshots:
+            self.assertEqual(index_value, size_value % self.capacity)
+            self.assertListEqual(list(rewards_value[:size_value]), [i + 1.0 for i in range(size_value)])
+            self.assertListEqual(list(rewards_value[size_value:]), [0.0] * (self.capacity - size_value))
+
+    def test_snapshot_during_wrapping_inserts(self):
+        """
+        Tests if a snapshot written while another thread keeps inserting (and wrapping around the end of the
+        memory) holds the records as of its index: The newest record right before the index, older ones before it.
+        """
+        # Large enough that far fewer than `capacity` records get inserted between two chunk reads.
+        capacity = 100
+        memory = ReplayMemory(
+            capacity=capacity,
+            next_states=False
+        )
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=self.record_space,
+            num_records=int
+        ))
+        memory_variables = memory.get_variables(self.memory_variables, global_scope=False)
+        buffer_size = memory_variables['size']
+        buffer_index = memory_variables['index']
+        rewards = memory.record_registry["/reward"]
+
+        # One record at a time with reward i + 1.
+        def insert():
+            for i in range(3 * capacity):
+                observation = non_terminal_records(self.record_space, 1)
+                observation["reward"] = np.asarray([i + 1.0])
+                test.graph_executor.execute(sockets="insert_records", inputs=observation)
+
+        directory = tempfile.mkdtemp()
+        try:
+            insert_thread = threading.Thread(target=insert)
+            insert_thread.start()
+            paths = list()
+            while insert_thread.is_alive() or len(paths) == 0:
+                paths.append(os.path.join(directory, "snapshot-{}".format(len(paths))))
+                test.graph_executor.store_memories(paths[-1], blocking=True, chunk_size=10)
+            insert_thread.join()
+
+            snapshots = list()
+            for path in paths:
+                test.graph_executor.load_memories(path)
+                snapshots.append(test.get_variable_values(buffer_size, buffer_index, rewards))
+        finally:
+            shutil.rmtree(directory)
+
+        for size_value, index_value, rewards_value in snapshots:
+            if size_value == 0:
+                continue
+            newest = rewards_value[(index_value - 1) % capacity]
+            stored = [rewards_value[(index_value - 1 - k) % capacity] for k in range(size_value)]
+            self.assertListEqual(list(stored), [newest - k for k in range(size_value)])
@@ -45,7 +45,7 @@ class TestRingBufferMemory(unittest.TestCase):
     memory_variables = ["size", "index"]
 
     # Ring buffer variables
-    ring_buffer_variables = ["size", "index", "num-episodes", "episode-indices"]
+    ring_buffer_variables = ["size", "index", "num-episodes", "episode-start", "episode-indices"]
     capacity = 10
 
     def test_insert_no_episodes(self):
@@ -252,6 +252,43 @@ class TestRingBufferMemory(unittest.TestCase):
         self.assertEqual(episodes['terminals'][0], True)
         self.assertEqual(episodes['terminals'][2], True)
 
+    def test_episode_indices_when_wrapping(self):
+        """
+        Tests if the circular episode index drops overwritten episodes and keeps the stored ones in order.
+        """
+        ring_buffer = RingBuffer(capacity=self.capacity, episode_semantics=True)
+        test = ComponentTest(component=ring_buffer, input_spaces=dict(
+            records=self.record_space,
+            num_records=int,
+            num_episodes=int
+        ))
+        ring_buffer_variables = ring_buffer.get_variables(self.ring_buffer_variables, global_scope=False)
+        num_episodes = ring_buffer_variables["num-episodes"]
+        episode_start = ring_buffer_variables["episode-start"]
+        episode_indices = ring_buffer_variables["episode-indices"]
+
+        # Insert 7 episodes of length 2 (14 records) -> the 2 oldest episodes get overwritten.
+        for _ in xrange(7):
+            observation = non_terminal_records(self.record_space, 1)
+            test.test(out_socket_names="insert_records", inputs=observation, expected_outputs=None)
+            observation = terminal_records(self.record_space, 1)
+            test.test(out_socket_names="insert_records", inputs=observation, expected_outputs=None)
+
+        num_episodes_value, episode_start_value, episode_index_values = test.get_variable_values(
+            num_episodes, episode_start, episode_indices
+        )
+        self.assertEqual(num_episodes_value, 5)
+        self.assertEqual(episode_start_value, 2)
+        # Terminals of the stored episodes (oldest first) are at buffer indices 5, 7, 9, 1, 3.
+        stored_episode_indices = [episode_index_values[(episode_start_value + i) % self.capacity]
+                                  for i in xrange(num_episodes_value)]
+        self.assertEqual(stored_episode_indices, [5, 7, 9, 1, 3])
+
+        # Fetching the 2 most recent episodes reads from after terminal 9 up to terminal 3 (across the wrap).
+        episodes = test.test(out_socket_names="get_episodes", inputs=2, expected_outputs=None)
+        self.assertEqual(len(episodes['terminals']), 3)
+        self.assertEqual(episodes['terminals'][1], True)
+
     def test_latest_batch(self):
         """
         Tests if we can fetch latest steps.
@@ -0,0 +1,74 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import unittest
+
+from yarl.spaces import IntBox, FloatBox
+from yarl.envs import RandomEnv, SubprocVectorEnv
+from yarl.tests.test_util import recursive_assert_almost_equal
+
+
+class TestSubprocVectorEnv(unittest.TestCase):
+    """
+    Tests batched and async stepping of environments running in worker processes.
+    """
+    env_spec = dict(
+        type="random-env", state_space=FloatBox(shape=(2,)), action_space=IntBox(2), deterministic=True
+    )
+
+    def test_batched_reset_and_step(self):
+        vector_env = SubprocVectorEnv(env_spec=self.env_spec, num_environments=3)
+        # Each worker's env is seeded identically -> same trajectory as a local env.
+        local_env = RandomEnv(state_space=FloatBox(shape=(2,)), action_space=IntBox(2), deterministic=True)
+
+        states = vector_env.reset()
+        self.assertEqual(states.shape, (3, 2))
+        expected = local_env.reset()
+        for i in range(3):
+            recursive_assert_almost_equal(states[i], expected)
+
+        for _ in range(5):
+            states, rewards, terminals, infos = vector_env.step(actions=np.array([0, 1, 1]))
+            expected_state, expected_reward, expected_terminal, _ = local_env.step(actions=0)
+            self.assertEqual(states.shape, (3, 2))
+            self.assertEqual(len(infos), 3)
+            for i in range(3):
+                recursive_assert_almost_equal(states[i], expected_state)
+                recursive_assert_almost_equal(rewards[i], expected_reward)
+                self.assertEqual(terminals[i], expected_terminal)
+
+        vector_env.terminate()
+
+    def test_async_step_on_subset(self):
+        vector_env = SubprocVectorEnv(env_spec=self.env_spec, num_environments=2)
+        vector_env.reset()
+
+        # Only step env 1: Env 0's observation must stay untouched.
+        vector_env.step_async(actions=[1], indices=[1])
+        states, rewards, terminals, _ = vector_env.step_wait()
+        self.assertEqual(states.shape, (1, 2))
+        states, _, _, _ = vector_env.step(actions=[0, 0])
+        self.assertFalse(np.allclose(states[0], states[1]))
+
+        # Resetting a single env returns a batch of one.
+        state = vector_env.reset(indices=[0])
+        self.assertEqual(state.shape, (1, 2))
+
+        vector_env.terminate()
@@ -18,6 +18,7 @@ from __future__ import division
 from __future__ import print_function
 
 import unittest
+from yarl import YARLError
 from yarl.execution.ray import ApexExecutor
 
 
@@ -67,3 +68,28 @@ class TestRayExecutor(unittest.TestCase):
         result = executor.execute_workload(workload=dict(num_timesteps=10000))
         print("Finished executing workload:")
         print(result)
+        executor.terminate()
+
+    def test_shared_memory_replay_workload(self):
+        """
+        Tests a workload with the shared memory replay backend and that terminating frees the replay.
+        """
+        executor = ApexExecutor(
+            environment_spec=self.env_spec,
+            agent_config=self.agent_config,
+            cluster_spec=dict(self.cluster_spec, replay_backend="shared_memory", replay_capacity=1000)
+        )
+        result = executor.execute_workload(workload=dict(num_timesteps=1000))
+        self.assertGreaterEqual(result["timesteps_executed"], 1000)
+
+        executor.terminate()
+        self.assertIsNone(executor.shared_replay)
+
+    def test_shared_memory_replay_requires_capacity(self):
+        """
+        Tests that the shared memory replay backend names the missing 'replay_capacity' key.
+        """
+        cluster_spec = dict(self.cluster_spec, replay_backend="shared_memory")
+        with self.assertRaises(YARLError) as context:
+            ApexExecutor(environment_spec=self.env_spec, agent_config=self.agent_config, cluster_spec=cluster_spec)
+        self.assertIn("replay_capacity", str(context.exception))
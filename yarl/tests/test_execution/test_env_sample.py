@@ -0,0 +1,103 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import pickle
+import unittest
+import numpy as np
+
+from yarl.execution.env_sample import EnvSample
+from yarl.spaces import FloatBox, IntBox
+
+
+class TestEnvSample(unittest.TestCase):
+    """
+    Tests the columnar EnvSample.
+    """
+    state_space = FloatBox(shape=(2,))
+    action_space = IntBox(3)
+
+    def test_add_and_truncate(self):
+        """
+        Tests filling preallocated buffers, next states by offset (incl. a reset within the sample) and
+        truncation on early termination.
+        """
+        sample = EnvSample(state_space=self.state_space, action_space=self.action_space, capacity=10)
+        states = [np.full(shape=(2,), fill_value=i, dtype=np.float32) for i in range(5)]
+        reset_state = np.full(shape=(2,), fill_value=-1.0, dtype=np.float32)
+
+        # Episode 1: s0 -> s1 -> s2 (terminal), then a reset and episode 2: reset_state -> s3 -> s4.
+        sample.add(states[0], 0, 1.0, False, states[1])
+        sample.add(states[1], 1, 1.0, False, states[2])
+        sample.add(states[2], 2, 1.0, True, states[3])
+        sample.add(reset_state, 0, 1.0, False, states[4], episode_start=True)
+        self.assertEqual(len(sample), 4)
+
+        batch = sample.get_batch()
+        self.assertEqual(batch["states"].shape, (4, 2))
+        self.assertEqual(batch["actions"].dtype, np.int32)
+        self.assertListEqual(list(batch["terminals"]), [False, False, True, False])
+        self.assertTrue(np.array_equal(batch["states"][:, 0], [0.0, 1.0, 2.0, -1.0]))
+        # The terminal step keeps its own next state (s3), not the reset state.
+        self.assertTrue(np.array_equal(batch["next_states"][:, 0], [1.0, 2.0, 3.0, 4.0]))
+
+        # Pickling only keeps the filled part.
+        restored = pickle.loads(pickle.dumps(sample))
+        self.assertEqual(restored.state_buffers[""].shape, (5, 2))
+        restored_batch = restored.get_batch()
+        for key in batch:
+            self.assertTrue(np.array_equal(batch[key], restored_batch[key]))
+
+    def test_add_with_reused_observation_buffer(self):
+        """
+        Tests that episode boundaries are kept for envs writing every observation into the same array.
+        """
+        sample = EnvSample(state_space=self.state_space, action_space=self.action_space, capacity=10)
+        observation = np.zeros(shape=(2,), dtype=np.float32)
+
+        # Episode 1: 0 -> 1 (terminal), reset to -1 (in place), episode 2: -1 -> 2.
+        sample.add(observation, 0, 1.0, False, observation + 1.0)
+        observation[:] = 1.0
+        sample.add(observation, 1, 1.0, True, observation + 0.0)
+        observation[:] = -1.0
+        sample.add(observation, 0, 1.0, False, observation + 3.0, episode_start=True)
+
+        batch = sample.get_batch()
+        self.assertTrue(np.array_equal(batch["states"][:, 0], [0.0, 1.0, -1.0]))
+        self.assertTrue(np.array_equal(batch["next_states"][:, 0], [1.0, 1.0, 2.0]))
+
+        # Without a reset, the same (mutated) array continues the episode.
+        sample = EnvSample(state_space=self.state_space, action_space=self.action_space, capacity=10)
+        observation[:] = 0.0
+        sample.add(observation, 0, 1.0, False, observation + 1.0)
+        observation[:] = 1.0
+        sample.add(observation, 1, 1.0, False, observation + 1.0)
+        self.assertEqual(len(sample.next_state_overrides), 0)
+
+    def test_from_lists(self):
+        """
+        Tests building an EnvSample from already collected lists.
+        """
+        states = [np.asarray([0.0, 0.0]), np.asarray([1.0, 1.0]), np.asarray([5.0, 5.0])]
+        next_states = [np.asarray([1.0, 1.0]), np.asarray([2.0, 2.0]), np.asarray([6.0, 6.0])]
+        sample = EnvSample(states=states, actions=[0, 1, 2], rewards=[0.0, 1.0, 2.0],
+                           terminals=[False, True, False], next_states=next_states)
+
+        batch = sample.get_batch()
+        self.assertTrue(np.array_equal(batch["states"], np.asarray(states)))
+        self.assertTrue(np.array_equal(batch["next_states"], np.asarray(next_states)))
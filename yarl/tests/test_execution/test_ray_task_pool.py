@@ -0,0 +1,62 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+import unittest
+
+import ray
+
+from yarl.execution.ray.ray_util import RayTaskPool
+
+
+@ray.remote
+def sleep_task(duration):
+    time.sleep(duration)
+    return duration
+
+
+class TestRayTaskPool(unittest.TestCase):
+    """
+    Tests returning completed tasks early and the straggler statistics of the RayTaskPool.
+    """
+    def test_straggler_stats(self):
+        task_pool = RayTaskPool(straggler_factor=2.0)
+        for worker, latency in [("a", 0.1), ("b", 0.12), ("c", 0.11), ("d", 0.5)]:
+            for _ in range(3):
+                task_pool.record_latency(worker, latency)
+
+        self.assertEqual(task_pool.get_stragglers(), ["d"])
+        stats = task_pool.get_stats()
+        self.assertEqual(stats["tasks_completed"], 12)
+        self.assertEqual(stats["num_stragglers"], 1)
+        self.assertAlmostEqual(stats["max_worker_latency"], 0.5)
+        self.assertGreater(stats["straggler_latency_ratio"], 4.0)
+
+    def test_fast_tasks_return_before_stragglers(self):
+        ray.init(num_cpus=2)
+        task_pool = RayTaskPool(num_returns=1, wait_timeout=5.0)
+        task_pool.add_task("fast", sleep_task.remote(0.0))
+        task_pool.add_task("slow", sleep_task.remote(3.0))
+
+        start = time.monotonic()
+        completed = [worker for worker, _ in task_pool.get_completed()]
+        self.assertEqual(completed, ["fast"])
+        self.assertLess(time.monotonic() - start, 2.0)
+        self.assertEqual(len(task_pool.ray_tasks), 1)
+        ray.shutdown()
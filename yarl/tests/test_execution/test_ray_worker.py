@@ -64,7 +64,7 @@ class TestRayWorker(unittest.TestCase):
         # There can only be one terminal in there because we break on terminals:
         terminals = 0
         for elem in observations['terminals']:
-            if elem is True:
+            if elem:
                 terminals += 1
         self.assertEqual(terminals, 1)
 
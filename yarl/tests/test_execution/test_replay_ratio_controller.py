@@ -0,0 +1,50 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+
+from yarl.execution.replay_ratio_controller import ReplayRatioController
+
+
+class TestReplayRatioController(unittest.TestCase):
+    """
+    Tests the throttling decisions of the replay ratio controller.
+    """
+    def test_updates_due(self):
+        # One update (of 32 samples) per 4 inserted samples.
+        controller = ReplayRatioController(replay_ratio=8.0, batch_size=32, min_inserted=10)
+
+        controller.add_inserted(10)
+        self.assertEqual(controller.num_updates_due(), 0)
+        self.assertTrue(controller.learner_ahead())
+
+        controller.add_inserted(12)
+        self.assertEqual(controller.num_updates_due(), 3)
+        self.assertTrue(controller.actors_ahead())
+
+        controller.add_learned(3)
+        self.assertEqual(controller.num_updates_due(), 0)
+        self.assertFalse(controller.actors_ahead())
+        self.assertFalse(controller.learner_ahead())
+        self.assertEqual(controller.achieved_ratio, 8.0)
+
+        # Learning too far ahead.
+        controller.add_learned(1)
+        self.assertTrue(controller.learner_ahead())
+        self.assertAlmostEqual(controller.get_stats()["replay_ratio"], 128 / 12)
@@ -0,0 +1,160 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import multiprocessing
+import unittest
+import numpy as np
+from six.moves import queue
+
+from yarl.agents import ApexAgent
+from yarl.execution.ray.apex_executor import UpdateWorker
+from yarl.execution.shared_memory_replay import SharedMemoryReplay
+from yarl.spaces import Dict, BoolBox, FloatBox, IntBox
+
+
+def insert_from_process(handle, segment, value, num_records):
+    replay = SharedMemoryReplay.attach(handle)
+    replay.insert_records(dict(
+        states=np.full(shape=(num_records, 2), fill_value=value, dtype=np.float32),
+        rewards=np.full(shape=(num_records,), fill_value=value, dtype=np.float32),
+        terminals=np.zeros(shape=(num_records,), dtype=np.bool_)
+    ), segment=segment)
+    replay.close()
+
+
+class TestSharedMemoryReplay(unittest.TestCase):
+    """
+    Tests inserting into a SharedMemoryReplay from other processes and sampling from the owner.
+    """
+    record_space = Dict(
+        states=FloatBox(shape=(2,)),
+        rewards=float,
+        terminals=BoolBox(),
+        add_batch_rank=False
+    )
+
+    def test_insert_from_processes(self):
+        replay = SharedMemoryReplay(self.record_space, capacity=20, num_segments=2, alpha=1.0, beta=1.0)
+        try:
+            processes = [multiprocessing.Process(target=insert_from_process, args=(replay.handle, segment,
+                                                                                     float(segment + 1), 4))
+                         for segment in range(2)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+
+            self.assertEqual(replay.sync(), 8)
+            self.assertEqual(replay.size, 8)
+
+            records, indices, weights = replay.get_records(100)
+            self.assertEqual(records["states"].shape, (100, 2))
+            # Only written slots are sampled, each segment holds its own values.
+            self.assertTrue(np.all((indices < 4) | ((indices >= 10) & (indices < 14))))
+            self.assertTrue(np.all(records["rewards"] == np.where(indices < 10, 1.0, 2.0)))
+            self.assertTrue(np.allclose(weights, 1.0))
+
+            # Priority updates shift sampling.
+            replay.update_records(np.arange(4), np.full(shape=(4,), fill_value=1e-6))
+            _, indices, _ = replay.get_records(100)
+            self.assertGreater(np.sum(indices >= 10), 90)
+        finally:
+            replay.close()
+
+    def test_segment_wrap(self):
+        replay = SharedMemoryReplay(self.record_space, capacity=8, num_segments=2, next_states=True)
+        try:
+            for value in range(3):
+                insert_from_process(replay.handle, 0, float(value), 3)
+            # 9 records into a segment of 4: Only the last 4 are kept.
+            self.assertEqual(replay.sync(), 4)
+            self.assertEqual(replay.size, 4)
+            self.assertEqual(int(replay.counters[0]), 9)
+
+            records, indices, _ = replay.get_records(50)
+            self.assertTrue(np.all(indices < 4))
+            self.assertTrue(np.all(records["next_states"].shape == records["states"].shape))
+        finally:
+            replay.close()
+
+    def test_torn_reads_are_resampled(self):
+        replay = SharedMemoryReplay(self.record_space, capacity=8, num_segments=2)
+        try:
+            insert_from_process(replay.handle, 0, 1.0, 4)
+            self.assertEqual(replay.sync(), 4)
+
+            # A writer has claimed (and is overwriting) the two oldest slots of segment 0.
+            replay.claims[0] += 2
+            self.assertEqual(list(replay.overwritten(np.arange(4))), [True, True, False, False])
+            _, indices, _ = replay.get_records(50, max_attempts=50)
+            self.assertTrue(np.all((indices == 2) | (indices == 3)))
+        finally:
+            replay.close()
+
+    def test_torn_rows_are_dropped(self):
+        replay = SharedMemoryReplay(self.record_space, capacity=8, num_segments=2)
+        try:
+            insert_from_process(replay.handle, 0, 1.0, 4)
+            self.assertEqual(replay.sync(), 4)
+
+            # A writer has lapped segment 0 since the last sync (and not published yet): All rows are torn.
+            replay.claims[0] += 5
+            records, indices, weights = replay.get_records(10)
+            self.assertEqual(len(indices), 0)
+            self.assertEqual(records["states"].shape, (0, 2))
+            self.assertEqual(len(weights), 0)
+        finally:
+            replay.close()
+
+    def test_update_worker_priorities_per_row(self):
+        state_space = FloatBox(shape=(2,))
+        action_space = IntBox(2)
+        agent = ApexAgent.from_spec(
+            "configs/apex_agent_for_shared_memory_replay.json",
+            state_space=state_space,
+            action_space=action_space
+        )
+        record_space = Dict(states=state_space, actions=action_space, rewards=float, terminals=BoolBox(),
+                            next_states=state_space, add_batch_rank=False)
+        replay = SharedMemoryReplay(record_space, capacity=8, num_segments=1, alpha=1.0)
+        try:
+            replay.insert_records(dict(
+                states=state_space.sample(size=8),
+                actions=action_space.sample(size=8),
+                rewards=np.arange(8, dtype=np.float32),
+                terminals=np.zeros(shape=(8,), dtype=np.bool_),
+                next_states=state_space.sample(size=8)
+            ))
+            self.assertEqual(replay.sync(), 8)
+            records, indices, _ = replay.get_records(8)
+
+            # Learn from the batch as the Ape-X learner does and write back its losses as priorities.
+            input_queue = queue.Queue()
+            output_queue = queue.Queue()
+            UpdateWorker(agent, input_queue, output_queue).start()
+            input_queue.put((None, records, indices))
+            _, updated_indices, loss_per_item = output_queue.get(timeout=60)
+            self.assertEqual(len(loss_per_item), len(indices))
+            replay.update_records(updated_indices, loss_per_item)
+
+            # Rows with different rewards get different priorities (not one batch-mean loss).
+            priorities = replay.sum_segment_tree.get(np.unique(updated_indices))
+            self.assertGreater(len(np.unique(priorities)), 1)
+        finally:
+            replay.close()
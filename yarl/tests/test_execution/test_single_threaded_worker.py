@@ -24,6 +24,23 @@ from yarl.envs import OpenAIGymEnv
 from yarl.execution.single_threaded_worker import SingleThreadedWorker
 
 
+class ObserveCountingAgent(RandomAgent):
+    """
+    RandomAgent recording how many records were observed before each update.
+    """
+    def __init__(self, state_space, action_space):
+        super(ObserveCountingAgent, self).__init__(state_space, action_space)
+        self.num_observed = 0
+        self.observed_at_update = list()
+
+    def _observe_graph(self, states, actions, internals, rewards, terminals):
+        self.num_observed += len(rewards)
+
+    def update(self, batch=None):
+        self.observed_at_update.append(self.num_observed)
+        return 0.0
+
+
 class TestSingleThreadedWorker(unittest.TestCase):
 
     environment = OpenAIGymEnv(gym_env='CartPole-v0')
@@ -69,3 +86,47 @@ class TestSingleThreadedWorker(unittest.TestCase):
         self.assertEqual(result['episodes_executed'], 5)
         self.assertLessEqual(result['env_frames'], 50)
         self.assertGreaterEqual(result['runtime'], 0.0)
+
+    def test_pipelined_timesteps(self):
+        """
+        Tests the pipelined execution loop and its stage timing.
+        """
+        agent = RandomAgent(
+            action_space=self.environment.action_space,
+            state_space=self.environment.state_space
+        )
+        worker = SingleThreadedWorker(
+            environment=self.environment,
+            agent=agent,
+            repeat_actions=1,
+            pipelined=True
+        )
+
+        result = worker.execute_timesteps(100)
+        self.assertEqual(result['timesteps_executed'], 100)
+        self.assertGreater(result['episodes_executed'], 0)
+        self.assertGreaterEqual(result['env_frames'], 100)
+        self.assertGreater(result['env_time'], 0.0)
+        self.assertGreaterEqual(result['serialized_time'], result['act_time'] + result['env_time'])
+        self.assertIsNone(worker.env_thread_pool)
+        self.assertIsNone(worker.update_thread)
+
+    def test_updates_see_latest_transition(self):
+        """
+        Tests that the transition pending in `act_and_observe` is observed before each update.
+        """
+        agent = ObserveCountingAgent(
+            action_space=self.environment.action_space,
+            state_space=self.environment.state_space
+        )
+        agent.observe_spec["buffer_enabled"] = False
+        worker = SingleThreadedWorker(
+            environment=self.environment,
+            agent=agent,
+            repeat_actions=1
+        )
+
+        worker.execute_timesteps(20, update_spec=dict(steps_before_update=0, update_interval=1, update_steps=1))
+        # The update after timestep t (counting from 0) sees all t + 1 transitions.
+        self.assertListEqual(agent.observed_at_update, list(range(2, 21)))
+        self.assertEqual(agent.num_observed, 20)
@@ -0,0 +1,161 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+import numpy as np
+
+from yarl import YARLError
+from yarl.agents import DQNAgent
+from yarl.agents.random_agent import RandomAgent
+from yarl.envs import Environment, OpenAIGymEnv
+import yarl.spaces as spaces
+from yarl.execution.vectorized_worker import VectorizedWorker
+
+
+class CountingEnv(Environment):
+    """
+    Env whose states are [env id, timestep within the episode] (to check which records follow each other).
+    """
+    def __init__(self, env_id, episode_length):
+        super(CountingEnv, self).__init__(state_space=spaces.FloatBox(shape=(2,)), action_space=spaces.IntBox(2))
+        self.env_id = env_id
+        self.episode_length = episode_length
+        self.timestep = 0
+
+    def seed(self, seed=None):
+        return seed
+
+    def reset(self):
+        self.timestep = 0
+        return np.asarray([self.env_id, self.timestep], dtype=np.float32)
+
+    def step(self, actions=None):
+        self.timestep += 1
+        state = np.asarray([self.env_id, self.timestep], dtype=np.float32)
+        return state, 1.0, self.timestep >= self.episode_length, None
+
+
+class TestVectorizedWorker(unittest.TestCase):
+
+    environments = [OpenAIGymEnv(gym_env='CartPole-v0') for _ in range(4)]
+
+    def test_timesteps(self):
+        """
+        Tests if the timestep execution loop counts timesteps over all environments.
+        """
+        agent = RandomAgent(
+            action_space=self.environments[0].action_space,
+            state_space=self.environments[0].state_space
+        )
+        worker = VectorizedWorker(
+            environments=self.environments,
+            agent=agent,
+            repeat_actions=1
+        )
+
+        result = worker.execute_timesteps(100)
+        self.assertEqual(result['timesteps_executed'], 100)
+        self.assertEqual(result['env_frames'], 100)
+        self.assertGreaterEqual(result['runtime'], 0.0)
+
+    def test_episodes(self):
+        """
+        Tests if the episode execution loop stops after the given number of episodes (over all environments).
+        """
+        agent = RandomAgent(
+            action_space=self.environments[0].action_space,
+            state_space=self.environments[0].state_space
+        )
+        worker = VectorizedWorker(
+            environments=self.environments,
+            agent=agent,
+            repeat_actions=1
+        )
+
+        result = worker.execute_episodes(5, max_timesteps_per_episode=10)
+        # Several environments may finish in the same step.
+        self.assertGreaterEqual(result['episodes_executed'], 5)
+        self.assertLess(result['episodes_executed'], 5 + len(self.environments))
+        self.assertLessEqual(result['timesteps_executed'], 10 * (5 + len(self.environments)))
+
+    def test_rejects_unbuffered_observe(self):
+        """
+        Tests that several environments cannot be stepped with observe buffering disabled.
+        """
+        agent = RandomAgent(
+            action_space=self.environments[0].action_space,
+            state_space=self.environments[0].state_space
+        )
+        agent.observe_spec["buffer_enabled"] = False
+        self.assertRaises(YARLError, VectorizedWorker, environments=self.environments, agent=agent)
+
+    def test_observes_contiguous_chunks(self):
+        """
+        Tests that records reach the memory before their episode ends and that sampled next states are the
+        following states of the same environment.
+        """
+        environments = [CountingEnv(env_id=i, episode_length=6) for i in range(2)]
+        agent = DQNAgent.from_spec(
+            "configs/dqn_agent_for_vectorized_worker.json",
+            state_space=environments[0].state_space,
+            action_space=environments[0].action_space,
+            update_spec=dict(steps_before_update=8, update_interval=2, batch_size=2, sync_interval=8),
+            observe_spec=dict(buffer_enabled=True, buffer_size=4)
+        )
+        worker = VectorizedWorker(environments=environments, agent=agent)
+        self.assertEqual(worker.observe_chunk_size(), 4)
+
+        # Per env: One episode (a chunk of 4 cut off mid-episode, then 2) and a chunk of 4 of the next episode.
+        result = worker.execute_timesteps(20)
+        self.assertEqual(result['timesteps_executed'], 20)
+        self.assertEqual(result['episodes_executed'], 2)
+        self.assertEqual(agent.memory.size, 20)
+
+        batch = agent.memory.get_records(100)
+        for state, terminal, next_state in zip(batch["states"], batch["terminals"], batch["next_states"]):
+            # Terminals and the last records of chunks cut off mid-episode have no meaningful next state.
+            if terminal or state[1] == 3:
+                continue
+            self.assertListEqual(list(next_state), [state[0], state[1] + 1])
+
+    def test_flushes_partial_chunks(self):
+        """
+        Tests that the partial chunks of all environments are inserted (each on its own) when a run ends.
+        """
+        environments = [CountingEnv(env_id=i, episode_length=20) for i in range(2)]
+        agent = DQNAgent.from_spec(
+            "configs/dqn_agent_for_vectorized_worker.json",
+            state_space=environments[0].state_space,
+            action_space=environments[0].action_space,
+            observe_spec=dict(buffer_enabled=True, buffer_size=4)
+        )
+        worker = VectorizedWorker(environments=environments, agent=agent)
+
+        # Per env: A full chunk of 4, then one record left in the agent's buffer for that env.
+        worker.execute_timesteps(10)
+        self.assertEqual(agent.memory.size, 10)
+        self.assertEqual(len(agent.reward_buffer), 0)
+
+        batch = agent.memory.get_records(100)
+        for state, next_state in zip(batch["states"], batch["next_states"]):
+            # Memory order: env 0 (0-3), env 1 (0-3), env 0 (4), env 1 (4). Last records of chunks have no
+            # meaningful next state.
+            if state[1] >= 3:
+                continue
+            self.assertListEqual(list(next_state), [state[0], state[1] + 1])
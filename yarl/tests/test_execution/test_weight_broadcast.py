@@ -0,0 +1,81 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import unittest
+
+from yarl.execution.ray.weight_broadcast import flatten_weights, unflatten_weights, WeightBroadcast
+from yarl.tests.test_util import recursive_assert_almost_equal
+
+
+class TestWeightBroadcast(unittest.TestCase):
+    """
+    Tests packing weights into a single buffer and versioned syncing.
+    """
+    def test_flatten_and_unflatten_weights(self):
+        weights = dict(
+            policy=dict(kernel=np.random.random(size=(3, 4)).astype(np.float32), bias=np.zeros(4, np.float32)),
+            timestep=np.array(12345678, dtype=np.int64)
+        )
+        buffer, spec, other = flatten_weights(weights)
+        self.assertEqual(buffer.shape, (16,))
+        self.assertEqual(buffer.dtype, np.float32)
+        self.assertEqual(list(other.keys()), ["/timestep"])
+
+        unflattened = unflatten_weights(buffer, spec, other)
+        recursive_assert_almost_equal(unflattened["policy"]["kernel"], weights["policy"]["kernel"])
+        recursive_assert_almost_equal(unflattened["policy"]["bias"], weights["policy"]["bias"])
+        self.assertEqual(unflattened["timestep"], 12345678)
+
+        # Already flat weights vector: Passed through without copying.
+        flat = np.arange(5, dtype=np.float32)
+        buffer, spec, other = flatten_weights(flat)
+        self.assertIs(buffer.base if buffer.base is not None else buffer, flat)
+        recursive_assert_almost_equal(unflatten_weights(buffer, spec, other), flat)
+
+        # Agents without weights.
+        buffer, spec, other = flatten_weights(None)
+        self.assertIsNone(unflatten_weights(buffer, spec, other))
+
+    def test_sync_only_stale_workers(self):
+        import ray
+        ray.init(num_cpus=1)
+
+        class Worker(object):
+            def __init__(self):
+                self.pulled_versions = list()
+                self.pull_weights = self
+
+            def remote(self, version, weights_ids):
+                self.pulled_versions.append(version)
+
+        broadcast = WeightBroadcast()
+        workers = [Worker(), Worker()]
+        broadcast.publish(dict(a=np.ones(2, np.float32)))
+        for worker in workers:
+            self.assertTrue(broadcast.sync_worker(worker))
+            # Already up to date.
+            self.assertFalse(broadcast.sync_worker(worker))
+
+        broadcast.publish(dict(a=np.zeros(2, np.float32)))
+        broadcast.sync_worker(workers[0])
+        self.assertEqual(workers[0].pulled_versions, [1, 2])
+        self.assertEqual(workers[1].pulled_versions, [1])
+        self.assertEqual(broadcast.get_stats(), dict(weight_versions=2, weight_syncs=3, weight_syncs_skipped=2))
+        ray.shutdown()
@@ -0,0 +1,117 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import time
+import unittest
+import numpy as np
+from six.moves import xrange as range_
+
+from yarl import YARLError
+from yarl.components.memories import ReplayMemory, MemCompressedReplay
+from yarl.spaces import Dict, IntBox, BoolBox, FloatBox
+from yarl.tests import ComponentTest
+from yarl.utils import root_logger
+
+
+class TestCompressedReplayThroughput(unittest.TestCase):
+    """
+    Compares insert and sample throughput of the (uncompressed) TensorFlow replay memory against the
+    compressed host-side replay memory on Atari-sized frame stacks.
+    """
+    root_logger.setLevel(level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    record_space = Dict(
+        states=FloatBox(shape=(84, 84, 4)),
+        actions=IntBox(2),
+        reward=float,
+        terminals=BoolBox(),
+        add_batch_rank=True
+    )
+    capacity = 20000
+    inserts = 100
+    insert_batch_size = 100
+    samples = 200
+    sample_batch_size = 32
+
+    def make_records(self, num_records):
+        """
+        Creates records with mostly constant (i.e. well compressible) frames, similar to Atari screens.
+        """
+        frames = np.zeros(shape=(num_records, 84, 84, 4), dtype=np.float32)
+        frames[:, 70:84] = 100.0
+        for i in range_(num_records):
+            offset = np.random.randint(0, 74)
+            frames[i, 20:30, offset:offset + 10] = 255.0
+        return dict(
+            states=frames,
+            actions=np.random.randint(0, 2, size=(num_records,)),
+            reward=np.random.random(size=(num_records,)),
+            terminals=np.zeros(shape=(num_records,), dtype=np.bool_)
+        )
+
+    def test_replay_memory(self):
+        """
+        Tests insert and sample throughput of the uncompressed TensorFlow replay memory.
+        """
+        memory = ReplayMemory(capacity=self.capacity, next_states=True)
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=self.record_space,
+            num_records=int
+        ))
+
+        records = [self.make_records(self.insert_batch_size) for _ in range_(self.inserts)]
+        start = time.time()
+        for record in records:
+            test.test(out_socket_names="insert_records", inputs=record, expected_outputs=None)
+        insert_time = time.time() - start
+
+        start = time.time()
+        for _ in range_(self.samples):
+            test.test(out_socket_names="get_records", inputs=self.sample_batch_size, expected_outputs=None)
+        sample_time = time.time() - start
+
+        self.logger.info("Uncompressed replay memory: {} inserts/s, {} samples/s".format(
+            self.inserts / insert_time, self.samples / sample_time))
+
+    def test_mem_compressed_replay(self):
+        """
+        Tests insert and sample throughput of the compressed host-side replay memory.
+        """
+        for compression in ["zlib", "lz4"]:
+            try:
+                memory = MemCompressedReplay(capacity=self.capacity, next_states=True, compression=compression)
+            except YARLError as e:
+                self.logger.info("Skipping {} compression: {}".format(compression, e))
+                continue
+
+            records = [self.make_records(self.insert_batch_size) for _ in range_(self.inserts)]
+            start = time.time()
+            for record in records:
+                memory.insert_records(record)
+            insert_time = time.time() - start
+
+            start = time.time()
+            for _ in range_(self.samples):
+                memory.get_records(self.sample_batch_size)
+            sample_time = time.time() - start
+
+            self.logger.info("Compressed ({}) replay memory: {} inserts/s, {} samples/s, compression ratio {}".format(
+                compression, self.inserts / insert_time, self.samples / sample_time, memory.compression_ratio))
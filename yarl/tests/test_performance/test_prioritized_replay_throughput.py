@@ -0,0 +1,102 @@
+# Copyright 2018 The YARL-Project, All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import time
+import unittest
+import numpy as np
+from six.moves import xrange as range_
+
+from yarl.components.memories import PrioritizedReplay, MemPrioritizedReplay
+from yarl.spaces import Dict, IntBox, BoolBox, FloatBox
+from yarl.tests import ComponentTest
+from yarl.utils import root_logger
+
+
+class TestPrioritizedReplayThroughput(unittest.TestCase):
+    """
+    Compares insert, sample and update throughput of the TensorFlow prioritized replay
+    against the host-side (NumPy) prioritized replay.
+    """
+    root_logger.setLevel(level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    record_space = Dict(
+        states=FloatBox(shape=(4,)),
+        actions=IntBox(2),
+        reward=float,
+        terminals=BoolBox(),
+        add_batch_rank=True
+    )
+    capacity = 1000000
+    inserts = 1000
+    insert_batch_size = 100
+    samples = 1000
+    sample_batch_size = 512
+
+    def test_tf_prioritized_replay(self):
+        """
+        Tests insert and sample/update throughput of the TensorFlow prioritized replay.
+        """
+        memory = PrioritizedReplay(capacity=self.capacity, next_states=True, alpha=1.0, beta=1.0)
+        test = ComponentTest(component=memory, input_spaces=dict(
+            records=self.record_space,
+            num_records=int,
+            indices=IntBox(shape=(), add_batch_rank=True),
+            update=FloatBox(shape=(), add_batch_rank=True)
+        ))
+
+        records = [self.record_space.sample(size=self.insert_batch_size) for _ in range_(self.inserts)]
+        start = time.time()
+        for record in records:
+            test.test(out_socket_names="insert_records", inputs=record, expected_outputs=None)
+        insert_time = time.time() - start
+
+        start = time.time()
+        for _ in range_(self.samples):
+            _, indices = test.test(out_socket_names=["get_records", "record_indices"],
+                                   inputs=dict(num_records=self.sample_batch_size), expected_outputs=None)
+            test.test(out_socket_names="update_records", inputs=dict(
+                indices=indices, update=np.random.random(size=self.sample_batch_size)
+            ), expected_outputs=None)
+        sample_time = time.time() - start
+
+        self.logger.info("TF prioritized replay: {} inserts/s, {} sample+update/s".format(
+            self.inserts / insert_time, self.samples / sample_time))
+
+    def test_mem_prioritized_replay(self):
+        """
+        Tests insert and sample/update throughput of the host-side prioritized replay.
+        """
+        memory = MemPrioritizedReplay(capacity=self.capacity, next_states=True, alpha=1.0, beta=1.0)
+
+        records = [self.record_space.sample(size=self.insert_batch_size) for _ in range_(self.inserts)]
+        start = time.time()
+        for record in records:
+            memory.insert_records(record)
+        insert_time = time.time() - start
+
+        start = time.time()
+        for _ in range_(self.samples):
+            _, indices, _ = memory.get_records(self.sample_batch_size)
+            memory.update_records(indices, np.random.random(size=self.sample_batch_size))
+        sample_time = time.time() - start
+
+        self.logger.info("Host-side prioritized replay: {} inserts/s, {} sample+update/s".format(
+            self.inserts / insert_time, self.samples / sample_time))
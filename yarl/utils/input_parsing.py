@@ -78,7 +78,13 @@ def parse_execution_spec(execution_spec):
         session_config=None,
         seed=None,  # random seed for the tf graph
         enable_profiler=False,  # enabling the tf profiler?
-        profiler_frequency=1000  # with which frequency do we print out profiler information?
+        profiler_frequency=1000,  # with which frequency do we trace a step and print out profiler information?
+        profiler_sampling_rate=None,  # if given, trace steps with this probability instead of every n-th step
+        # The directory to write the Chrome trace timelines of traced steps to (None for no timelines).
+        profiler_timeline_directory=os.path.expanduser("~/yarl_timelines/"),
+        # Out-Sockets to execute via cached session callables, e.g. ["get_actions", "insert_records"] (opt-in fast
+        # path: these calls skip the session hooks, i.e. summaries and checkpoint saving).
+        callable_sockets=[]
     )
     execution_spec = default_dict(execution_spec, default_spec)
 
@@ -146,7 +152,12 @@ def parse_update_spec(update_spec):
         update_steps=1,
         # The batch size with which to update (e.g. when pulling records from a memory).
         batch_size=64,
-        sync_interval=128
+        sync_interval=128,
+        # The number of batches to prefetch from the memory in a background thread (0=no prefetching).
+        prefetch_batches=0,
+        # Target number of samples learned per sample observed. If given, workers schedule updates to keep this
+        # ratio instead of updating every `update_interval` steps (None=use the fixed schedule).
+        replay_ratio=None
     )
     update_spec = default_dict(update_spec, default_spec)
     # Assert that the synch interval is a multiple of the update_interval.
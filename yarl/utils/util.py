@@ -80,6 +80,10 @@ def dtype(dtype_, to="tf"):
         return np.int32 if to == "np" else tf.int32
     elif dtype_ in ["int64", np.int64]:
         return np.int64 if to == "np" else tf.int64
+    elif dtype_ in ["float16", np.float16, be.float16]:
+        return np.float16 if to == "np" else tf.float16
+    elif dtype_ in ["uint8", np.uint8, be.uint8]:
+        return np.uint8 if to == "np" else tf.uint8
 
     raise YARLError("Error: Type conversion to '{}' for type '{}' not supported.".format(to, str(dtype_)))
 